@@ -0,0 +1,344 @@
+"""Benchmarks dos caminhos críticos da simulação.
+
+Uso:
+	python benchmark.py indice
+	python benchmark.py campos
+	python benchmark.py cenarios [nomes...] [--geracoes N] [--populacao N] [--semente S] [--json arquivo]
+	python benchmark.py micro [--json arquivo] [--comparar base.json] [--tolerancia 0.1]
+	python benchmark.py distribuido [--workers 1 2 4] [--cenario nome] [--geracoes N] [--populacao N]
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import platform
+import random
+import sys
+import time
+import timeit
+
+import matplotlib
+matplotlib.use('Agg') # Sem janelas durante os benchmarks
+
+from robo_exercicio import (CENARIOS, Ambiente, CoordenadorDistribuido, IndividuoPG, ProgramacaoGenetica, Robo,
+	criar_cenario, executar_worker)
+
+def benchmark_indice_espacial(contagens=(5, 25, 100, 200, 400), passos=20000, semente=0, raio=15):
+	"""Custo por passo de colisão + coleta com varredura completa e com o índice espacial.
+
+	Os dois modos usam o mesmo layout e as mesmas posições, e os resultados são
+	comparados para garantir que o índice não muda nenhuma resposta.
+	"""
+	resultados = []
+	for n in contagens:
+		random.seed(semente)
+		ambiente = Ambiente(num_obstaculos=n, num_recursos=n, indice_espacial=True)
+		posicoes = [(random.uniform(0, ambiente.largura), random.uniform(0, ambiente.altura)) for _ in range(passos)]
+
+		def executar(usar_indice):
+			indice = ambiente.indice
+			if not usar_indice:
+				ambiente.indice = None
+			ambiente.reset()
+			respostas = []
+			duracao = 0.0
+			for x, y in posicoes:
+				inicio = time.perf_counter()
+				colisao = ambiente.verificar_colisao(x, y, raio)
+				coletados = ambiente.verificar_coleta_recursos(x, y, raio)
+				duracao += time.perf_counter() - inicio
+				respostas.append((colisao, coletados))
+				if coletados:
+					# Devolve os recursos para que todos os passos consultem o mapa completo
+					ambiente.reset()
+			ambiente.indice = indice
+			return duracao / passos * 1e6, respostas
+
+		tempo_varredura, respostas_varredura = executar(False)
+		tempo_indice, respostas_indice = executar(True)
+		if respostas_varredura != respostas_indice:
+			raise AssertionError(f"Índice espacial divergiu da varredura com {n} obstáculos/recursos")
+		resultados.append({'obstaculos_recursos': n, 'varredura_us': tempo_varredura, 'indice_us': tempo_indice})
+	return resultados
+
+def benchmark_campos_distancia(resolucoes=(2, 5, 10), num_obstaculos=(5, 50), passos=20000, semente=0):
+	"""Custo de Robo.get_sensores com sensores exatos e com os rasters, e o erro dos rasters.
+
+	O erro é o máximo absoluto de dist_obstaculo, dist_meta e angulo_meta nas
+	mesmas posições e orientações; o tempo inclui a construção dos rasters.
+	"""
+	resultados = []
+	for n in num_obstaculos:
+		for resolucao in (None,) + tuple(resolucoes):
+			random.seed(semente)
+			ambiente = Ambiente(num_obstaculos=n, resolucao_campos=resolucao)
+			estados = [
+				(random.uniform(0, ambiente.largura), random.uniform(0, ambiente.altura), random.uniform(-3.14, 3.14))
+				for _ in range(passos)
+			]
+			robo = Robo(0, 0)
+			inicio = time.perf_counter()
+			ambiente.campos_distancia()
+			sensores = []
+			for x, y, angulo in estados:
+				robo.x, robo.y, robo.angulo = x, y, angulo
+				sensores.append(robo.get_sensores(ambiente))
+			duracao = time.perf_counter() - inicio
+			if resolucao is None:
+				exatos = sensores
+			erros = {
+				nome: max(abs(s[nome] - e[nome]) for s, e in zip(sensores, exatos))
+				for nome in ('dist_obstaculo', 'dist_meta')
+			}
+			# Diferença angular, considerando a volta em +-pi
+			erros['angulo_meta'] = max(
+				abs((s['angulo_meta'] - e['angulo_meta'] + math.pi) % (2 * math.pi) - math.pi)
+				for s, e in zip(sensores, exatos)
+			)
+			resultados.append({
+				'obstaculos': n, 'resolucao': resolucao, 'us_por_chamada': duracao / passos * 1e6, **erros
+			})
+	return resultados
+
+def executar_cenario(nome, geracoes=10, populacao=50, profundidade=3, semente=0, **opcoes):
+	"""Evolução completa em um cenário fixo com semente fixa.
+
+	Retorna tempo de parede, passos simulados, passos por segundo e o fitness
+	final; 'opcoes' vão para ProgramacaoGenetica (simulacao_lote, workers, poda...).
+	"""
+	random.seed(semente)
+	pg = ProgramacaoGenetica(tamanho_populacao=populacao, profundidade=profundidade, cenario=nome, **opcoes)
+	inicio = time.perf_counter()
+	with contextlib.redirect_stdout(io.StringIO()):
+		pg.evoluir(n_geracoes=geracoes)
+	duracao = time.perf_counter() - inicio
+	return {
+		'cenario': nome,
+		'semente': semente,
+		'geracoes': geracoes,
+		'populacao': populacao,
+		'tempo_s': duracao,
+		'passos': pg.passos_simulados,
+		'passos_por_s': pg.passos_simulados / duracao,
+		'melhor_fitness': pg.melhor_fitness,
+		'media_fitness_final': pg.historico_media_fitness[-1],
+	}
+
+def benchmark_distribuido(contagens=(1, 2, 4), cenario='padrao', geracoes=3, populacao=100, semente=0):
+	"""Evolução com CoordenadorDistribuido e 'n' workers locais (processos conectados por TCP).
+
+	Retorna, para cada contagem, o tempo de parede, a aceleração em relação à
+	primeira contagem e os passos por segundo de cada worker.
+	"""
+	linhas = []
+	for n in contagens:
+		coordenador = CoordenadorDistribuido()
+		host, porta = coordenador.endereco
+		processos = [
+			multiprocessing.Process(target=executar_worker, args=(host, porta, f'worker{i}'), daemon=True)
+			for i in range(n)
+		]
+		for processo in processos:
+			processo.start()
+		try:
+			coordenador.aguardar_workers(n)
+			linha = executar_cenario(cenario, geracoes, populacao, semente=semente, coordenador=coordenador)
+			linha['workers'] = n
+			linha['por_worker'] = {nome: dados['passos_por_s'] for nome, dados in coordenador.estatisticas().items()}
+		finally:
+			coordenador.encerrar()
+			for processo in processos:
+				processo.join(timeout=5)
+		linha['aceleracao'] = linhas[0]['tempo_s'] / linha['tempo_s'] if linhas else 1.0
+		linhas.append(linha)
+	return linhas
+
+def cronometrar(funcao, repeticoes=7):
+	"""Melhor tempo por chamada (em microssegundos) entre 'repeticoes' rodadas de ~0.2s"""
+	timer = timeit.Timer(funcao)
+	numero, _ = timer.autorange()
+	return min(timer.repeat(repeat=repeticoes, number=numero)) / numero * 1e6
+
+def benchmark_micro(profundidades=(2, 4, 6), populacoes=(20, 50, 100), semente=0):
+	"""Custo por operação dos caminhos críticos, em microssegundos.
+
+	Cada medida usa o cenário 'padrao' e indivíduos gerados com semente fixa,
+	então duas execuções medem exatamente o mesmo trabalho.
+	"""
+	resultados = {}
+	random.seed(semente)
+	ambiente = criar_cenario('padrao')
+	posicoes = itertools.cycle([
+		(random.uniform(0, ambiente.largura), random.uniform(0, ambiente.altura)) for _ in range(1000)
+	])
+
+	# Estados fixos do robô, com todos os recursos disponíveis
+	robo = Robo(ambiente.largura // 2, ambiente.altura // 2)
+	estados = itertools.cycle([
+		(random.uniform(0, ambiente.largura), random.uniform(0, ambiente.altura), random.uniform(-math.pi, math.pi))
+		for _ in range(1000)
+	])
+
+	def get_sensores():
+		robo.x, robo.y, robo.angulo = next(estados)
+		return robo.get_sensores(ambiente)
+
+	ambiente.reset()
+	resultados['Robo.get_sensores'] = cronometrar(get_sensores)
+	# Política que lê só dois sensores (get_sensores calcula apenas esses)
+	variaveis = ('dist_recurso', 'energia')
+	resultados['Robo.get_sensores[variaveis=2]'] = cronometrar(lambda: robo.get_sensores(ambiente, variaveis))
+	resultados['Ambiente.verificar_colisao'] = cronometrar(lambda: ambiente.verificar_colisao(*next(posicoes), 15))
+
+	# Episódios curtos que recomeçam a cada 100 passos, para o custo não depender de quantas chamadas houve
+	controles = itertools.cycle([(random.uniform(-1, 1), random.uniform(-0.5, 0.5)) for _ in range(1000)])
+	passos = itertools.count()
+
+	def mover():
+		if next(passos) % 100 == 0:
+			ambiente.reset()
+			robo.reset(ambiente.largura // 2, ambiente.altura // 2)
+		robo.mover(*next(controles), ambiente)
+
+	resultados['Robo.mover'] = cronometrar(mover)
+
+	robo.reset(ambiente.largura // 2, ambiente.altura // 2)
+	sensores = robo.get_sensores(ambiente)
+
+	def avaliar_no(individuos):
+		individuo = next(individuos)
+		return individuo.avaliar_no(individuo.arvore_aceleracao, sensores)
+
+	for profundidade in profundidades:
+		individuos = itertools.cycle([IndividuoPG(profundidade) for _ in range(50)])
+		resultados[f'IndividuoPG.avaliar_no[profundidade={profundidade}]'] = cronometrar(lambda: avaliar_no(individuos))
+
+	# Operadores genéticos sobre um conjunto fixo de indivíduos de profundidade 4
+	conjunto = [IndividuoPG(4) for _ in range(200)]
+	pares = itertools.cycle(list(zip(conjunto[::2], conjunto[1::2])))
+	individuos = itertools.cycle(conjunto)
+
+	def crossover():
+		pai1, pai2 = next(pares)
+		return pai1.crossover(pai2)
+
+	resultados['IndividuoPG.crossover'] = cronometrar(crossover)
+	resultados['IndividuoPG.mutacao'] = cronometrar(lambda: next(individuos).mutacao(probabilidade=0.3))
+	resultados['IndividuoPG.copy'] = cronometrar(lambda: next(individuos).copy())
+
+	# Uma geração completa (avaliação, seleção e reprodução) por tamanho de população
+	for populacao in populacoes:
+		tempos = []
+		for _ in range(3):
+			random.seed(semente)
+			pg = ProgramacaoGenetica(tamanho_populacao=populacao, cenario='padrao')
+			inicio = time.perf_counter()
+			with contextlib.redirect_stdout(io.StringIO()):
+				pg.evoluir(n_geracoes=1)
+			tempos.append(time.perf_counter() - inicio)
+		resultados[f'ProgramacaoGenetica.evoluir[populacao={populacao}]'] = min(tempos) * 1e6
+	return resultados
+
+def comparar_resultados(atual, base, tolerancia=0.1):
+	"""Linhas (nome, base, atual, razão, regressão) para as medidas presentes nos dois conjuntos"""
+	linhas = []
+	for nome, valor in atual.items():
+		if nome in base:
+			razao = valor / base[nome]
+			linhas.append((nome, base[nome], valor, razao, razao > 1 + tolerancia))
+	return linhas
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	subparsers = parser.add_subparsers(dest='comando', required=True)
+	subparsers.add_parser('indice', help='índice espacial vs. varredura completa')
+	subparsers.add_parser('campos', help='rasters de sensores vs. sensores exatos')
+	parser_cenarios = subparsers.add_parser('cenarios', help='evolução com semente fixa nos cenários nomeados')
+	parser_cenarios.add_argument('nomes', nargs='*', help=f"cenários a executar (padrão: todos; opções: {', '.join(CENARIOS)})")
+	parser_cenarios.add_argument('--geracoes', type=int, default=10)
+	parser_cenarios.add_argument('--populacao', type=int, default=50)
+	parser_cenarios.add_argument('--profundidade', type=int, default=3)
+	parser_cenarios.add_argument('--semente', type=int, default=0)
+	parser_cenarios.add_argument('--lote', action='store_true', help='usar SimulacaoLote')
+	parser_cenarios.add_argument('--workers', type=int, default=1)
+	parser_cenarios.add_argument('--poda', choices=['piso', 'elite'])
+	parser_cenarios.add_argument('--json', help='arquivo para salvar os resultados')
+	parser_micro = subparsers.add_parser('micro', help='microbenchmarks dos caminhos críticos')
+	parser_micro.add_argument('--json', help='arquivo para salvar os resultados')
+	parser_micro.add_argument('--comparar', help='JSON de uma execução anterior usada como base')
+	parser_micro.add_argument('--tolerancia', type=float, default=0.1, help='aumento relativo aceito (padrão: 0.1)')
+	parser_distribuido = subparsers.add_parser('distribuido', help='escalonamento da avaliação com workers TCP locais')
+	parser_distribuido.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+	parser_distribuido.add_argument('--cenario', default='padrao', choices=list(CENARIOS))
+	parser_distribuido.add_argument('--geracoes', type=int, default=3)
+	parser_distribuido.add_argument('--populacao', type=int, default=100)
+	args = parser.parse_args()
+
+	if args.comando == 'indice':
+		print(f"{'obst./rec.':>10} {'varredura (us/passo)':>22} {'índice (us/passo)':>19}")
+		for linha in benchmark_indice_espacial():
+			print(f"{linha['obstaculos_recursos']:>10} {linha['varredura_us']:>22.2f} {linha['indice_us']:>19.2f}")
+	elif args.comando == 'campos':
+		print(f"{'obstáculos':>10} {'resolução':>10} {'us/chamada':>11} {'erro dist_obst.':>16} {'erro dist_meta':>15} {'erro ang_meta':>14}")
+		for linha in benchmark_campos_distancia():
+			resolucao = 'exata' if linha['resolucao'] is None else linha['resolucao']
+			print(
+				f"{linha['obstaculos']:>10} {resolucao:>10} {linha['us_por_chamada']:>11.2f} "
+				f"{linha['dist_obstaculo']:>16.4f} {linha['dist_meta']:>15.4f} {linha['angulo_meta']:>14.4f}"
+			)
+	elif args.comando == 'cenarios':
+		desconhecidos = [nome for nome in args.nomes if nome not in CENARIOS]
+		if desconhecidos:
+			parser.error(f"cenários desconhecidos: {', '.join(desconhecidos)}")
+		resultados = []
+		print(f"{'cenário':>13} {'tempo (s)':>10} {'passos':>10} {'passos/s':>10} {'melhor fitness':>15} {'média final':>12}")
+		for nome in args.nomes or list(CENARIOS):
+			linha = executar_cenario(
+				nome, args.geracoes, args.populacao, args.profundidade, args.semente,
+				simulacao_lote=args.lote, workers=args.workers, poda=args.poda
+			)
+			resultados.append(linha)
+			print(
+				f"{nome:>13} {linha['tempo_s']:>10.2f} {linha['passos']:>10} {linha['passos_por_s']:>10.0f} "
+				f"{linha['melhor_fitness']:>15.2f} {linha['media_fitness_final']:>12.2f}"
+			)
+		if args.json:
+			with open(args.json, 'w') as f:
+				json.dump(resultados, f, indent=4)
+	elif args.comando == 'distribuido':
+		print(f"{'workers':>8} {'tempo (s)':>10} {'aceleração':>11} {'passos/s por worker':>24}")
+		for linha in benchmark_distribuido(tuple(args.workers), args.cenario, args.geracoes, args.populacao):
+			por_worker = ' '.join(f"{valor:.0f}" for valor in linha['por_worker'].values())
+			print(f"{linha['workers']:>8} {linha['tempo_s']:>10.2f} {linha['aceleracao']:>11.2f} {por_worker:>24}")
+	elif args.comando == 'micro':
+		resultados = benchmark_micro()
+		if args.json:
+			with open(args.json, 'w') as f:
+				json.dump({
+					'python': platform.python_version(),
+					'plataforma': platform.platform(),
+					'unidade': 'us por operação',
+					'resultados': resultados
+				}, f, indent=4)
+
+		if args.comparar is None:
+			print(f"{'medida':<52} {'us/op':>14}")
+			for nome, valor in resultados.items():
+				print(f"{nome:<52} {valor:>14.2f}")
+			return 0
+
+		with open(args.comparar) as f:
+			base = json.load(f)['resultados']
+		print(f"{'medida':<52} {'base':>14} {'atual':>14} {'razão':>7}")
+		regressoes = 0
+		for nome, valor_base, valor, razao, regressao in comparar_resultados(resultados, base, args.tolerancia):
+			regressoes += regressao
+			print(f"{nome:<52} {valor_base:>14.2f} {valor:>14.2f} {razao:>7.2f}{'  REGRESSÃO' if regressao else ''}")
+		# Código de saída diferente de zero para barrar a mudança em scripts
+		return 1 if regressoes else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -3,7 +3,27 @@ import random
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import matplotlib.animation as animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import json
+import contextlib
+import gzip
+import hashlib
+import heapq
+import math
+import multiprocessing
+import operator
+import os
+import pickle
+import queue
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
 
 # =====================================================================
 # PARTE 1: ESTRUTURA DA SIMULAÇÃO (NÃO MODIFICAR)
@@ -11,24 +31,182 @@ import json
 # o robô e a visualização. Não é recomendado modificar esta parte.
 # =====================================================================
 
+class IndiceEspacial:
+	"""Grade uniforme com os obstáculos e recursos de um ambiente.
+
+	Cada item é registrado em todas as células tocadas pela sua área expandida
+	por 'margem'. Assim, para raios até a margem, basta consultar a célula do
+	centro do robô; raios maiores consultam todas as células da região. O teste
+	exato continua sendo feito por quem consulta.
+	"""
+	def __init__(self, obstaculos, recursos, tamanho_celula=50, margem=25):
+		self.tamanho_celula = tamanho_celula
+		self.margem = margem
+		self.celulas_obstaculos = {}
+		self.celulas_recursos = {}
+
+		for obstaculo in obstaculos:
+			for celula in self.celulas_regiao(obstaculo['x'] - margem, obstaculo['y'] - margem,
+					obstaculo['x'] + obstaculo['largura'] + margem, obstaculo['y'] + obstaculo['altura'] + margem):
+				self.celulas_obstaculos.setdefault(celula, []).append(obstaculo)
+		for recurso in recursos:
+			for celula in self.celulas_regiao(recurso['x'] - margem, recurso['y'] - margem,
+					recurso['x'] + margem, recurso['y'] + margem):
+				self.celulas_recursos.setdefault(celula, []).append(recurso)
+
+		# Limites da grade ocupada, usados para restringir consultas fora do mapa
+		celulas = list(self.celulas_obstaculos) + list(self.celulas_recursos)
+		self.limites = (
+			min((c[0] for c in celulas), default=0), min((c[1] for c in celulas), default=0),
+			max((c[0] for c in celulas), default=0), max((c[1] for c in celulas), default=0)
+		)
+
+	def celulas_regiao(self, x_min, y_min, x_max, y_max, limites=None):
+		tamanho = self.tamanho_celula
+		c_x_min, c_y_min = int(x_min // tamanho), int(y_min // tamanho)
+		c_x_max, c_y_max = int(x_max // tamanho), int(y_max // tamanho)
+		if limites is not None:
+			c_x_min, c_y_min = max(c_x_min, limites[0]), max(c_y_min, limites[1])
+			c_x_max, c_y_max = min(c_x_max, limites[2]), min(c_y_max, limites[3])
+		return [(cx, cy) for cx in range(c_x_min, c_x_max + 1) for cy in range(c_y_min, c_y_max + 1)]
+
+	def consultar(self, celulas_itens, x, y, raio):
+		# Coordenadas não finitas não podem ser mapeadas para células
+		if not (math.isfinite(x) and math.isfinite(y)):
+			return None
+		if raio <= self.margem:
+			tamanho = self.tamanho_celula
+			return celulas_itens.get((int(x // tamanho), int(y // tamanho)), ())
+		# Um item pode estar em várias células; remove repetições
+		itens = {}
+		for celula in self.celulas_regiao(x - raio, y - raio, x + raio, y + raio, self.limites):
+			for item in celulas_itens.get(celula, ()):
+				itens[id(item)] = item
+		return itens.values()
+
+	def obstaculos_proximos(self, x, y, raio):
+		"""Obstáculos que podem tocar o quadrado de lado 2*raio centrado em (x, y) (None = use todos)"""
+		return self.consultar(self.celulas_obstaculos, x, y, raio)
+
+	def recursos_proximos(self, x, y, raio):
+		"""Recursos que podem estar a menos de 'raio' de (x, y) (None = use todos)"""
+		return self.consultar(self.celulas_recursos, x, y, raio)
+
+class CamposDistancia:
+	"""Rasters dos sensores que dependem apenas do layout estático de um ambiente.
+
+	A distância ao obstáculo mais próximo (centro), a distância à meta e a direção
+	da meta (guardada como cosseno e seno para poder ser interpolada) são
+	calculadas nos vértices de uma grade com espaçamento 'resolucao'. As consultas
+	fazem interpolação bilinear. Fora do mapa, ou perto da meta, onde a direção
+	muda rápido demais para a grade, a consulta devolve None e o sensor deve ser
+	calculado de forma exata.
+	"""
+	def __init__(self, ambiente, resolucao=5):
+		self.resolucao = resolucao
+		self.largura = ambiente.largura
+		self.altura = ambiente.altura
+		self.meta_x = ambiente.meta['x']
+		self.meta_y = ambiente.meta['y']
+		self.raio_exato = 2 * resolucao
+		self.nx = max(2, int(math.ceil(ambiente.largura / resolucao)) + 1)
+		self.ny = max(2, int(math.ceil(ambiente.altura / resolucao)) + 1)
+		x, y = np.meshgrid(np.arange(self.nx) * resolucao, np.arange(self.ny) * resolucao)
+
+		self.tem_obstaculos = bool(ambiente.obstaculos)
+		self.dist_obstaculo = np.zeros((self.ny, self.nx))
+		if self.tem_obstaculos:
+			self.dist_obstaculo[:] = np.inf
+			for obstaculo in ambiente.obstaculos:
+				centro_x = obstaculo['x'] + obstaculo['largura'] / 2
+				centro_y = obstaculo['y'] + obstaculo['altura'] / 2
+				np.minimum(self.dist_obstaculo, np.sqrt((x - centro_x)**2 + (y - centro_y)**2), out=self.dist_obstaculo)
+
+		dx_meta = self.meta_x - x
+		dy_meta = self.meta_y - y
+		self.dist_meta = np.sqrt(dx_meta**2 + dy_meta**2)
+		norma = np.where(self.dist_meta > 0, self.dist_meta, 1.0)
+		self.cos_meta = np.where(self.dist_meta > 0, dx_meta / norma, 1.0)
+		self.sen_meta = dy_meta / norma
+
+		# Cópia em listas para a consulta escalar, mais rápida que indexar arrays numpy
+		self.tabela = np.stack(
+			[self.dist_obstaculo, self.dist_meta, self.cos_meta, self.sen_meta], axis=-1
+		).tolist()
+
+	def amostrar(self, x, y):
+		"""(dist_obstaculo, dist_meta, direção absoluta da meta) em (x, y), ou None"""
+		# A comparação também rejeita NaN
+		if not (0 <= x <= self.largura and 0 <= y <= self.altura):
+			return None
+		if (x - self.meta_x)**2 + (y - self.meta_y)**2 < self.raio_exato**2:
+			return None
+		gx = x / self.resolucao
+		gy = y / self.resolucao
+		ix = min(int(gx), self.nx - 2)
+		iy = min(int(gy), self.ny - 2)
+		fx = gx - ix
+		fy = gy - iy
+		linha = self.tabela[iy]
+		proxima = self.tabela[iy + 1]
+		a, b, c, d = linha[ix], linha[ix + 1], proxima[ix], proxima[ix + 1]
+		pa, pb, pc, pd = (1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy
+		dist_obstaculo = pa * a[0] + pb * b[0] + pc * c[0] + pd * d[0] if self.tem_obstaculos else float('inf')
+		dist_meta = pa * a[1] + pb * b[1] + pc * c[1] + pd * d[1]
+		cos_meta = pa * a[2] + pb * b[2] + pc * c[2] + pd * d[2]
+		sen_meta = pa * a[3] + pb * b[3] + pc * c[3] + pd * d[3]
+		return dist_obstaculo, dist_meta, math.atan2(sen_meta, cos_meta)
+
+	def amostrar_lote(self, x, y):
+		"""Versão vetorizada de amostrar; devolve também a máscara das posições válidas"""
+		validos = (
+			(x >= 0) & (x <= self.largura) & (y >= 0) & (y <= self.altura) &
+			((x - self.meta_x)**2 + (y - self.meta_y)**2 >= self.raio_exato**2)
+		)
+		gx = np.where(validos, x / self.resolucao, 0.0)
+		gy = np.where(validos, y / self.resolucao, 0.0)
+		ix = np.minimum(gx.astype(int), self.nx - 2)
+		iy = np.minimum(gy.astype(int), self.ny - 2)
+		fx = gx - ix
+		fy = gy - iy
+
+		def interpolar(campo):
+			return (
+				campo[iy, ix] * (1 - fx) * (1 - fy) + campo[iy, ix + 1] * fx * (1 - fy) +
+				campo[iy + 1, ix] * (1 - fx) * fy + campo[iy + 1, ix + 1] * fx * fy
+			)
+
+		dist_obstaculo = interpolar(self.dist_obstaculo) if self.tem_obstaculos else np.full(len(x), np.inf)
+		direcao_meta = np.arctan2(interpolar(self.sen_meta), interpolar(self.cos_meta))
+		return dist_obstaculo, interpolar(self.dist_meta), direcao_meta, validos
+
 class Ambiente:
-	def __init__(self, largura=800, altura=600, num_obstaculos=5, num_recursos=5):
+	def __init__(self, largura=800, altura=600, num_obstaculos=5, num_recursos=5, indice_espacial=False,
+			tamanho_celula=50, resolucao_campos=None, rng=None):
 		self.largura = largura
 		self.altura = altura
+		# Gerador do layout (random.Random); None usa o gerador global
+		self.rng = rng
 		self.obstaculos = self.gerar_obstaculos(num_obstaculos)
 		self.recursos = self.gerar_recursos(num_recursos)
 		self.tempo = 0
 		self.max_tempo = 1000 # Tempo máximo de simulação
 		self.meta = self.gerar_meta() # Adicionando a meta
 		self.meta_atingida = False # Flag para controlar se a meta foi atingida
+		# Índice espacial opcional para colisões e coleta (construído uma vez)
+		self.indice = IndiceEspacial(self.obstaculos, self.recursos, tamanho_celula) if indice_espacial else None
+		# Rasters opcionais dos sensores estáticos (None = cálculo exato)
+		self.resolucao_campos = resolucao_campos
+		self._campos = None
 
 	def gerar_obstaculos(self, num_obstaculos):
+		rng = self.rng or random
 		obstaculos = []
 		for _ in range(num_obstaculos):
-			x = random.randint(50, self.largura - 50)
-			y = random.randint(50, self.altura - 50)
-			largura = random.randint(20, 100)
-			altura = random.randint(20, 100)
+			x = rng.randint(50, self.largura - 50)
+			y = rng.randint(50, self.altura - 50)
+			largura = rng.randint(20, 100)
+			altura = rng.randint(20, 100)
 			obstaculos.append({
 				'x': x,
 				'y': y,
@@ -38,6 +216,7 @@ class Ambiente:
 		return obstaculos
 
 	def gerar_recursos(self, num_recursos):
+		rng = self.rng or random
 		recursos = []
 		max_tentativas = 100 # Número máximo de tentativas para encontrar posição válida
 
@@ -46,8 +225,8 @@ class Ambiente:
 			posicao_valida = False
 
 			while not posicao_valida and tentativas < max_tentativas:
-				x = random.randint(20, self.largura - 20)
-				y = random.randint(20, self.altura - 20)
+				x = rng.randint(20, self.largura - 20)
+				y = rng.randint(20, self.altura - 20)
 
 				# Verificar se a posição está dentro de algum obstáculo
 				posicao_valida = True
@@ -82,12 +261,13 @@ class Ambiente:
 
 	def gerar_meta(self):
 		# Gerar a meta em uma posição segura, longe dos obstáculos
+		rng = self.rng or random
 		max_tentativas = 100
 		margem = 50 # Margem das bordas
 
 		for _ in range(max_tentativas):
-			x = random.randint(margem, self.largura - margem)
-			y = random.randint(margem, self.altura - margem)
+			x = rng.randint(margem, self.largura - margem)
+			y = rng.randint(margem, self.altura - margem)
 
 			# Verificar se a posição está longe o suficiente dos obstáculos
 			posicao_segura = True
@@ -120,8 +300,11 @@ class Ambiente:
 		if x - raio < 0 or x + raio > self.largura or y - raio < 0 or y + raio > self.altura:
 			return True
 
-		# Verificar colisão com obstáculos
-		for obstaculo in self.obstaculos:
+		# Verificar colisão com obstáculos (apenas os próximos, se houver índice)
+		obstaculos = None
+		if self.indice is not None:
+			obstaculos = self.indice.obstaculos_proximos(x, y, raio)
+		for obstaculo in obstaculos if obstaculos is not None else self.obstaculos:
 			if (x + raio > obstaculo['x'] and 
 				x - raio < obstaculo['x'] + obstaculo['largura'] and
 				y + raio > obstaculo['y'] and 
@@ -132,7 +315,10 @@ class Ambiente:
 
 	def verificar_coleta_recursos(self, x, y, raio):
 		recursos_coletados = 0
-		for recurso in self.recursos:
+		recursos = None
+		if self.indice is not None:
+			recursos = self.indice.recursos_proximos(x, y, raio + 10)
+		for recurso in recursos if recursos is not None else self.recursos:
 			if not recurso['coletado']:
 				distancia = np.sqrt((x - recurso['x'])**2 + (y - recurso['y'])**2)
 				if distancia < raio + 10: # 10 é o raio do recurso
@@ -163,6 +349,53 @@ class Ambiente:
 			'meta_atingida': self.meta_atingida
 		}
 
+	def campos_distancia(self):
+		"""Rasters dos sensores estáticos, construídos na primeira consulta (None no modo exato)"""
+		if self.resolucao_campos is None:
+			return None
+		if self._campos is None:
+			self._campos = CamposDistancia(self, self.resolucao_campos)
+		return self._campos
+
+	def layout(self):
+		"""Descrição serializável (JSON) do layout estático do ambiente"""
+		return {
+			'largura': self.largura,
+			'altura': self.altura,
+			'max_tempo': self.max_tempo,
+			'obstaculos': [dict(obstaculo) for obstaculo in self.obstaculos],
+			'recursos': [[recurso['x'], recurso['y']] for recurso in self.recursos],
+			'meta': dict(self.meta)
+		}
+
+	@classmethod
+	def de_layout(cls, layout):
+		"""Recria um ambiente a partir de Ambiente.layout(), sem sortear nada"""
+		ambiente = cls.__new__(cls)
+		ambiente.largura = layout['largura']
+		ambiente.altura = layout['altura']
+		ambiente.obstaculos = [dict(obstaculo) for obstaculo in layout['obstaculos']]
+		ambiente.recursos = [{'x': x, 'y': y, 'coletado': False} for x, y in layout['recursos']]
+		ambiente.tempo = 0
+		ambiente.max_tempo = layout['max_tempo']
+		ambiente.meta = dict(layout['meta'])
+		ambiente.meta_atingida = False
+		ambiente.indice = None
+		ambiente.resolucao_campos = None
+		ambiente.rng = None
+		ambiente._campos = None
+		return ambiente
+
+	def identificador(self):
+		"""Identificador determinístico do layout (dimensões, obstáculos, recursos e meta)"""
+		# A resolução dos rasters entra porque muda os valores dos sensores
+		layout = json.dumps([
+			self.largura, self.altura, self.max_tempo, self.obstaculos,
+			[(recurso['x'], recurso['y']) for recurso in self.recursos], self.meta,
+			self.resolucao_campos
+		], sort_keys=True)
+		return hashlib.blake2b(layout.encode(), digest_size=16).hexdigest()
+
 	def passo(self):
 		self.tempo += 1
 		return self.tempo >= self.max_tempo
@@ -194,6 +427,27 @@ class Ambiente:
 		# Se não encontrar uma posição segura, retorna o centro
 		return self.largura // 2, self.altura // 2
 
+# Layouts nomeados e com semente fixa, para comparar execuções e versões do código
+CENARIOS = {
+	'padrao': {'largura': 800, 'altura': 600, 'num_obstaculos': 5, 'num_recursos': 5, 'semente': 1},
+	'medio': {'largura': 800, 'altura': 600, 'num_obstaculos': 15, 'num_recursos': 10, 'semente': 2},
+	# Os cenários com muitos obstáculos usam o índice espacial (mesmas respostas, menos testes)
+	'denso': {'largura': 800, 'altura': 600, 'num_obstaculos': 40, 'num_recursos': 15, 'semente': 3, 'indice_espacial': True},
+	'grande': {'largura': 1600, 'altura': 1200, 'num_obstaculos': 60, 'num_recursos': 25, 'semente': 4, 'indice_espacial': True},
+	'grande_denso': {
+		'largura': 2400, 'altura': 1800, 'num_obstaculos': 200, 'num_recursos': 50, 'semente': 5, 'indice_espacial': True
+	},
+}
+
+def criar_cenario(nome, **opcoes):
+	"""Ambiente do cenário 'nome' de CENARIOS; o layout não depende do gerador global.
+
+	As opções têm prioridade sobre as do cenário (por exemplo indice_espacial=False).
+	"""
+	cenario = dict(CENARIOS[nome], **opcoes)
+	rng = random.Random(cenario.pop('semente'))
+	return Ambiente(rng=rng, **cenario)
+
 class Robo:
 	def __init__(self, x, y, raio=15):
 		self.x = x
@@ -280,29 +534,28 @@ class Robo:
 
 		return self.energia <= 0
 
-	def get_sensores(self, ambiente):
+	def get_sensores(self, ambiente, variaveis=None):
+		"""Valores dos sensores; com 'variaveis', só esses são calculados e os demais valem 0.
+
+		Cálculos comuns a vários sensores (a amostra dos campos de distância, a
+		direção da meta) são feitos uma única vez por chamada.
+		"""
+		if variaveis is None:
+			variaveis = VARIAVEIS_SENSORES
+		sensores = dict.fromkeys(VARIAVEIS_SENSORES, 0)
+
 		# Distância até o recurso mais próximo
-		dist_recurso = float('inf')
-		for recurso in ambiente.recursos:
-			if not recurso['coletado']:
-				dist = np.sqrt((self.x - recurso['x'])**2 + (self.y - recurso['y'])**2)
-				dist_recurso = min(dist_recurso, dist)
-
-		# Distância até o obstáculo mais próximo
-		dist_obstaculo = float('inf')
-		for obstaculo in ambiente.obstaculos:
-			# Simplificação: considerar apenas a distância até o centro do obstáculo
-			centro_x = obstaculo['x'] + obstaculo['largura'] / 2
-			centro_y = obstaculo['y'] + obstaculo['altura'] / 2
-			dist = np.sqrt((self.x - centro_x)**2 + (self.y - centro_y)**2)
-			dist_obstaculo = min(dist_obstaculo, dist)
-
-		# Distância até a meta
-		dist_meta = np.sqrt((self.x - ambiente.meta['x'])**2 + (self.y - ambiente.meta['y'])**2)
-
-		# Ângulo até o recurso mais próximo
-		angulo_recurso = 0
-		if dist_recurso < float('inf'):
+		if 'dist_recurso' in variaveis:
+			dist_recurso = float('inf')
+			for recurso in ambiente.recursos:
+				if not recurso['coletado']:
+					dist = np.sqrt((self.x - recurso['x'])**2 + (self.y - recurso['y'])**2)
+					dist_recurso = min(dist_recurso, dist)
+			sensores['dist_recurso'] = dist_recurso
+
+		# Ângulo até o primeiro recurso não coletado (0 se não houver)
+		if 'angulo_recurso' in variaveis:
+			angulo_recurso = 0
 			for recurso in ambiente.recursos:
 				if not recurso['coletado']:
 					dx = recurso['x'] - self.x
@@ -315,54 +568,244 @@ class Robo:
 					while angulo_recurso < -np.pi:
 						angulo_recurso += 2 * np.pi
 					break
+			sensores['angulo_recurso'] = angulo_recurso
+
+		usa_obstaculo = 'dist_obstaculo' in variaveis
+		usa_meta = 'dist_meta' in variaveis
+		usa_angulo_meta = 'angulo_meta' in variaveis
+		if usa_obstaculo or usa_meta or usa_angulo_meta:
+			# Obstáculos e meta são estáticos: usa os rasters do ambiente quando disponíveis
+			campos = ambiente.campos_distancia()
+			amostra = campos.amostrar(self.x, self.y) if campos is not None else None
+			if amostra is not None:
+				dist_obstaculo, dist_meta, direcao_meta = amostra
+			else:
+				if usa_obstaculo:
+					# Distância até o obstáculo mais próximo
+					dist_obstaculo = float('inf')
+					for obstaculo in ambiente.obstaculos:
+						# Simplificação: considerar apenas a distância até o centro do obstáculo
+						centro_x = obstaculo['x'] + obstaculo['largura'] / 2
+						centro_y = obstaculo['y'] + obstaculo['altura'] / 2
+						dist = np.sqrt((self.x - centro_x)**2 + (self.y - centro_y)**2)
+						dist_obstaculo = min(dist_obstaculo, dist)
+
+				# Distância até a meta
+				if usa_meta:
+					dist_meta = np.sqrt((self.x - ambiente.meta['x'])**2 + (self.y - ambiente.meta['y'])**2)
+
+				if usa_angulo_meta:
+					dx_meta = ambiente.meta['x'] - self.x
+					dy_meta = ambiente.meta['y'] - self.y
+					direcao_meta = np.arctan2(dy_meta, dx_meta)
+
+			if usa_obstaculo:
+				sensores['dist_obstaculo'] = dist_obstaculo
+			if usa_meta:
+				sensores['dist_meta'] = dist_meta
+			if usa_angulo_meta:
+				# Ângulo até a meta
+				angulo_meta = direcao_meta - self.angulo
+				# Normalizar para [-pi, pi]
+				while angulo_meta > np.pi:
+					angulo_meta -= 2 * np.pi
+				while angulo_meta < -np.pi:
+					angulo_meta += 2 * np.pi
+				sensores['angulo_meta'] = angulo_meta
+
+		if 'energia' in variaveis:
+			sensores['energia'] = self.energia
+		if 'velocidade' in variaveis:
+			sensores['velocidade'] = self.velocidade
+		if 'meta_atingida' in variaveis:
+			sensores['meta_atingida'] = self.meta_atingida
+		return sensores
+
+class GravadorTrajetoria:
+	"""Estado passo a passo de um episódio em buffers numpy pré-alocados.
+
+	A linha 0 guarda o estado inicial e a linha i o estado após o passo i, junto
+	com os sensores lidos e os controles aplicados nesse passo. Os eventos de
+	cada passo são bits (COLISAO, COLETA, META) e, para cada recurso, guarda-se
+	o passo em que foi coletado (-1 = nunca). Com isso a gravação basta para
+	reconstruir o robô e o ambiente em qualquer passo, sem executar a política.
+	"""
+	COLISAO = 1
+	COLETA = 2
+	META = 4
+
+	def __init__(self, capacidade=1000):
+		self.capacidade = capacidade
+		self.n = 0 # Passos gravados
+		self.layout = None
+		self.posicao = np.zeros((capacidade + 1, 2), dtype=np.float32)
+		self.angulo = np.zeros(capacidade + 1, dtype=np.float32)
+		self.velocidade = np.zeros(capacidade + 1, dtype=np.float32)
+		self.energia = np.zeros(capacidade + 1, dtype=np.float32)
+		self.distancia = np.zeros(capacidade + 1, dtype=np.float32)
+		self.sensores = np.zeros((capacidade + 1, len(VARIAVEIS_SENSORES)), dtype=np.float32)
+		self.controles = np.zeros((capacidade + 1, 2), dtype=np.float32)
+		self.eventos = np.zeros(capacidade + 1, dtype=np.uint8)
+		self.passo_coleta = np.zeros(0, dtype=np.int32)
+		self._acumulados = None # (colisões, meta) até cada passo; refeito depois de novos passos
+
+	def iniciar(self, ambiente, robo):
+		"""Começa uma nova gravação a partir do estado atual (já resetado) do robô"""
+		self.n = 0
+		self.layout = ambiente.layout()
+		self.passo_coleta = np.full(len(ambiente.recursos), -1, dtype=np.int32)
+		self._colisoes = robo.colisoes
+		self._recursos = robo.recursos_coletados
+		self._meta = robo.meta_atingida
+		self.gravar_estado(0, robo)
+
+	def gravar_estado(self, i, robo):
+		self.posicao[i] = robo.x, robo.y
+		self.angulo[i] = robo.angulo
+		self.velocidade[i] = robo.velocidade
+		self.energia[i] = robo.energia
+		self.distancia[i] = robo.distancia_percorrida
+
+	def registrar(self, robo, ambiente, sensores, aceleracao, rotacao):
+		"""Grava o passo recém-executado (chamar depois de Robo.mover)"""
+		i = self.n + 1
+		if i > self.capacidade:
+			self.ampliar()
+		self.gravar_estado(i, robo)
+		self.sensores[i] = ler_sensores(sensores)
+		self.controles[i] = aceleracao, rotacao
+
+		eventos = 0
+		if robo.colisoes != self._colisoes:
+			eventos |= self.COLISAO
+			self._colisoes = robo.colisoes
+		if robo.recursos_coletados != self._recursos:
+			eventos |= self.COLETA
+			self._recursos = robo.recursos_coletados
+			for k, recurso in enumerate(ambiente.recursos):
+				if recurso['coletado'] and self.passo_coleta[k] < 0:
+					self.passo_coleta[k] = i
+		if robo.meta_atingida and not self._meta:
+			eventos |= self.META
+			self._meta = True
+		self.eventos[i] = eventos
+		self.n = i
+		self._acumulados = None
+
+	def ampliar(self):
+		# Episódio maior que o previsto: dobra os buffers
+		self.capacidade *= 2
+		for nome in ('posicao', 'angulo', 'velocidade', 'energia', 'distancia', 'sensores', 'controles', 'eventos'):
+			antigo = getattr(self, nome)
+			novo = np.zeros((self.capacidade + 1,) + antigo.shape[1:], dtype=antigo.dtype)
+			novo[:len(antigo)] = antigo
+			setattr(self, nome, novo)
+
+	def acumulados(self):
+		"""Colisões e meta atingida até cada passo (somas prefixas dos eventos, calculadas uma vez)"""
+		if self._acumulados is None:
+			# A linha 0 é o estado inicial e nunca tem eventos
+			eventos = self.eventos[:self.n + 1]
+			self._acumulados = (
+				np.cumsum((eventos & self.COLISAO) != 0), np.logical_or.accumulate((eventos & self.META) != 0)
+			)
+		return self._acumulados
+
+	def aplicar(self, i, robo, ambiente):
+		"""Coloca o robô e o ambiente no estado gravado do passo i (custo constante no número de passos)"""
+		robo.x, robo.y = float(self.posicao[i, 0]), float(self.posicao[i, 1])
+		robo.angulo = float(self.angulo[i])
+		robo.velocidade = float(self.velocidade[i])
+		robo.energia = float(self.energia[i])
+		robo.distancia_percorrida = float(self.distancia[i])
+		colisoes, meta = self.acumulados()
+		robo.colisoes = int(colisoes[i])
+		robo.meta_atingida = bool(meta[i])
+		coletados = (self.passo_coleta >= 0) & (self.passo_coleta <= i)
+		robo.recursos_coletados = int(coletados.sum())
+		for recurso, coletado in zip(ambiente.recursos, coletados):
+			recurso['coletado'] = bool(coletado)
+		ambiente.tempo = i
+		ambiente.meta_atingida = robo.meta_atingida
+
+	def ambiente(self):
+		"""Ambiente com o layout gravado"""
+		return Ambiente.de_layout(self.layout)
 
-		# Ângulo até a meta
-		dx_meta = ambiente.meta['x'] - self.x
-		dy_meta = ambiente.meta['y'] - self.y
-		angulo_meta = np.arctan2(dy_meta, dx_meta) - self.angulo
-		# Normalizar para [-pi, pi]
-		while angulo_meta > np.pi:
-			angulo_meta -= 2 * np.pi
-		while angulo_meta < -np.pi:
-			angulo_meta += 2 * np.pi
+	def salvar(self, arquivo):
+		"""Salva a gravação em um .npz comprimido"""
+		fim = self.n + 1
+		np.savez_compressed(
+			arquivo,
+			layout=np.array(json.dumps(self.layout)),
+			posicao=self.posicao[:fim],
+			angulo=self.angulo[:fim],
+			velocidade=self.velocidade[:fim],
+			energia=self.energia[:fim],
+			distancia=self.distancia[:fim],
+			sensores=self.sensores[:fim],
+			controles=self.controles[:fim],
+			eventos=self.eventos[:fim],
+			passo_coleta=self.passo_coleta
+		)
 
-		return {
-			'dist_recurso': dist_recurso,
-			'dist_obstaculo': dist_obstaculo,
-			'dist_meta': dist_meta,
-			'angulo_recurso': angulo_recurso,
-			'angulo_meta': angulo_meta,
-			'energia': self.energia,
-			'velocidade': self.velocidade,
-			'meta_atingida': self.meta_atingida
-		}
+	@classmethod
+	def carregar(cls, arquivo):
+		with np.load(arquivo) as dados:
+			gravador = cls(len(dados['eventos']) - 1)
+			gravador.n = gravador.capacidade
+			gravador.layout = json.loads(str(dados['layout']))
+			for nome in ('posicao', 'angulo', 'velocidade', 'energia', 'distancia', 'sensores', 'controles',
+					'eventos', 'passo_coleta'):
+				setattr(gravador, nome, dados[nome])
+		return gravador
 
 class Simulador:
-	def __init__(self, ambiente, robo, individuo):
+	"""Visualização da simulação de um indivíduo.
+
+	A cena estática (obstáculos, recursos e meta) é desenhada uma única vez; a
+	cada passo só o robô, a linha de direção e o texto são atualizados e
+	redesenhados por blitting sobre o fundo salvo. O fundo só é refeito quando
+	um recurso é coletado, e o texto, cujo desenho é o mais caro, é renovado a
+	cada 'passos_texto' passos. Com 'arquivo_saida' (.gif ou vídeo via ffmpeg) a
+	simulação roda sem janela e cada passo vira um quadro do arquivo.
+
+	Cada execução é gravada em self.frames (GravadorTrajetoria). Com
+	'trajetoria', simular e animar reproduzem uma gravação em vez de executar
+	o indivíduo.
+	"""
+	def __init__(self, ambiente, robo, individuo, arquivo_saida=None, intervalo=0.02, fps=20, dpi=80,
+			passos_texto=10, trajetoria=None):
 		self.ambiente = ambiente
 		self.robo = robo
 		self.individuo = individuo
-		self.frames = []
+		self.trajetoria = trajetoria
+		self.frames = trajetoria
+		self.arquivo_saida = arquivo_saida
+		self.intervalo = intervalo # Pausa entre passos na janela interativa (segundos)
+		self.fps = fps
+		self.dpi = dpi
+		self.passos_texto = passos_texto
 
 		plt.style.use('default') # Usar estilo padrão
-		plt.ion() # Modo interativo
-		self.fig, self.ax = plt.subplots(figsize=(12, 8))
-		self.ax.set_xlim(0, ambiente.largura)
-		self.ax.set_ylim(0, ambiente.altura)
-		self.ax.set_title("Simulador de Robô com Programação Genética", fontsize=14)
-		self.ax.set_xlabel("X", fontsize=12)
-		self.ax.set_ylabel("Y", fontsize=12)
-		self.ax.grid(True, linestyle='--', alpha=0.7)
+		if arquivo_saida is None:
+			plt.ion() # Modo interativo
+			self.fig, self.ax = plt.subplots(figsize=(12, 8))
+		else:
+			# Figura fora do pyplot: não depende de backend interativo
+			self.fig = Figure(figsize=(12, 8))
+			FigureCanvasAgg(self.fig)
+			self.ax = self.fig.add_subplot()
+		self.configurar_eixos()
 
-	def simular(self):
-		self.ambiente.reset()
-		# Encontrar uma posição segura para o robô
-		x_inicial, y_inicial = self.ambiente.posicao_segura(self.robo.raio)
-		self.robo.reset(x_inicial, y_inicial)
-		self.frames = []
+	@classmethod
+	def de_trajetoria(cls, trajetoria, **opcoes):
+		"""Simulador que reproduz uma gravação (objeto ou arquivo .npz) no ambiente gravado"""
+		if not isinstance(trajetoria, GravadorTrajetoria):
+			trajetoria = GravadorTrajetoria.carregar(trajetoria)
+		return cls(trajetoria.ambiente(), Robo(0, 0), None, trajetoria=trajetoria, **opcoes)
 
-		# Limpar a figura atual
-		self.ax.clear()
+	def configurar_eixos(self):
 		self.ax.set_xlim(0, self.ambiente.largura)
 		self.ax.set_ylim(0, self.ambiente.altura)
 		self.ax.set_title("Simulador de Robô com Programação Genética", fontsize=14)
@@ -370,6 +813,12 @@ class Simulador:
 		self.ax.set_ylabel("Y", fontsize=12)
 		self.ax.grid(True, linestyle='--', alpha=0.7)
 
+	def desenhar_cena(self):
+		"""Cria todos os artistas; os do robô e o texto são marcados como animados para o blitting"""
+		self.ax.clear()
+		self.configurar_eixos()
+		animado = self.arquivo_saida is None
+
 		# Desenhar obstáculos (estáticos)
 		for obstaculo in self.ambiente.obstaculos:
 			rect = patches.Rectangle(
@@ -383,18 +832,20 @@ class Simulador:
 			)
 			self.ax.add_patch(rect)
 
-		# Desenhar recursos (estáticos)
+		# Desenhar recursos (ficam invisíveis quando coletados)
+		self.circulos_recursos = []
 		for recurso in self.ambiente.recursos:
-			if not recurso['coletado']:
-				circ = patches.Circle(
-					(recurso['x'], recurso['y']),
-					10,
-					linewidth=1,
-					edgecolor='black',
-					facecolor='#99FF99', # Verde claro
-					alpha=0.8
-				)
-				self.ax.add_patch(circ)
+			circ = patches.Circle(
+				(recurso['x'], recurso['y']),
+				10,
+				linewidth=1,
+				edgecolor='black',
+				facecolor='#99FF99', # Verde claro
+				alpha=0.8,
+				visible=not recurso['coletado']
+			)
+			self.ax.add_patch(circ)
+			self.circulos_recursos.append(circ)
 
 		# Desenhar a meta
 		meta_circ = patches.Circle(
@@ -408,125 +859,133 @@ class Simulador:
 		self.ax.add_patch(meta_circ)
 
 		# Criar objetos para o robô e direção (serão atualizados)
-		robo_circ = patches.Circle(
+		self.robo_circ = patches.Circle(
 			(self.robo.x, self.robo.y),
 			self.robo.raio,
 			linewidth=1,
 			edgecolor='black',
 			facecolor='#9999FF', # Azul claro
-			alpha=0.8
+			alpha=0.8,
+			animated=animado
 		)
-		self.ax.add_patch(robo_circ)
+		self.ax.add_patch(self.robo_circ)
+		self.linha_direcao, = self.ax.plot([], [], 'r-', linewidth=2, animated=animado)
 
 		# Criar texto para informações
-		info_text = self.ax.text(
+		self.info_text = self.ax.text(
 			10, self.ambiente.altura - 50, # Alterado de 10 para 50 para descer a legenda
 			"",
 			fontsize=12,
-			bbox=dict(facecolor='white', alpha=0.8, edgecolor='gray', boxstyle='round,pad=0.5')
+			bbox=dict(facecolor='white', alpha=0.8, edgecolor='gray', boxstyle='round,pad=0.5'),
+			animated=animado
+		)
+		self.atualizar_artistas()
+
+	def atualizar_artistas(self):
+		"""Atualiza os artistas com o estado atual; devolve True se algum recurso sumiu da cena"""
+		self.robo_circ.center = (self.robo.x, self.robo.y)
+		direcao_x = self.robo.x + self.robo.raio * np.cos(self.robo.angulo)
+		direcao_y = self.robo.y + self.robo.raio * np.sin(self.robo.angulo)
+		self.linha_direcao.set_data([self.robo.x, direcao_x], [self.robo.y, direcao_y])
+		self.info_text.set_text(
+			f"Tempo: {self.ambiente.tempo}\n"
+			f"Recursos: {self.robo.recursos_coletados}/{len(self.ambiente.recursos)}\n"
+			f"Energia: {self.robo.energia:.1f}\n"
+			f"Colisões: {self.robo.colisoes}\n"
+			f"Distância: {self.robo.distancia_percorrida:.1f}\n"
+			f"Meta atingida: {'Sim' if self.robo.meta_atingida else 'Não'}"
 		)
 
-		# Atualizar a figura
-		plt.draw()
-		plt.pause(0.01)
+		fundo_mudou = False
+		for recurso, circ in zip(self.ambiente.recursos, self.circulos_recursos):
+			if recurso['coletado'] and circ.get_visible():
+				circ.set_visible(False)
+				fundo_mudou = True
+		return fundo_mudou
+
+	def salvar_fundo(self):
+		# Artistas animados não entram no desenho completo, então o fundo sai sem o robô
+		canvas = self.fig.canvas
+		canvas.draw()
+		self.fundo = canvas.copy_from_bbox(self.ax.bbox) if canvas.supports_blit else None
+		self.fundo_texto = None
+
+	def redesenhar(self, renovar_texto=True):
+		"""Redesenha só os artistas animados sobre o fundo salvo"""
+		canvas = self.fig.canvas
+		if self.fundo is None:
+			# Backend sem blitting: desenho completo
+			canvas.draw_idle()
+		else:
+			if renovar_texto or self.fundo_texto is None:
+				# Segunda camada de fundo: cena estática + texto
+				canvas.restore_region(self.fundo)
+				self.ax.draw_artist(self.info_text)
+				self.fundo_texto = canvas.copy_from_bbox(self.ax.bbox)
+			else:
+				canvas.restore_region(self.fundo_texto)
+			self.ax.draw_artist(self.robo_circ)
+			self.ax.draw_artist(self.linha_direcao)
+			canvas.blit(self.ax.bbox)
+		canvas.flush_events()
 
-		try:
-			while True:
-				# Obter sensores
-				sensores = self.robo.get_sensores(self.ambiente)
+	def passo(self):
+		"""Executa um passo do robô; devolve True quando a simulação termina"""
+		if self.trajetoria is not None:
+			self.passo_atual += 1
+			self.trajetoria.aplicar(self.passo_atual, self.robo, self.ambiente)
+			return self.passo_atual >= self.trajetoria.n
 
-				# Avaliar árvores de decisão
-				aceleracao = self.individuo.avaliar(sensores, 'aceleracao')
-				rotacao = self.individuo.avaliar(sensores, 'rotacao')
+		# Obter sensores
+		sensores = self.robo.get_sensores(self.ambiente)
 
-				# Limitar valores
-				aceleracao = max(-1, min(1, aceleracao))
-				rotacao = max(-0.5, min(0.5, rotacao))
+		# Avaliar árvores de decisão
+		aceleracao, rotacao = self.individuo.compilar()(*ler_sensores(sensores))
 
-				# Mover robô
-				sem_energia = self.robo.mover(aceleracao, rotacao, self.ambiente)
+		# Limitar valores
+		aceleracao = max(-1, min(1, aceleracao))
+		rotacao = max(-0.5, min(0.5, rotacao))
 
-				# Atualizar visualização em tempo real
-				self.ax.clear()
-				self.ax.set_xlim(0, self.ambiente.largura)
-				self.ax.set_ylim(0, self.ambiente.altura)
-				self.ax.set_title("Simulador de Robô com Programação Genética", fontsize=14)
-				self.ax.set_xlabel("X", fontsize=12)
-				self.ax.set_ylabel("Y", fontsize=12)
-				self.ax.grid(True, linestyle='--', alpha=0.7)
-
-				# Desenhar obstáculos
-				for obstaculo in self.ambiente.obstaculos:
-					rect = patches.Rectangle(
-						(obstaculo['x'], obstaculo['y']),
-						obstaculo['largura'],
-						obstaculo['altura'],
-						linewidth=1,
-						edgecolor='black',
-						facecolor='#FF9999',
-						alpha=0.7
-					)
-					self.ax.add_patch(rect)
-
-				# Desenhar recursos
-				for recurso in self.ambiente.recursos:
-					if not recurso['coletado']:
-						circ = patches.Circle(
-							(recurso['x'], recurso['y']),
-							10,
-							linewidth=1,
-							edgecolor='black',
-							facecolor='#99FF99',
-							alpha=0.8
-						)
-						self.ax.add_patch(circ)
-
-				# Desenhar a meta
-				meta_circ = patches.Circle(
-					(self.ambiente.meta['x'], self.ambiente.meta['y']),
-					self.ambiente.meta['raio'],
-					linewidth=2,
-					edgecolor='black',
-					facecolor='#FFFF00', # Amarelo
-					alpha=0.8
-				)
-				self.ax.add_patch(meta_circ)
-
-				# Desenhar robô
-				robo_circ = patches.Circle(
-					(self.robo.x, self.robo.y),
-					self.robo.raio,
-					linewidth=1,
-					edgecolor='black',
-					facecolor='#9999FF',
-					alpha=0.8
-				)
-				self.ax.add_patch(robo_circ)
-
-				# Desenhar direção do robô
-				direcao_x = self.robo.x + self.robo.raio * np.cos(self.robo.angulo)
-				direcao_y = self.robo.y + self.robo.raio * np.sin(self.robo.angulo)
-				self.ax.plot([self.robo.x, direcao_x], [self.robo.y, direcao_y], 'r-', linewidth=2)
-
-				# Adicionar informações
-				info_text = self.ax.text(
-					10, self.ambiente.altura - 50, # Alterado de 10 para 50 para descer a legenda
-					f"Tempo: {self.ambiente.tempo}\n"
-					f"Recursos: {self.robo.recursos_coletados}/{len(ambiente.recursos)}\n"
-					f"Energia: {self.robo.energia:.1f}\n"
-					f"Colisões: {self.robo.colisoes}\n"
-					f"Distância: {self.robo.distancia_percorrida:.1f}\n"
-					f"Meta atingida: {'Sim' if self.robo.meta_atingida else 'Não'}",
-					fontsize=12,
-					bbox=dict(facecolor='white', alpha=0.8, edgecolor='gray', boxstyle='round,pad=0.5')
-				)
+		# Mover robô
+		sem_energia = self.robo.mover(aceleracao, rotacao, self.ambiente)
+		self.frames.registrar(self.robo, self.ambiente, sensores, aceleracao, rotacao)
+		return sem_energia or self.ambiente.passo()
 
-				# Atualizar a figura
-				plt.draw()
-				plt.pause(0.05)
+	def simular(self):
+		self.passo_atual = 0
+		if self.trajetoria is not None:
+			self.trajetoria.aplicar(0, self.robo, self.ambiente)
+		else:
+			self.ambiente.reset()
+			# Encontrar uma posição segura para o robô
+			x_inicial, y_inicial = self.ambiente.posicao_segura(self.robo.raio)
+			self.robo.reset(x_inicial, y_inicial)
+			self.frames = GravadorTrajetoria(self.ambiente.max_tempo)
+			self.frames.iniciar(self.ambiente, self.robo)
+		self.desenhar_cena()
+
+		if self.arquivo_saida is not None:
+			self.gravar()
+			return self.frames
+
+		# Atualizar a figura
+		plt.show(block=False)
+		self.salvar_fundo()
+		self.redesenhar()
+
+		try:
+			while True:
+				terminou = self.passo()
+
+				# Atualizar visualização em tempo real
+				if self.atualizar_artistas():
+					self.salvar_fundo()
+				self.redesenhar(terminou or self.ambiente.tempo % self.passos_texto == 0)
+				if self.intervalo:
+					time.sleep(self.intervalo)
 
 				# Verificar fim da simulação
-				if sem_energia or self.ambiente.passo():
+				if terminou:
 					break
 
 			# Manter a figura aberta até que o usuário a feche
@@ -538,24 +997,53 @@ class Simulador:
 
 		return self.frames
 
-	def animar(self):
+	def gravar(self):
+		"""Simula sem janela, gravando um quadro por passo em self.arquivo_saida"""
+		if self.arquivo_saida.lower().endswith('.gif'):
+			escritor = animation.PillowWriter(fps=self.fps)
+		else:
+			escritor = animation.FFMpegWriter(fps=self.fps)
+		with escritor.saving(self.fig, self.arquivo_saida, self.dpi):
+			escritor.grab_frame()
+			while True:
+				terminou = self.passo()
+				self.atualizar_artistas()
+				escritor.grab_frame()
+				if terminou:
+					break
+
+	def animar(self, arquivo=None):
+		"""Reproduz self.frames (da última simulação ou carregado) sem executar o indivíduo"""
+		if self.frames is None:
+			raise ValueError("Nada para animar: execute simular() ou use Simulador.de_trajetoria")
+		self.trajetoria = self.frames
+		self.desenhar_cena()
+
 		# Desativar o modo interativo antes de criar a animação
-		plt.ioff()
+		if self.arquivo_saida is None:
+			plt.ioff()
 
 		# Criar a animação
 		anim = animation.FuncAnimation(
 			self.fig, self.atualizar_frame,
-			frames=len(self.frames),
+			frames=self.frames.n + 1,
 			interval=50,
 			blit=True,
-			repeat=True # Permitir que a animação repita
+			repeat=arquivo is None # Permitir que a animação repita
 		)
 
-		# Mostrar a animação e manter a janela aberta
-		plt.show(block=True)
+		if arquivo is not None:
+			escritor = animation.PillowWriter(fps=self.fps) if arquivo.lower().endswith('.gif') else animation.FFMpegWriter(fps=self.fps)
+			anim.save(arquivo, writer=escritor, dpi=self.dpi)
+		else:
+			# Mostrar a animação e manter a janela aberta
+			plt.show(block=True)
+		return anim
 
 	def atualizar_frame(self, frame_idx):
-		return self.frames[frame_idx]
+		self.frames.aplicar(frame_idx, self.robo, self.ambiente)
+		self.atualizar_artistas()
+		return [self.robo_circ, self.linha_direcao, self.info_text] + self.circulos_recursos
 
 # =====================================================================
 # PARTE 2: ALGORITMO GENÉTICO (PARA O VOCÊ MODIFICAR)
@@ -563,16 +1051,546 @@ class Simulador:
 # Deve modificar os parâmetros e a lógica para melhorar o desempenho.
 # =====================================================================
 
+# Ordem fixa dos sensores recebidos pelas árvores compiladas
+VARIAVEIS_SENSORES = ('dist_recurso', 'dist_obstaculo', 'dist_meta', 'angulo_recurso',
+	'angulo_meta', 'energia', 'velocidade', 'meta_atingida')
+
+# Extrai os valores dos sensores na ordem de VARIAVEIS_SENSORES
+ler_sensores = operator.itemgetter(*VARIAVEIS_SENSORES)
+
+# Profundidade máxima de blocos 'if' aninhados no código gerado (limite do parser do Python)
+MAX_ANINHAMENTO_COMPILADO = 50
+
+def validar_variaveis(arvore):
+	"""Levanta ValueError se alguma folha da árvore (em dicionários) lê uma variável fora de VARIAVEIS_SENSORES"""
+	pilha = [arvore]
+	while pilha:
+		no = pilha.pop()
+		if no is None:
+			continue
+		if no['tipo'] == 'folha':
+			if 'variavel' in no and no['variavel'] not in VARIAVEIS_SENSORES:
+				raise ValueError(f"Variável de sensor desconhecida: {no['variavel']!r}")
+		else:
+			pilha.append(no['esquerda'])
+			pilha.append(no['direita'])
+
+def compilar_arvores(*arvores, compartilhar=True):
+	"""Compila árvores de decisão em uma única função Python.
+
+	A função gerada recebe os valores dos sensores na ordem de VARIAVEIS_SENSORES
+	e retorna uma tupla com o resultado de cada árvore, com a mesma semântica de
+	IndividuoPG.avaliar_no (divisão protegida e substituição de valores não finitos por 0).
+
+	Com 'compartilhar', as árvores formam um único DAG: uma subexpressão que se
+	repete (na mesma árvore ou nas duas) é calculada uma vez e o temporário é
+	reaproveitado. O número de reaproveitamentos fica em funcao.compartilhadas.
+	"""
+	linhas = []
+	constantes = {}
+	contador = [0]
+	# Identificador estrutural de cada nó (por id), igual para subárvores iguais
+	identificadores = {}
+	estruturas = {}
+	# Subexpressões já emitidas, uma camada por bloco 'if' aberto
+	escopos = [{}]
+	compartilhadas = [0]
+
+	def identificador(no):
+		chave = identificadores.get(id(no))
+		if chave is None:
+			if no is None:
+				estrutura = None
+			elif no['tipo'] == 'folha':
+				# O tipo da constante entra na chave: int, float e escalares NumPy não são intercambiáveis
+				valor = no.get('valor')
+				estrutura = ('c', type(valor), repr(valor)) if 'valor' in no else ('v', no.get('variavel'))
+			else:
+				direita = no['direita'] if no['operador'] not in ('abs', 'sin', 'cos') else None
+				estrutura = (no['operador'], identificador(no['esquerda']), identificador(direita))
+			chave = estruturas.setdefault(estrutura, len(estruturas))
+			identificadores[id(no)] = chave
+		return chave
+
+	def novo_temporario():
+		contador[0] += 1
+		return f"t{contador[0]}"
+
+	def constante(valor):
+		# Escalares NumPy (ex.: constantes dobradas por simplificar_arvore) mantêm o tipo via namespace
+		if type(valor) in (int, float) and math.isfinite(valor):
+			return repr(valor)
+		nome = f"_c{len(constantes)}"
+		constantes[nome] = valor
+		return nome
+
+	def protegido(expr, finito):
+		# Substitui valores não finitos por 0, como no interpretador
+		return expr if finito else f"({expr} if _isfinite({expr}) else 0)"
+
+	def emitir(no, nivel):
+		# Retorna (expressão, é_constante_finita) e emite as linhas necessárias
+		if no is None:
+			return "0", True
+
+		if no['tipo'] == 'folha':
+			if 'valor' in no:
+				expr = constante(no['valor'])
+				return expr, not expr.startswith('_c')
+			if 'variavel' in no:
+				# O nome vai direto para o código executado: só sensores conhecidos
+				if no['variavel'] not in VARIAVEIS_SENSORES:
+					raise ValueError(f"Variável de sensor desconhecida: {no['variavel']!r}")
+				return no['variavel'], False
+			return "0", True
+
+		if compartilhar:
+			chave = identificador(no)
+			for escopo in escopos:
+				if chave in escopo:
+					compartilhadas[0] += 1
+					return escopo[chave]
+			resultado = emitir_operador(no, nivel)
+			escopos[-1][chave] = resultado
+			return resultado
+		return emitir_operador(no, nivel)
+
+	def emitir_operador(no, nivel):
+		indent = "\t" * nivel
+		op = no['operador']
+		esquerda, direita = no['esquerda'], no['direita']
+		destino = novo_temporario()
+
+		if op in ('abs', 'sin', 'cos'):
+			if esquerda is None:
+				return "0", True
+			valor = protegido(*emitir(esquerda, nivel))
+			funcao = {'abs': 'abs', 'sin': '_sin', 'cos': '_cos'}[op]
+			linhas.append(f"{indent}{destino} = {funcao}({valor})")
+			return destino, False
+
+		if esquerda is None or direita is None:
+			return "0", True
+
+		if op in ('if_positivo', 'if_negativo'):
+			# A condição não é protegida; o ramo só é avaliado quando necessário
+			condicao, _ = emitir(esquerda, nivel)
+			comparacao = '>' if op == 'if_positivo' else '<'
+			if nivel < MAX_ANINHAMENTO_COMPILADO:
+				linhas.append(f"{indent}if {condicao} {comparacao} 0:")
+				# Temporários criados dentro do ramo não existem fora dele
+				escopos.append({})
+				ramo, _ = emitir(direita, nivel + 1)
+				escopos.pop()
+				linhas.append(f"{indent}\t{destino} = {ramo}")
+				linhas.append(f"{indent}else:")
+				linhas.append(f"{indent}\t{destino} = 0")
+			else:
+				ramo, _ = emitir(direita, nivel)
+				linhas.append(f"{indent}{destino} = {ramo} if {condicao} {comparacao} 0 else 0")
+			return destino, False
+
+		a = protegido(*emitir(esquerda, nivel))
+		b = protegido(*emitir(direita, nivel))
+		if op in ('+', '-', '*'):
+			linhas.append(f"{indent}{destino} = {a} {op} {b}")
+		elif op == '/':
+			if b.startswith('('):
+				# Evita proteger o divisor duas vezes
+				divisor = novo_temporario()
+				linhas.append(f"{indent}{divisor} = {b}")
+				b = divisor
+			linhas.append(f"{indent}{destino} = {a} / {b} if abs({b}) > 1e-10 else 0")
+		elif op == 'max':
+			linhas.append(f"{indent}{destino} = max({a}, {b})")
+		else: # min
+			linhas.append(f"{indent}{destino} = min({a}, {b})")
+		return destino, False
+
+	# As árvores convertidas ficam vivas até o fim: os identificadores usam id() dos nós
+	arvores = [como_dict(arvore) for arvore in arvores]
+	saidas = [emitir(arvore, 1)[0] for arvore in arvores]
+	codigo = "def controlar({}):\n{}\n\treturn ({},)".format(
+		", ".join(VARIAVEIS_SENSORES),
+		"\n".join(linhas) if linhas else "\tpass",
+		", ".join(saidas)
+	)
+	# np.sin/np.cos preservam os tipos do interpretador (ex.: bool -> float16)
+	namespace = {'_isfinite': math.isfinite, '_sin': np.sin, '_cos': np.cos}
+	namespace.update(constantes)
+	exec(compile(codigo, '<arvore compilada>', 'exec'), namespace)
+	funcao = namespace['controlar']
+	funcao.codigo_fonte = codigo
+	funcao.compartilhadas = compartilhadas[0]
+	return funcao
+
+class NoArvore(dict):
+	"""Nó de árvore em dicionário com metadados da subárvore em cache.
+
+	tamanho, profundidade e operadores (nós operador, os candidatos a crossover)
+	seguem calcular_tamanho_arvore, calcular_profundidade e coletar_nos_candidatos;
+	o hash estrutural é calculado sob demanda. Os filhos de um NoArvore também são
+	NoArvore. O nó é imutável depois de criado (as operações que alteram o
+	dicionário levantam TypeError; mutação e crossover copiam o caminho até a
+	raiz), então subárvores podem ser compartilhadas entre árvores e indivíduos
+	sem que os metadados fiquem desatualizados. copy() retorna um dict comum.
+	"""
+	__slots__ = ('tamanho', 'profundidade', 'operadores', '_hash')
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.atualizar()
+
+	@classmethod
+	def de_dict(cls, no):
+		"""Converte uma árvore de dicionários, reaproveitando as subárvores que já são NoArvore"""
+		if no is None or isinstance(no, cls):
+			return no
+		if no['tipo'] == 'operador':
+			esquerda, direita = no['esquerda'], no['direita']
+			if not (isinstance(esquerda, cls) or esquerda is None) or not (isinstance(direita, cls) or direita is None):
+				no = dict(no, esquerda=cls.de_dict(esquerda), direita=cls.de_dict(direita))
+		return cls(no)
+
+	def filhos(self):
+		if self['tipo'] != 'operador':
+			return ()
+		return tuple(filho for filho in (self['esquerda'], self['direita']) if filho is not None)
+
+	def atualizar(self):
+		"""Recalcula os metadados a partir dos filhos"""
+		self._hash = None
+		if self['tipo'] != 'operador':
+			self.tamanho, self.profundidade, self.operadores = 1, 1, 0
+			return
+		tamanho, profundidade, operadores = 1, 0, 1
+		for filho in (self['esquerda'], self['direita']):
+			if filho is not None:
+				tamanho += filho.tamanho
+				profundidade = max(profundidade, filho.profundidade)
+				operadores += filho.operadores
+		self.tamanho, self.profundidade, self.operadores = tamanho, profundidade + 1, operadores
+
+	def hash_estrutural(self):
+		if self._hash is None:
+			self._hash = _hash_no(self)
+		return self._hash
+
+	def _imutavel(self, *args, **kwargs):
+		raise TypeError('NoArvore é imutável; crie um novo nó com NoArvore(dict(no, ...))')
+
+	__setitem__ = __delitem__ = update = pop = popitem = clear = setdefault = __ior__ = _imutavel
+
+	def copy(self):
+		# Cópia rasa mutável (os filhos continuam compartilhados)
+		return dict(self)
+
+	def __reduce__(self):
+		# O pickle padrão de subclasses de dict preenche os itens com __setitem__
+		return (NoArvore, (dict(self),))
+
+def hash_arvore(no):
+	"""Hash estrutural canônico de uma árvore.
+
+	Depende apenas de operadores, variáveis e constantes (não da identidade dos
+	nós), e é o mesmo em qualquer processo.
+	"""
+	if isinstance(no, ArvoreCompacta):
+		no = no.para_dict()
+	if isinstance(no, NoArvore):
+		return no.hash_estrutural()
+	return _hash_no(no)
+
+def _hash_no(no):
+	if no is None:
+		conteudo = b'-'
+	elif no['tipo'] == 'folha':
+		if 'valor' in no:
+			conteudo = b'c' + repr(float(no['valor'])).encode()
+		elif 'variavel' in no:
+			conteudo = b'v' + no['variavel'].encode()
+		else:
+			conteudo = b'0'
+	else:
+		direita = no['direita'] if no['operador'] not in ('abs', 'sin', 'cos') else None
+		conteudo = b'o' + no['operador'].encode() + hash_arvore(no['esquerda']) + hash_arvore(direita)
+	return hashlib.blake2b(conteudo, digest_size=16).digest()
+
+# Limites aplicados às saídas das árvores na simulação
+LIMITE_ACELERACAO = 1
+LIMITE_ROTACAO = 0.5
+
+# Faixa de valores de cada sensor: (mínimo, máximo, sempre finito).
+# As distâncias até recursos e obstáculos são infinitas quando não há nenhum;
+# os ângulos têm uma pequena folga para erros de arredondamento da normalização.
+INTERVALOS_SENSORES = {
+	'dist_recurso': (0.0, math.inf, False),
+	'dist_obstaculo': (0.0, math.inf, False),
+	'dist_meta': (0.0, math.inf, True),
+	'angulo_recurso': (-math.pi - 1e-9, math.pi + 1e-9, True),
+	'angulo_meta': (-math.pi - 1e-9, math.pi + 1e-9, True),
+	'energia': (0.0, 100.0, True),
+	'velocidade': (0.0, 5.0, True),
+	'meta_atingida': (0.0, 1.0, True)
+}
+
+def _limites(candidatos):
+	# NaN vem de 0 * inf entre extremos; o produto real de 0 por um valor finito é 0
+	candidatos = [0.0 if math.isnan(valor) else valor for valor in candidatos]
+	return min(candidatos), max(candidatos)
+
+def simplificar_arvore(no, limite=None):
+	"""Retorna uma cópia simplificada da árvore, com a mesma semântica de compilar_arvores.
+
+	Dobra constantes, elimina ramos mortos e identidades (x - x, min(a, a), x * 0, ...)
+	e usa aritmética de intervalos sobre as faixas de INTERVALOS_SENSORES. Com limite,
+	a raiz que sempre satura em [-limite, limite] vira a constante do limite; a árvore
+	resultante só é equivalente depois dessa limitação, como na simulação.
+	Trechos que misturam float16 (np.sin/np.cos do sensor booleano) não são reescritos.
+	A árvore original não é alterada.
+	"""
+	def constante(valor):
+		# O valor mantém o tipo do resultado em tempo de execução (float ou np.float64)
+		return {'tipo': 'folha', 'valor': valor}, (valor, valor, True)
+
+	def booleano(no):
+		# meta_atingida é bool e passa intacto por max, min e pelo ramo dos condicionais
+		if no is None or no['tipo'] == 'folha':
+			return no is not None and no.get('variavel') == 'meta_atingida'
+		if no['operador'] in ('max', 'min'):
+			return booleano(no['esquerda']) or booleano(no['direita'])
+		return no['operador'] in ('if_positivo', 'if_negativo') and booleano(no['direita'])
+
+	def meia_precisao(no):
+		# np.sin/np.cos de bool retornam float16, que contamina a aritmética com floats do Python
+		if no is None or no['tipo'] == 'folha':
+			return False
+		if no['operador'] in ('sin', 'cos') and booleano(no['esquerda']):
+			return True
+		if no['operador'] in ('if_positivo', 'if_negativo'):
+			# A condição só é comparada; o resultado é o ramo ou 0
+			return meia_precisao(no['direita'])
+		return meia_precisao(no['esquerda']) or meia_precisao(no['direita'])
+
+	def copiar(no):
+		if no is None or no['tipo'] == 'folha':
+			return None if no is None else dict(no)
+		return dict(no, esquerda=copiar(no['esquerda']), direita=copiar(no['direita']))
+
+	def protegido(no, intervalo, aritmetico=True):
+		# Subárvore equivalente ao valor protegido (não finito -> 0); x + 0.0 aplica a proteção.
+		# Resultados aritméticos nunca são bool, e o tipo importa para np.sin/np.cos
+		if intervalo[2] and not (aritmetico and booleano(no)):
+			return no
+		return {'tipo': 'operador', 'operador': '+', 'esquerda': no, 'direita': constante(0.0)[0]}
+
+	def proteger(intervalo):
+		# Faixa do valor depois da substituição de não finitos por 0
+		minimo, maximo, finito = intervalo
+		if finito:
+			return intervalo
+		return min(minimo, 0.0), max(maximo, 0.0), True
+
+	def eh_constante(no, valor=None):
+		return no['tipo'] == 'folha' and 'valor' in no and (valor is None or no['valor'] == valor)
+
+	def simplificar(no):
+		# Retorna (nó simplificado, (mínimo, máximo, sempre finito))
+		if no is None or (no['tipo'] == 'folha' and 'valor' not in no and 'variavel' not in no):
+			return constante(0.0)
+		if no['tipo'] == 'folha':
+			if 'valor' in no:
+				valor = no['valor']
+				if math.isfinite(valor):
+					return constante(valor)
+				return dict(no), (-math.inf, math.inf, False)
+			return dict(no), INTERVALOS_SENSORES[no['variavel']]
+
+		op = no['operador']
+		if op in ('abs', 'sin', 'cos'):
+			if no['esquerda'] is None:
+				return constante(0.0)
+		elif no['esquerda'] is None or no['direita'] is None:
+			return constante(0.0)
+
+		if op in ('sin', 'cos') and booleano(no['esquerda']):
+			# O tipo do argumento (bool ou número) decide o tipo do resultado
+			return dict(no, esquerda=copiar(no['esquerda']), direita=None), (-1.0, 1.0, True)
+
+		simplificados = {}
+		if op not in ('if_positivo', 'if_negativo'):
+			for lado in ('esquerda', 'direita'):
+				if meia_precisao(no[lado]):
+					simplificados[lado] = simplificar(no[lado])
+			if any(meia_precisao(filho) for filho, _ in simplificados.values()):
+				# Com float16 envolvido, o tipo de cada operando decide o tipo e o arredondamento
+				# do resultado: o nó é mantido e os demais operandos são copiados sem alteração
+				filhos = [
+					simplificados[lado][0] if lado in simplificados else copiar(no[lado])
+					for lado in ('esquerda', 'direita')
+				]
+				intervalo = (-1.0, 1.0, True) if op in ('sin', 'cos') else (-math.inf, math.inf, False)
+				return dict(no, esquerda=filhos[0], direita=filhos[1]), intervalo
+
+		esquerda, intervalo_e = simplificados.get('esquerda') or simplificar(no['esquerda'])
+
+		if op in ('abs', 'sin', 'cos'):
+			minimo, maximo, _ = proteger(intervalo_e)
+			if eh_constante(esquerda) and intervalo_e[2]:
+				valor = esquerda['valor']
+				resultado = abs(valor) if op == 'abs' else (np.sin(valor) if op == 'sin' else np.cos(valor))
+				return constante(resultado)
+			if op == 'abs':
+				if esquerda['tipo'] == 'operador' and esquerda['operador'] == 'abs':
+					return esquerda, intervalo_e
+				if minimo >= 0:
+					return protegido(esquerda, intervalo_e), (minimo, maximo, True)
+				return ({'tipo': 'operador', 'operador': 'abs', 'esquerda': esquerda, 'direita': None},
+					(0.0 if maximo >= 0 else -maximo, max(abs(minimo), abs(maximo)), True))
+			return {'tipo': 'operador', 'operador': op, 'esquerda': esquerda, 'direita': None}, (-1.0, 1.0, True)
+
+		direita, intervalo_d = simplificados.get('direita') or simplificar(no['direita'])
+
+		if op in ('if_positivo', 'if_negativo'):
+			# A condição e o ramo não são protegidos; NaN na condição leva a 0
+			minimo, maximo, finito = intervalo_e
+			if op == 'if_positivo':
+				sempre, nunca = finito and minimo > 0, maximo <= 0
+			else:
+				sempre, nunca = finito and maximo < 0, minimo >= 0
+			if nunca or eh_constante(direita, 0.0):
+				return constante(0.0)
+			if sempre:
+				return direita, intervalo_d
+			minimo_d, maximo_d, finito_d = intervalo_d
+			return ({'tipo': 'operador', 'operador': op, 'esquerda': esquerda, 'direita': direita},
+				(min(minimo_d, 0.0), max(maximo_d, 0.0), finito_d))
+
+		a, b = proteger(intervalo_e), proteger(intervalo_d)
+		if op == '+':
+			if eh_constante(esquerda, 0.0):
+				return protegido(direita, intervalo_d), b
+			if eh_constante(direita, 0.0):
+				return protegido(esquerda, intervalo_e), a
+			minimo, maximo = _limites([a[0] + b[0], a[1] + b[1]])
+		elif op == '-':
+			if esquerda == direita:
+				return constante(0.0)
+			if eh_constante(direita, 0.0):
+				return protegido(esquerda, intervalo_e), a
+			minimo, maximo = _limites([a[0] - b[1], a[1] - b[0]])
+		elif op == '*':
+			if eh_constante(esquerda, 0.0) or eh_constante(direita, 0.0):
+				return constante(0.0)
+			if eh_constante(esquerda, 1.0):
+				return protegido(direita, intervalo_d), b
+			if eh_constante(direita, 1.0):
+				return protegido(esquerda, intervalo_e), a
+			minimo, maximo = _limites([x * y for x in a[:2] for y in b[:2]])
+		elif op == '/':
+			if eh_constante(esquerda, 0.0) or (b[0] >= -1e-10 and b[1] <= 1e-10):
+				return constante(0.0)
+			if eh_constante(direita, 1.0):
+				return protegido(esquerda, intervalo_e), a
+			if b[0] > 1e-10 or b[1] < -1e-10:
+				quocientes = [x / y if y != 0 else math.nan for x in a[:2] for y in b[:2]]
+				if any(math.isnan(valor) for valor in quocientes):
+					minimo, maximo = -math.inf, math.inf
+				else:
+					minimo, maximo = min(quocientes), max(quocientes)
+			else:
+				# O divisor pode ficar arbitrariamente perto do limiar de proteção
+				minimo, maximo = -math.inf, math.inf
+		else: # max ou min
+			if esquerda == direita:
+				return protegido(esquerda, intervalo_e, aritmetico=False), a
+			funcao = max if op == 'max' else min
+			minimo, maximo = funcao(a[0], b[0]), funcao(a[1], b[1])
+
+		# + - * / de valores finitos só deixam de ser finitos por estouro
+		finito = op in ('max', 'min') or (math.isfinite(minimo) and math.isfinite(maximo))
+		if finito and minimo == maximo and math.isfinite(minimo):
+			# Os arredondamentos são monotônicos, então a faixa de um ponto é exata
+			return constante(minimo)
+		return {'tipo': 'operador', 'operador': op, 'esquerda': esquerda, 'direita': direita}, (minimo, maximo, finito)
+
+	resultado, (minimo, maximo, finito) = simplificar(no)
+	if limite is not None and finito:
+		if minimo >= limite:
+			return constante(limite)[0]
+		if maximo <= -limite:
+			return constante(-limite)[0]
+	return resultado
+
 class IndividuoPG:
-	def __init__(self, profundidade=3):
+	def __init__(self, profundidade=3, arvores=None):
+		"""arvores: par (aceleracao, rotacao) já pronto, que evita gerar árvores aleatórias"""
 		self.profundidade = profundidade
 		self.max_tamanho_arvore = 50 # Limite máximo de nós por árvore
+		self._compilado = None # Cache da função compilada das duas árvores
+		self._hash_genoma = None # Cache do hash estrutural das duas árvores
+		self._variaveis = None # Cache dos sensores lidos pelas árvores
 		self.arvore_aceleracao = None
 		self.arvore_rotacao = None
 		self.fitness = 0
+		self.fitness_pais = None # Fitness médio dos pais, usado por ModeloSubstituto
 		# Inicializar as árvores
-		self.arvore_aceleracao = self.criar_arvore_aleatoria('aceleracao', profundidade)
-		self.arvore_rotacao = self.criar_arvore_aleatoria('rotacao', profundidade)
+		if arvores is None:
+			arvores = (self.criar_arvore_aleatoria('aceleracao', profundidade),
+				self.criar_arvore_aleatoria('rotacao', profundidade))
+		self.arvore_aceleracao, self.arvore_rotacao = arvores
+
+	# Atribuir uma nova árvore invalida automaticamente o cache de compilação;
+	# árvores em dicionários são convertidas para NoArvore (metadados em cache)
+	@property
+	def arvore_aceleracao(self):
+		return self._arvore_aceleracao
+
+	@arvore_aceleracao.setter
+	def arvore_aceleracao(self, arvore):
+		self._arvore_aceleracao = NoArvore.de_dict(arvore) if isinstance(arvore, dict) else arvore
+		self.invalidar_cache()
+
+	@property
+	def arvore_rotacao(self):
+		return self._arvore_rotacao
+
+	@arvore_rotacao.setter
+	def arvore_rotacao(self, arvore):
+		self._arvore_rotacao = NoArvore.de_dict(arvore) if isinstance(arvore, dict) else arvore
+		self.invalidar_cache()
+
+	def __getstate__(self):
+		# A função compilada não é serializável; é recriada sob demanda
+		estado = self.__dict__.copy()
+		estado['_compilado'] = None
+		return estado
+
+	def invalidar_cache(self):
+		"""Descarta a função compilada, o hash e os sensores usados após alterações nas árvores"""
+		self._compilado = None
+		self._hash_genoma = None
+		self._variaveis = None
+
+	def hash_genoma(self):
+		"""Hash estrutural do par de árvores (hexadecimal), usando cache"""
+		if self._hash_genoma is None:
+			self._hash_genoma = hashlib.blake2b(
+				hash_arvore(self.arvore_aceleracao) + hash_arvore(self.arvore_rotacao), digest_size=16
+			).hexdigest()
+		return self._hash_genoma
+
+	def variaveis_sensores(self):
+		"""Sensores lidos por alguma das árvores, na ordem de VARIAVEIS_SENSORES, usando cache"""
+		if self._variaveis is None:
+			self._variaveis = variaveis_usadas(self.arvore_aceleracao, self.arvore_rotacao)
+		return self._variaveis
+
+	def compilar(self):
+		"""Retorna a função compilada (aceleracao, rotacao) = f(*sensores), usando cache"""
+		if self._compilado is None:
+			self._compilado = compilar_arvores(self.arvore_aceleracao, self.arvore_rotacao)
+		return self._compilado
 
 	def criar_arvore_aleatoria(self, tipo='aceleracao', profundidade_atual=None):
 		if profundidade_atual is None:
@@ -619,6 +1637,8 @@ class IndividuoPG:
 	def calcular_tamanho_arvore(self, no):
 		if no is None:
 			return 0
+		if isinstance(no, NoArvore):
+			return no.tamanho
 
 		# Versão iterativa usando uma pilha
 		pilha = [no]
@@ -667,8 +1687,8 @@ class IndividuoPG:
 			}
 
 	def avaliar(self, sensores, tipo='aceleracao'):
-		arvore = self.arvore_aceleracao if tipo == 'aceleracao' else self.arvore_rotacao
-		return self.avaliar_no(arvore, sensores)
+		aceleracao, rotacao = self.compilar()(*ler_sensores(sensores))
+		return aceleracao if tipo == 'aceleracao' else rotacao
 
 	def avaliar_no(self, no, sensores):
 		if no is None:
@@ -783,17 +1803,22 @@ class IndividuoPG:
 
 	def mutacao(self, probabilidade=0.1):
 		# PROBABILIDADE DE MUTAÇÃO PARA O ALUNO MODIFICAR
-		self.mutacao_no(self.arvore_aceleracao, probabilidade)
-		self.mutacao_no(self.arvore_rotacao, probabilidade)
+		self.arvore_aceleracao = self.mutacao_no(self.arvore_aceleracao, probabilidade)
+		self.arvore_rotacao = self.mutacao_no(self.arvore_rotacao, probabilidade)
 
 	def mutacao_no(self, no, probabilidade):
+		"""Retorna a árvore mutada; os nós alterados e seus ancestrais são novos e o resto é compartilhado"""
 		# Versão iterativa usando uma pilha
-		pilha = [no]
+		pilha = [(no, None, None)] # (nó, índice do pai em visitados, lado)
+		visitados = [] # [nó, índice do pai, lado, alterado]
 
 		while pilha:
-			no_atual = pilha.pop()
+			no_atual, pai, lado = pilha.pop()
 
-			if random.random() < probabilidade:
+			alterado = random.random() < probabilidade
+			if alterado:
+				# A mutação é feita em uma cópia: o nó pode estar em outras árvores
+				no_atual = dict(no_atual)
 				if no_atual['tipo'] == 'folha':
 					if 'valor' in no_atual:
 						# Mutação mais suave para constantes
@@ -815,47 +1840,75 @@ class IndividuoPG:
 					else: # if_positivo ou if_negativo
 						no_atual['operador'] = random.choice(['if_positivo', 'if_negativo'])
 
+			indice = len(visitados)
+			visitados.append([no_atual, pai, lado, alterado])
 			if no_atual['tipo'] == 'operador':
 				if no_atual['esquerda'] is not None:
-					pilha.append(no_atual['esquerda'])
+					pilha.append((no_atual['esquerda'], indice, 'esquerda'))
 				if no_atual['direita'] is not None:
-					pilha.append(no_atual['direita'])
+					pilha.append((no_atual['direita'], indice, 'direita'))
+
+		# Copiar o caminho até a raiz acima de cada nó alterado (filhos antes dos pais)
+		for entrada in reversed(visitados):
+			no_atual, pai, lado, alterado = entrada
+			if not alterado:
+				continue
+			no_atual = entrada[0] = NoArvore.de_dict(no_atual)
+			if pai is not None:
+				entrada_pai = visitados[pai]
+				if not entrada_pai[3]:
+					entrada_pai[0], entrada_pai[3] = dict(entrada_pai[0]), True
+				entrada_pai[0][lado] = no_atual
+		return visitados[0][0]
 
 	def crossover(self, outro):
-		novo = IndividuoPG(self.profundidade)
-		novo.arvore_aceleracao = self.crossover_no(self.arvore_aceleracao, outro.arvore_aceleracao)
-		novo.arvore_rotacao = self.crossover_no(self.arvore_rotacao, outro.arvore_rotacao)
-		return novo
+		return self.__class__(self.profundidade, arvores=(
+			self.crossover_no(self.arvore_aceleracao, outro.arvore_aceleracao),
+			self.crossover_no(self.arvore_rotacao, outro.arvore_rotacao)))
 
 	def crossover_no(self, no1, no2):
+		# Os pais não são alterados: o filho copia só o caminho até o ponto de crossover
+		no1, no2 = NoArvore.de_dict(no1), NoArvore.de_dict(no2)
+
 		# Probabilidade de crossover aumenta com a profundidade
 		profundidade_atual = self.calcular_profundidade(no1)
 		probabilidade = 0.7 - (0.1 * profundidade_atual) # Diminui a probabilidade com a profundidade
 
 		if random.random() < probabilidade:
 			# Escolhe um ponto de crossover aleatório em cada árvore
-			ponto1 = self.encontrar_ponto_crossover(no1)
-			ponto2 = self.encontrar_ponto_crossover(no2)
+			caminho = self.caminho_ponto_crossover(no1)
+			ponto1 = caminho[-1][0]
+			ponto2 = self.caminho_ponto_crossover(no2)[-1][0]
+			operadores = ponto1['tipo'] == 'operador' and ponto2['tipo'] == 'operador'
 
 			# Realiza o crossover
+			novo = ponto1
 			if random.random() < 0.5:
-				# Troca os nós filhos
-				ponto1['esquerda'], ponto2['esquerda'] = ponto2['esquerda'].copy(), ponto1['esquerda'].copy()
-				if ponto1['direita'] is not None and ponto2['direita'] is not None:
-					ponto1['direita'], ponto2['direita'] = ponto2['direita'].copy(), ponto1['direita'].copy()
+				# Troca os nós filhos (folhas, como raízes simplificadas, não têm filhos)
+				if operadores:
+					novo = dict(ponto1, esquerda=ponto2['esquerda'])
+					if ponto1['direita'] is not None and ponto2['direita'] is not None:
+						novo['direita'] = ponto2['direita']
 			else:
 				# Troca os operadores mantendo a estrutura
-				if ponto1['tipo'] == 'operador' and ponto2['tipo'] == 'operador':
-					ponto1['operador'], ponto2['operador'] = ponto2['operador'], ponto1['operador']
-
-			return no1.copy()
+				if operadores:
+					novo = dict(ponto1, operador=ponto2['operador'])
+
+			if novo is ponto1:
+				return no1
+			novo = NoArvore(novo)
+			for (pai, _), (_, lado) in zip(reversed(caminho[:-1]), reversed(caminho[1:])):
+				novo = NoArvore(dict(pai, **{lado: novo}))
+			return novo
 		else:
-			# Mantém a árvore original
-			return no1.copy()
+			# Mantém a árvore original (compartilhada, pois é imutável)
+			return no1
 
 	def calcular_profundidade(self, no):
 		if no is None:
 			return 0
+		if isinstance(no, NoArvore):
+			return no.profundidade
 
 		# Versão iterativa usando uma pilha
 		pilha = [(no, 1)] # (nó, profundidade_atual)
@@ -875,19 +1928,38 @@ class IndividuoPG:
 
 	def encontrar_ponto_crossover(self, no):
 		# Encontra um nó aleatório na árvore para fazer o crossover
-		if no['tipo'] == 'folha':
-			return no
-
-		# Lista de nós candidatos para crossover
-		nos_candidatos = []
-		self.coletar_nos_candidatos(no, nos_candidatos)
+		return self.caminho_ponto_crossover(no)[-1][0]
 
-		# Se não houver candidatos, retorna o nó raiz
-		if not nos_candidatos:
-			return no
+	def caminho_ponto_crossover(self, no):
+		"""Caminho [(nó, lado no pai), ...] da raiz até o ponto de crossover sorteado.
 
-		# Escolhe um nó aleatório da lista
-		return random.choice(nos_candidatos)
+		Sorteia um nó operador uniformemente, na ordem de coletar_nos_candidatos
+		(mesmo resultado de random.choice). Em um NoArvore a descida usa as contagens
+		em cache, em tempo proporcional à profundidade e não ao tamanho da árvore.
+		"""
+		if no['tipo'] == 'folha':
+			return [(no, None)]
+
+		if not isinstance(no, NoArvore):
+			# Lista de nós candidatos para crossover
+			nos_candidatos = []
+			self.coletar_nos_candidatos(no, nos_candidatos)
+			return [(random.choice(nos_candidatos), None)]
+
+		# Na ordem da pilha vêm o próprio nó, a subárvore direita e depois a esquerda
+		indice = random.randrange(no.operadores)
+		caminho = [(no, None)]
+		while indice > 0:
+			indice -= 1
+			direita = no['direita']
+			operadores_direita = direita.operadores if direita is not None else 0
+			if indice < operadores_direita:
+				no, lado = direita, 'direita'
+			else:
+				indice -= operadores_direita
+				no, lado = no['esquerda'], 'esquerda'
+			caminho.append((no, lado))
+		return caminho
 
 	def coletar_nos_candidatos(self, no, nos_candidatos):
 		# Versão iterativa usando uma pilha
@@ -904,17 +1976,35 @@ class IndividuoPG:
 					pilha.append(no_atual['direita'])
 
 	def copy(self):
-		"""Cria uma cópia profunda do indivíduo"""
-		novo = IndividuoPG(self.profundidade)
-		novo.arvore_aceleracao = self.copiar_arvore(self.arvore_aceleracao)
-		novo.arvore_rotacao = self.copiar_arvore(self.arvore_rotacao)
+		"""Cria uma cópia do indivíduo; árvores imutáveis são compartilhadas, em O(1)"""
+		novo = self.__class__(self.profundidade, arvores=(
+			self.copiar_arvore(self.arvore_aceleracao), self.copiar_arvore(self.arvore_rotacao)))
 		novo.fitness = self.fitness
+		# A cópia tem as mesmas árvores
+		novo._compilado = self._compilado
+		novo._hash_genoma = self._hash_genoma
+		novo._variaveis = self._variaveis
 		return novo
 
+	def simplificar(self):
+		"""Substitui as árvores por versões simplificadas (simplificar_arvore) e retorna quantos nós foram removidos.
+
+		As saídas só são iguais às originais depois da limitação feita na simulação.
+		"""
+		removidos = 0
+		for nome, limite in (('arvore_aceleracao', LIMITE_ACELERACAO), ('arvore_rotacao', LIMITE_ROTACAO)):
+			arvore = como_dict(getattr(self, nome))
+			simplificada = simplificar_arvore(arvore, limite)
+			# Árvores já simplificadas não são trocadas, preservando a função compilada
+			if simplificada != arvore:
+				removidos += self.calcular_tamanho_arvore(arvore) - self.calcular_tamanho_arvore(simplificada)
+				setattr(self, nome, simplificada)
+		return removidos
+
 	def copiar_arvore(self, no):
-		"""Cria uma cópia profunda de uma árvore"""
-		if no is None:
-			return None
+		"""Cria uma cópia profunda de uma árvore; um NoArvore é imutável e é compartilhado"""
+		if no is None or isinstance(no, NoArvore):
+			return no
 
 		copia = no.copy()
 		if copia['tipo'] == 'operador':
@@ -924,28 +2014,1607 @@ class IndividuoPG:
 				copia['direita'] = self.copiar_arvore(copia['direita'])
 		return copia
 
+	def para_dados(self):
+		"""Árvores do indivíduo em um dicionário serializável em JSON"""
+		return {
+			'arvore_aceleracao': self.arvore_aceleracao,
+			'arvore_rotacao': self.arvore_rotacao
+		}
+
+	@classmethod
+	def de_dados(cls, dados, profundidade=3):
+		"""Indivíduo a partir de para_dados (de qualquer representação)"""
+		if dados.get('formato') == 'compacto':
+			# Dados gerados por IndividuoPGCompacto
+			dados = {nome: ArvoreCompacta.de_json(dados[nome]).para_dict() for nome in ('arvore_aceleracao', 'arvore_rotacao')}
+		# Genomas vindos de arquivos ou da rede são compilados e executados depois
+		validar_variaveis(dados['arvore_aceleracao'])
+		validar_variaveis(dados['arvore_rotacao'])
+		return cls(profundidade, arvores=(dados['arvore_aceleracao'], dados['arvore_rotacao']))
+
 	def salvar(self, arquivo):
 		with open(arquivo, 'w') as f:
-			json.dump({
-				'arvore_aceleracao': self.arvore_aceleracao,
-				'arvore_rotacao': self.arvore_rotacao
-			}, f)
+			json.dump(self.para_dados(), f)
 
 	@classmethod
 	def carregar(cls, arquivo):
 		with open(arquivo, 'r') as f:
-			dados = json.load(f)
-			individuo = cls()
-			individuo.arvore_aceleracao = dados['arvore_aceleracao']
-			individuo.arvore_rotacao = dados['arvore_rotacao']
-			return individuo
+			return cls.de_dados(json.load(f))
+
+# Operações da representação compacta; 'nulo' marca um filho ausente (None)
+OPCODES = ('nulo', 'constante', 'variavel', '+', '-', '*', '/', 'max', 'min',
+	'abs', 'sin', 'cos', 'if_positivo', 'if_negativo')
+CODIGOS = {nome: codigo for codigo, nome in enumerate(OPCODES)}
+NULO, CONSTANTE, VARIAVEL = CODIGOS['nulo'], CODIGOS['constante'], CODIGOS['variavel']
+UNARIOS = {CODIGOS['abs'], CODIGOS['sin'], CODIGOS['cos']}
+CONDICIONAIS = {CODIGOS['if_positivo'], CODIGOS['if_negativo']}
+
+# Um nó por elemento, em pré-ordem; 'tamanho' é o número de nós da subárvore,
+# então o filho esquerdo de i está em i + 1 e o direito em i + 1 + tamanho[i + 1]
+TIPO_NO_COMPACTO = np.dtype([('opcode', np.int8), ('tamanho', np.int32), ('sensor', np.int8), ('valor', np.float64)])
+
+class ArvoreCompacta:
+	"""Árvore armazenada como um único vetor NumPy tipado em pré-ordem"""
+	def __init__(self, nos):
+		self.nos = nos
+
+	@classmethod
+	def de_dict(cls, no):
+		"""Converte uma árvore no formato de dicionários"""
+		linhas = []
+
+		def adicionar(no):
+			posicao = len(linhas)
+			if no is None:
+				linhas.append([NULO, 1, -1, 0.0])
+				return 1
+			if no['tipo'] == 'folha':
+				if 'valor' in no:
+					linhas.append([CONSTANTE, 1, -1, no['valor']])
+				elif 'variavel' in no:
+					linhas.append([VARIAVEL, 1, VARIAVEIS_SENSORES.index(no['variavel']), 0.0])
+				else:
+					linhas.append([NULO, 1, -1, 0.0])
+				return 1
+			codigo = CODIGOS[no['operador']]
+			linhas.append([codigo, 0, -1, 0.0])
+			tamanho = 1 + adicionar(no['esquerda'])
+			if codigo not in UNARIOS:
+				tamanho += adicionar(no['direita'])
+			linhas[posicao][1] = tamanho
+			return tamanho
+
+		adicionar(no)
+		nos = np.empty(len(linhas), dtype=TIPO_NO_COMPACTO)
+		for i, linha in enumerate(linhas):
+			nos[i] = tuple(linha)
+		return cls(nos)
+
+	def para_dict(self, indice=0):
+		"""Converte de volta para o formato de dicionários"""
+		codigo = int(self.nos['opcode'][indice])
+		if codigo == NULO:
+			return None
+		if codigo == CONSTANTE:
+			return {'tipo': 'folha', 'valor': float(self.nos['valor'][indice])}
+		if codigo == VARIAVEL:
+			return {'tipo': 'folha', 'variavel': VARIAVEIS_SENSORES[self.nos['sensor'][indice]]}
+		return {
+			'tipo': 'operador',
+			'operador': OPCODES[codigo],
+			'esquerda': self.para_dict(self.filho_esquerdo(indice)),
+			'direita': self.para_dict(self.filho_direito(indice)) if codigo not in UNARIOS else None
+		}
+
+	def para_json(self):
+		return {campo: self.nos[campo].tolist() for campo in TIPO_NO_COMPACTO.names}
+
+	@classmethod
+	def de_json(cls, dados):
+		nos = np.empty(len(dados['opcode']), dtype=TIPO_NO_COMPACTO)
+		for campo in TIPO_NO_COMPACTO.names:
+			nos[campo] = dados[campo]
+		return cls(nos)
+
+	def copy(self):
+		return ArvoreCompacta(self.nos.copy())
+
+	def __len__(self):
+		return len(self.nos)
+
+	def eh_operador(self, indice):
+		return self.nos['opcode'][indice] > VARIAVEL
+
+	def filho_esquerdo(self, indice):
+		return indice + 1
+
+	def filho_direito(self, indice):
+		# Operadores unários não têm filho direito
+		if self.nos['opcode'][indice] in UNARIOS:
+			return None
+		return indice + 1 + int(self.nos['tamanho'][indice + 1])
+
+	def ordem_pilha(self):
+		"""Índices na ordem da travessia por pilha das árvores em dicionário (direita antes da esquerda)"""
+		opcodes = self.nos['opcode']
+		pilha = [0]
+		while pilha:
+			indice = pilha.pop()
+			if opcodes[indice] == NULO:
+				continue
+			yield indice
+			if opcodes[indice] > VARIAVEL:
+				pilha.append(self.filho_esquerdo(indice))
+				direita = self.filho_direito(indice)
+				if direita is not None:
+					pilha.append(direita)
+
+	def subarvore(self, indice):
+		return self.nos[indice:indice + self.nos['tamanho'][indice]]
+
+	def substituir(self, indice, subarvore):
+		"""Nova árvore com a subárvore em 'indice' trocada por 'subarvore' (vetor de nós)"""
+		fim = indice + int(self.nos['tamanho'][indice])
+		nos = np.concatenate([self.nos[:indice], subarvore, self.nos[fim:]])
+		# Ancestrais do ponto de troca mudam de tamanho
+		posicoes = np.arange(indice)
+		ancestrais = posicoes + self.nos['tamanho'][:indice] > indice
+		nos['tamanho'][:indice][ancestrais] += len(subarvore) - (fim - indice)
+		return ArvoreCompacta(nos)
+
+	def trocar_operador(self, indice, codigo):
+		"""Nova árvore com outro operador em 'indice', ajustando o filho direito à aridade"""
+		antigo = int(self.nos['opcode'][indice])
+		if (antigo in UNARIOS) == (codigo in UNARIOS):
+			nova = self.copy()
+			nova.nos['opcode'][indice] = codigo
+			return nova
+		if codigo in UNARIOS:
+			# Descarta o filho direito
+			direita = self.filho_direito(indice)
+			nova = self.substituir(direita, np.empty(0, dtype=TIPO_NO_COMPACTO))
+		else:
+			# Acrescenta um filho direito ausente após o esquerdo
+			fim = indice + int(self.nos['tamanho'][indice])
+			nulo = np.array([(NULO, 1, -1, 0.0)], dtype=TIPO_NO_COMPACTO)
+			nova = ArvoreCompacta(np.concatenate([self.nos[:fim], nulo, self.nos[fim:]]))
+			# O próprio nó e seus ancestrais ganham um nó
+			posicoes = np.arange(indice + 1)
+			ancestrais = posicoes + self.nos['tamanho'][:indice + 1] > indice
+			nova.nos['tamanho'][:indice + 1][ancestrais] += 1
+		nova.nos['opcode'][indice] = codigo
+		return nova
+
+	def tamanho(self):
+		"""Número de nós, sem contar filhos ausentes"""
+		return int(np.count_nonzero(self.nos['opcode'] != NULO))
+
+	def profundidade(self):
+		profundidades = [0] * len(self.nos)
+		profundidades[0] = 1
+		maxima = 0
+		for indice in range(len(self.nos)):
+			if self.nos['opcode'][indice] == NULO:
+				continue
+			maxima = max(maxima, profundidades[indice])
+			if self.eh_operador(indice):
+				profundidades[indice + 1] = profundidades[indice] + 1
+				direita = self.filho_direito(indice)
+				if direita is not None:
+					profundidades[direita] = profundidades[indice] + 1
+		return maxima
+
+	def avaliar(self, sensores):
+		"""Avaliação em pós-ordem (varredura reversa da pré-ordem) com a semântica de avaliar_no"""
+		opcodes = self.nos['opcode'].tolist()
+		tamanhos = self.nos['tamanho'].tolist()
+		indices_sensores = self.nos['sensor'].tolist()
+		valores = self.nos['valor'].tolist()
+		resultados = [0] * len(opcodes)
+
+		for indice in range(len(opcodes) - 1, -1, -1):
+			codigo = opcodes[indice]
+			if codigo <= VARIAVEL:
+				if codigo == CONSTANTE:
+					resultados[indice] = valores[indice]
+				elif codigo == VARIAVEL:
+					resultados[indice] = sensores[VARIAVEIS_SENSORES[indices_sensores[indice]]]
+				continue
+
+			esquerda = indice + 1
+			if opcodes[esquerda] == NULO:
+				resultados[indice] = 0
+				continue
+			valor = resultados[esquerda]
+
+			if codigo in UNARIOS:
+				if not np.isfinite(valor):
+					valor = 0
+				operador = OPCODES[codigo]
+				if operador == 'abs':
+					resultados[indice] = abs(valor)
+				elif operador == 'sin':
+					resultados[indice] = np.sin(valor)
+				else: # cos
+					resultados[indice] = np.cos(valor)
+				continue
+
+			direita = esquerda + tamanhos[esquerda]
+			if opcodes[direita] == NULO:
+				resultados[indice] = 0
+				continue
+			outro = resultados[direita]
+			operador = OPCODES[codigo]
+
+			if codigo in CONDICIONAIS:
+				if operador == 'if_positivo':
+					resultados[indice] = outro if valor > 0 else 0
+				else: # if_negativo
+					resultados[indice] = outro if valor < 0 else 0
+				continue
+
+			# Proteção contra valores inválidos
+			if not np.isfinite(valor):
+				valor = 0
+			if not np.isfinite(outro):
+				outro = 0
+			if operador == '+':
+				resultados[indice] = valor + outro
+			elif operador == '-':
+				resultados[indice] = valor - outro
+			elif operador == '*':
+				resultados[indice] = valor * outro
+			elif operador == '/':
+				resultados[indice] = valor / outro if abs(outro) > 1e-10 else 0
+			elif operador == 'max':
+				resultados[indice] = max(valor, outro)
+			else: # min
+				resultados[indice] = min(valor, outro)
+
+		return resultados[0] if opcodes[0] != NULO else 0
+
+def como_dict(arvore):
+	"""Retorna a árvore no formato de dicionários, qualquer que seja a representação"""
+	return arvore.para_dict() if isinstance(arvore, ArvoreCompacta) else arvore
+
+def variaveis_usadas(*arvores):
+	"""Sensores referenciados pelas árvores (em qualquer representação), na ordem de VARIAVEIS_SENSORES"""
+	usadas = set()
+	for arvore in arvores:
+		if isinstance(arvore, ArvoreCompacta):
+			nos = arvore.nos
+			usadas.update(VARIAVEIS_SENSORES[sensor] for sensor in nos['sensor'][nos['opcode'] == VARIAVEL])
+			continue
+		# Versão iterativa usando uma pilha
+		pilha = [arvore]
+		while pilha:
+			no = pilha.pop()
+			if no is None:
+				continue
+			if no['tipo'] == 'operador':
+				pilha.append(no['esquerda'])
+				pilha.append(no['direita'])
+			elif 'variavel' in no:
+				usadas.add(no['variavel'])
+	return tuple(variavel for variavel in VARIAVEIS_SENSORES if variavel in usadas)
+
+class IndividuoPGCompacto(IndividuoPG):
+	"""Indivíduo cujas árvores usam a representação compacta (ArvoreCompacta)"""
+	def __init__(self, profundidade=3, arvores=None):
+		super().__init__(profundidade, arvores)
+		# As árvores aleatórias (ou recebidas como dicionários) são convertidas
+		for nome in ('arvore_aceleracao', 'arvore_rotacao'):
+			if not isinstance(getattr(self, nome), ArvoreCompacta):
+				setattr(self, nome, ArvoreCompacta.de_dict(getattr(self, nome)))
+
+	def calcular_tamanho_arvore(self, no):
+		if isinstance(no, ArvoreCompacta):
+			return no.tamanho()
+		return super().calcular_tamanho_arvore(no)
+
+	def calcular_profundidade(self, no):
+		return no.profundidade()
+
+	def avaliar_no(self, no, sensores):
+		if no is None:
+			return 0
+		return no.avaliar(sensores)
+
+	def mutacao_no(self, no, probabilidade):
+		nos = no.nos
+		for indice in no.ordem_pilha():
+			if random.random() < probabilidade:
+				if nos is no.nos:
+					# Cópia na primeira alteração: o vetor original pode estar compartilhado
+					nos = nos.copy()
+				codigo = int(nos['opcode'][indice])
+				if codigo == CONSTANTE:
+					# Mutação mais suave para constantes
+					novo_valor = float(nos['valor'][indice]) * random.uniform(0.8, 1.2)
+					nos['valor'][indice] = max(-10, min(10, novo_valor))
+				elif codigo == VARIAVEL:
+					# Equivale a random.choice(VARIAVEIS_SENSORES) da versão em dicionários
+					nos['sensor'][indice] = random.randrange(len(VARIAVEIS_SENSORES))
+				else:
+					# Mutação dentro do mesmo grupo (mesma aridade)
+					operador = OPCODES[codigo]
+					if operador in ['+', '-', '*', '/']:
+						operador = random.choice(['+', '-', '*', '/'])
+					elif operador in ['max', 'min']:
+						operador = random.choice(['max', 'min'])
+					elif operador in ['abs', 'sin', 'cos']:
+						operador = random.choice(['abs', 'sin', 'cos'])
+					else: # if_positivo ou if_negativo
+						operador = random.choice(['if_positivo', 'if_negativo'])
+					nos['opcode'][indice] = CODIGOS[operador]
+		return no if nos is no.nos else ArvoreCompacta(nos)
+
+	def crossover_no(self, no1, no2):
+		# Mesmo procedimento da versão em dicionários, mas os pais não são alterados
+		profundidade_atual = self.calcular_profundidade(no1)
+		probabilidade = 0.7 - (0.1 * profundidade_atual)
+
+		if random.random() < probabilidade:
+			ponto1 = self.encontrar_ponto_crossover(no1)
+			ponto2 = self.encontrar_ponto_crossover(no2)
+			filho = no1
+
+			if random.random() < 0.5:
+				# Troca os nós filhos
+				if no1.eh_operador(ponto1) and no2.eh_operador(ponto2):
+					filho = filho.substituir(ponto1 + 1, no2.subarvore(ponto2 + 1))
+					direita1 = filho.filho_direito(ponto1)
+					direita2 = no2.filho_direito(ponto2)
+					if (direita1 is not None and direita2 is not None and
+							filho.nos['opcode'][direita1] != NULO and no2.nos['opcode'][direita2] != NULO):
+						filho = filho.substituir(direita1, no2.subarvore(direita2))
+			else:
+				# Troca os operadores mantendo a estrutura
+				if no1.eh_operador(ponto1) and no2.eh_operador(ponto2):
+					filho = filho.trocar_operador(ponto1, int(no2.nos['opcode'][ponto2]))
+			return filho
+		else:
+			# Mantém a árvore original
+			return no1
+
+	def encontrar_ponto_crossover(self, no):
+		# Encontra um nó aleatório (operador) na árvore para fazer o crossover
+		if not no.eh_operador(0):
+			return 0
+		nos_candidatos = []
+		self.coletar_nos_candidatos(no, nos_candidatos)
+		return random.choice(nos_candidatos)
+
+	def coletar_nos_candidatos(self, no, nos_candidatos):
+		nos_candidatos.extend(indice for indice in no.ordem_pilha() if no.eh_operador(indice))
+
+	def simplificar(self):
+		removidos = super().simplificar()
+		for nome in ('arvore_aceleracao', 'arvore_rotacao'):
+			if not isinstance(getattr(self, nome), ArvoreCompacta):
+				setattr(self, nome, ArvoreCompacta.de_dict(getattr(self, nome)))
+		return removidos
+
+	def copiar_arvore(self, no):
+		# Mutação e crossover nunca alteram um vetor existente, então ele é compartilhado
+		return no
+
+	def para_dados(self):
+		return {
+			'formato': 'compacto',
+			'arvore_aceleracao': self.arvore_aceleracao.para_json(),
+			'arvore_rotacao': self.arvore_rotacao.para_json()
+		}
+
+	@classmethod
+	def de_dados(cls, dados, profundidade=3):
+		arvores = []
+		for nome in ('arvore_aceleracao', 'arvore_rotacao'):
+			arvore = dados[nome]
+			if dados.get('formato') == 'compacto':
+				arvore = ArvoreCompacta.de_json(arvore)
+			else:
+				arvore = ArvoreCompacta.de_dict(arvore)
+			arvores.append(arvore)
+		return cls(profundidade, arvores=tuple(arvores))
+
+# =====================================================================
+# SIMULAÇÃO EM LOTE
+# Avalia a população inteira em passo sincronizado: o estado de todos os
+# robôs fica em vetores NumPy e as árvores são avaliadas sobre vetores de
+# sensores, camada por camada.
+# =====================================================================
+
+def _finito(valores):
+	# Versão vetorizada da proteção contra valores não finitos
+	return np.where(np.isfinite(valores), valores, 0.0)
+
+def _normalizar_angulos(angulos):
+	# Equivalente vetorizado dos laços 'while' de Robo.get_sensores
+	angulos = np.where(angulos > np.pi, angulos - 2 * np.pi * np.ceil((angulos - np.pi) / (2 * np.pi)), angulos)
+	return np.where(angulos < -np.pi, angulos + 2 * np.pi * np.ceil((-np.pi - angulos) / (2 * np.pi)), angulos)
+
+class ArmazemExpressoes:
+	"""Subárvores de toda a população com hash-consing e contagem de referências.
+
+	Cada subárvore estruturalmente distinta recebe um identificador inteiro e é
+	guardada uma única vez. As referências vêm dos nós pais e das raízes
+	registradas; uma subárvore sem referências sai do armazém. ProgramaLote usa os
+	identificadores para calcular cada subexpressão uma vez por robô que a lê, ou
+	uma vez para todos os robôs se ela não lê sensores.
+	"""
+	def __init__(self):
+		self.identificadores = {} # estrutura -> identificador
+		self.entradas = {} # identificador -> [estrutura, filhos, referências, tamanho, lê sensores]
+		self.proximo = 0
+		self.raizes = [] # Raízes registradas pela última chamada de atualizar
+		self.nos_referenciados = 0 # Soma dos tamanhos das raízes registradas
+
+	def chave(self, no, memo, registrar=False):
+		"""Identificador da subárvore (-1 para um filho ausente).
+
+		Com 'registrar', subárvores novas entram no armazém; sem, uma subárvore
+		desconhecida levanta KeyError. memo guarda os identificadores por id(no)
+		durante uma mesma operação (os nós precisam continuar vivos).
+		"""
+		if no is None:
+			return -1
+		identificador = memo.get(id(no))
+		if identificador is not None:
+			return identificador
+
+		if no['tipo'] == 'folha':
+			# O tipo da constante entra na chave, como em compilar_arvores
+			if 'valor' in no:
+				estrutura = ('c', type(no['valor']), repr(no['valor']))
+			else:
+				estrutura = ('v', no.get('variavel'))
+			filhos = ()
+		else:
+			direita = no['direita'] if no['operador'] not in ('abs', 'sin', 'cos') else None
+			filhos = (self.chave(no['esquerda'], memo, registrar), self.chave(direita, memo, registrar))
+			estrutura = (no['operador'],) + filhos
+			filhos = tuple(filho for filho in filhos if filho >= 0)
+
+		identificador = self.identificadores.get(estrutura)
+		if identificador is None:
+			if not registrar:
+				raise KeyError('subárvore fora do armazém de expressões')
+			# Nova subárvore: guarda uma referência para cada filho
+			le_sensores = estrutura[0] == 'v' and estrutura[1] is not None
+			tamanho = 1
+			for filho in filhos:
+				entrada = self.entradas[filho]
+				entrada[2] += 1
+				tamanho += entrada[3]
+				le_sensores = le_sensores or entrada[4]
+			identificador = self.proximo
+			self.proximo += 1
+			self.identificadores[estrutura] = identificador
+			self.entradas[identificador] = [estrutura, filhos, 0, tamanho, le_sensores]
+		memo[id(no)] = identificador
+		return identificador
+
+	def le_sensores(self, identificador):
+		return self.entradas[identificador][4]
+
+	def adicionar(self, arvore, memo=None):
+		"""Registra uma raiz e retorna seu identificador"""
+		identificador = self.chave(arvore, {} if memo is None else memo, registrar=True)
+		if identificador >= 0:
+			self.entradas[identificador][2] += 1
+		return identificador
+
+	def liberar(self, identificador):
+		"""Remove uma referência de raiz; subárvores que ficam sem referências são descartadas"""
+		pilha = [identificador] if identificador >= 0 else []
+		while pilha:
+			identificador = pilha.pop()
+			entrada = self.entradas[identificador]
+			entrada[2] -= 1
+			if entrada[2] == 0:
+				del self.entradas[identificador]
+				del self.identificadores[entrada[0]]
+				pilha.extend(entrada[1])
+
+	def atualizar(self, individuos):
+		"""Registra as árvores dos indivíduos e libera as registradas na chamada anterior"""
+		memo = {}
+		arvores = [como_dict(arvore) for individuo in individuos
+			for arvore in (individuo.arvore_aceleracao, individuo.arvore_rotacao)]
+		raizes = [self.adicionar(arvore, memo) for arvore in arvores]
+		for raiz in self.raizes:
+			self.liberar(raiz)
+		self.raizes = raizes
+		self.nos_referenciados = sum(self.entradas[raiz][3] for raiz in raizes if raiz >= 0)
+
+	def estatisticas(self):
+		"""Nós das árvores registradas, subárvores distintas e fração compartilhada"""
+		unicos = len(self.entradas)
+		referenciados = self.nos_referenciados
+		return {
+			'nos_referenciados': referenciados,
+			'nos_unicos': unicos,
+			'compartilhamento': 1 - unicos / referenciados if referenciados else 0.0
+		}
+
+class ProgramaLote:
+	"""Árvores de vários indivíduos achatadas em vetores de nós.
+
+	Cada nó recebe um índice; os nós são agrupados por altura e operador para
+	que cada grupo seja avaliado com uma única operação vetorizada.
+	"""
+	def __init__(self, individuos, armazem=None):
+		self.n = len(individuos)
+		# Com um ArmazemExpressoes (em que os indivíduos já estão registrados),
+		# cada subexpressão vira um único nó por robô, ou um só nó se não lê sensores
+		self.armazem = armazem
+		self.compartilhados = {} # (identificador no armazém, robô ou -1) -> nó
+		self.nos_reaproveitados = 0
+		self._memo = {}
+		self.operadores = []
+		self.esquerda = []
+		self.direita = []
+		self.alturas = []
+		self.constantes = []
+		self.folhas = [] # (nó, índice do sensor, robô)
+
+		self.raizes = np.zeros((2, self.n), dtype=np.intp)
+		# As árvores convertidas ficam vivas durante a construção: o memo do armazém usa id() dos nós
+		arvores = [(como_dict(individuo.arvore_aceleracao), como_dict(individuo.arvore_rotacao)) for individuo in individuos]
+		for robo, (aceleracao, rotacao) in enumerate(arvores):
+			self.raizes[0, robo] = self.adicionar_no(aceleracao, robo)
+			self.raizes[1, robo] = self.adicionar_no(rotacao, robo)
+		self.armazem = self._memo = self.compartilhados = None
+
+		self.valores_iniciais = np.array(self.constantes, dtype=float)
+		folhas = np.array(self.folhas, dtype=np.intp).reshape(-1, 3)
+		self.no_folha, self.sensor_folha, self.robo_folha = folhas.T
+		# Sensores lidos por alguma árvore do lote
+		self.variaveis = tuple(VARIAVEIS_SENSORES[sensor] for sensor in np.unique(self.sensor_folha))
+
+		# Agrupar operadores por altura (filhos sempre antes dos pais)
+		grupos = {}
+		for no, operador in enumerate(self.operadores):
+			if operador is not None:
+				grupos.setdefault((self.alturas[no], operador), []).append(no)
+		self.camadas = []
+		for (altura, operador), nos in sorted(grupos.items(), key=lambda item: item[0][0]):
+			nos = np.array(nos, dtype=np.intp)
+			esquerda = np.array([self.esquerda[no] for no in nos], dtype=np.intp)
+			direita = np.array([self.direita[no] for no in nos], dtype=np.intp)
+			self.camadas.append((operador, nos, esquerda, direita))
+
+	def novo_no(self, operador=None, esquerda=-1, direita=-1, altura=0, valor=0.0):
+		self.operadores.append(operador)
+		self.esquerda.append(esquerda)
+		self.direita.append(direita)
+		self.alturas.append(altura)
+		self.constantes.append(valor)
+		return len(self.operadores) - 1
+
+	def adicionar_no(self, no, robo):
+		if no is None:
+			return self.novo_no()
+		if self.armazem is not None:
+			identificador = self.armazem.chave(no, self._memo)
+			chave = (identificador, robo if self.armazem.le_sensores(identificador) else -1)
+			indice = self.compartilhados.get(chave)
+			if indice is not None:
+				self.nos_reaproveitados += self.armazem.entradas[identificador][3]
+				return indice
+			indice = self._adicionar_no(no, robo)
+			self.compartilhados[chave] = indice
+			return indice
+		return self._adicionar_no(no, robo)
+
+	def _adicionar_no(self, no, robo):
+		if no['tipo'] == 'folha':
+			if 'valor' in no:
+				return self.novo_no(valor=no['valor'])
+			if 'variavel' in no:
+				indice = self.novo_no()
+				self.folhas.append((indice, VARIAVEIS_SENSORES.index(no['variavel']), robo))
+				return indice
+			return self.novo_no()
+
+		operador = no['operador']
+		if no['esquerda'] is None or (operador not in ('abs', 'sin', 'cos') and no['direita'] is None):
+			return self.novo_no()
+
+		esquerda = self.adicionar_no(no['esquerda'], robo)
+		direita = -1
+		if operador not in ('abs', 'sin', 'cos'):
+			direita = self.adicionar_no(no['direita'], robo)
+		altura = 1 + max(self.alturas[esquerda], self.alturas[direita] if direita >= 0 else 0)
+		return self.novo_no(operador, esquerda, direita, altura)
+
+	def avaliar(self, sensores):
+		"""Avalia todas as árvores; sensores tem forma (len(VARIAVEIS_SENSORES), n)"""
+		valores = self.valores_iniciais.copy()
+		valores[self.no_folha] = sensores[self.sensor_folha, self.robo_folha]
+
+		with np.errstate(all='ignore'):
+			for operador, nos, esquerda, direita in self.camadas:
+				if operador in ('if_positivo', 'if_negativo'):
+					# A condição não é protegida, como no interpretador
+					condicao = valores[esquerda]
+					teste = condicao > 0 if operador == 'if_positivo' else condicao < 0
+					valores[nos] = np.where(teste, valores[direita], 0.0)
+					continue
+
+				a = _finito(valores[esquerda])
+				if operador == 'abs':
+					valores[nos] = np.abs(a)
+				elif operador == 'sin':
+					valores[nos] = np.sin(a)
+				elif operador == 'cos':
+					valores[nos] = np.cos(a)
+				else:
+					b = _finito(valores[direita])
+					if operador == '+':
+						valores[nos] = a + b
+					elif operador == '-':
+						valores[nos] = a - b
+					elif operador == '*':
+						valores[nos] = a * b
+					elif operador == '/':
+						valido = np.abs(b) > 1e-10
+						valores[nos] = np.where(valido, a / np.where(valido, b, 1.0), 0.0)
+					elif operador == 'max':
+						valores[nos] = np.maximum(a, b)
+					else: # min
+						valores[nos] = np.minimum(a, b)
+
+		return valores[self.raizes[0]], valores[self.raizes[1]]
+
+class SimulacaoLote:
+	"""Simula os robôs de todos os indivíduos em passo sincronizado.
+
+	Reproduz Robo.mover, Robo.get_sensores e o laço de avaliar_populacao com o
+	estado de cada robô em vetores (struct-of-arrays). Cada robô tem suas próprias
+	máscaras de recursos coletados e de meta, então o ambiente não é alterado.
+	"""
+	def __init__(self, ambiente, individuos, raio=15, rng=None, poda=None, armazem=None):
+		self.ambiente = ambiente
+		self.poda = poda # PodaEpisodios opcional; no modo 'elite' o corte acompanha os robôs que terminam
+		# ArmazemExpressoes opcional com os indivíduos registrados (subexpressões compartilhadas)
+		self.programa = ProgramaLote(individuos, armazem)
+		self.n = len(individuos)
+		self.raio = raio
+		# Semente tirada do gerador global para que random.seed reproduza a execução
+		self.rng = rng if rng is not None else np.random.default_rng(random.getrandbits(64))
+
+		self.recursos_x = np.array([r['x'] for r in ambiente.recursos], dtype=float)
+		self.recursos_y = np.array([r['y'] for r in ambiente.recursos], dtype=float)
+		obstaculos = ambiente.obstaculos
+		self.obstaculos_x = np.array([o['x'] for o in obstaculos], dtype=float)
+		self.obstaculos_y = np.array([o['y'] for o in obstaculos], dtype=float)
+		self.obstaculos_x2 = self.obstaculos_x + np.array([o['largura'] for o in obstaculos], dtype=float)
+		self.obstaculos_y2 = self.obstaculos_y + np.array([o['altura'] for o in obstaculos], dtype=float)
+		self.centros_x = self.obstaculos_x + np.array([o['largura'] / 2 for o in obstaculos], dtype=float)
+		self.centros_y = self.obstaculos_y + np.array([o['altura'] / 2 for o in obstaculos], dtype=float)
+		self.reset()
+
+	def reset(self):
+		n = self.n
+		self.x = np.full(n, float(self.ambiente.largura // 2))
+		self.y = np.full(n, float(self.ambiente.altura // 2))
+		self.angulo = np.zeros(n)
+		self.velocidade = np.zeros(n)
+		self.energia = np.full(n, 100.0)
+		self.colisoes = np.zeros(n, dtype=int)
+		self.recursos_coletados = np.zeros(n, dtype=int)
+		self.coletados = np.zeros((n, len(self.recursos_x)), dtype=bool)
+		self.meta_atingida = np.zeros(n, dtype=bool)
+		self.distancia_percorrida = np.zeros(n)
+		self.tempo_parado_robo = np.zeros(n, dtype=int)
+		self.ultima_x = self.x.copy()
+		self.ultima_y = self.y.copy()
+		# Estado acompanhado pelo laço de avaliação
+		self.tempo = np.zeros(n, dtype=int)
+		self.tempo_parado = np.zeros(n, dtype=int)
+		self.distancia_total = np.zeros(n)
+		self.ativos = np.ones(n, dtype=bool)
+		self.podados = np.zeros(n, dtype=bool)
+		self.limite_podados = np.zeros(n)
+
+	def get_sensores(self):
+		"""Sensores de todos os robôs, forma (len(VARIAVEIS_SENSORES), n).
+
+		Só os sensores lidos por alguma árvore do lote são calculados; os demais valem 0.
+		"""
+		variaveis = self.programa.variaveis
+		valores = {}
+		if 'dist_recurso' in variaveis or 'angulo_recurso' in variaveis:
+			dx = self.recursos_x[None, :] - self.x[:, None]
+			dy = self.recursos_y[None, :] - self.y[:, None]
+		if 'dist_recurso' in variaveis:
+			distancias = np.where(self.coletados, np.inf, np.sqrt(dx**2 + dy**2))
+			valores['dist_recurso'] = distancias.min(axis=1) if len(self.recursos_x) else np.full(self.n, np.inf)
+
+		# Ângulo até o primeiro recurso não coletado (mesma ordem de Robo.get_sensores; 0 sem recursos)
+		if 'angulo_recurso' in variaveis:
+			valores['angulo_recurso'] = np.zeros(self.n)
+			if len(self.recursos_x):
+				restantes = ~self.coletados
+				primeiro = restantes.argmax(axis=1)
+				linhas = np.arange(self.n)
+				angulo = _normalizar_angulos(np.arctan2(dy[linhas, primeiro], dx[linhas, primeiro]) - self.angulo)
+				valores['angulo_recurso'] = np.where(restantes.any(axis=1), angulo, 0.0)
+
+		if 'dist_obstaculo' in variaveis or 'dist_meta' in variaveis or 'angulo_meta' in variaveis:
+			campos = self.ambiente.campos_distancia()
+			if campos is None:
+				dist_obstaculo, dist_meta, direcao_meta = self.sensores_estaticos(self.x, self.y)
+			else:
+				dist_obstaculo, dist_meta, direcao_meta, validos = campos.amostrar_lote(self.x, self.y)
+				exatos = ~validos
+				if exatos.any():
+					dist_obstaculo[exatos], dist_meta[exatos], direcao_meta[exatos] = self.sensores_estaticos(
+						self.x[exatos], self.y[exatos]
+					)
+			valores['dist_obstaculo'] = dist_obstaculo
+			valores['dist_meta'] = dist_meta
+			valores['angulo_meta'] = _normalizar_angulos(direcao_meta - self.angulo)
+
+		valores['energia'] = self.energia
+		valores['velocidade'] = self.velocidade
+		valores['meta_atingida'] = self.meta_atingida
+
+		sensores = np.zeros((len(VARIAVEIS_SENSORES), self.n))
+		for linha, variavel in enumerate(VARIAVEIS_SENSORES):
+			if variavel in variaveis:
+				sensores[linha] = valores[variavel]
+		return sensores
+
+	def sensores_estaticos(self, x, y):
+		"""Distância ao obstáculo mais próximo, distância e direção absoluta da meta (cálculo exato)"""
+		dist_obstaculo = np.sqrt(
+			(x[:, None] - self.centros_x[None, :])**2 + (y[:, None] - self.centros_y[None, :])**2
+		).min(axis=1) if len(self.centros_x) else np.full(len(x), np.inf)
+
+		meta = self.ambiente.meta
+		dist_meta = np.sqrt((x - meta['x'])**2 + (y - meta['y'])**2)
+		return dist_obstaculo, dist_meta, np.arctan2(meta['y'] - y, meta['x'] - x)
+
+	def verificar_colisao(self, x, y):
+		ambiente = self.ambiente
+		raio = self.raio
+		colisao = (x - raio < 0) | (x + raio > ambiente.largura) | (y - raio < 0) | (y + raio > ambiente.altura)
+		if len(self.obstaculos_x):
+			colisao |= (
+				(x[:, None] + raio > self.obstaculos_x) & (x[:, None] - raio < self.obstaculos_x2) &
+				(y[:, None] + raio > self.obstaculos_y) & (y[:, None] - raio < self.obstaculos_y2)
+			).any(axis=1)
+		return colisao
+
+	def mover(self, aceleracao, rotacao):
+		"""Versão vetorizada de Robo.mover aplicada apenas aos robôs ativos"""
+		ativos = self.ativos
+		self.angulo = np.where(ativos, self.angulo + rotacao, self.angulo)
+
+		# Verificar se o robô está parado
+		distancia_movimento = np.sqrt((self.x - self.ultima_x)**2 + (self.y - self.ultima_y)**2)
+		parado = distancia_movimento < 0.1
+		self.tempo_parado_robo = np.where(ativos, np.where(parado, self.tempo_parado_robo + 1, 0), self.tempo_parado_robo)
+		forcar = ativos & parado & (self.tempo_parado_robo > 5)
+		aceleracao = np.where(forcar, np.maximum(0.2, aceleracao), aceleracao)
+		rotacao = np.where(forcar, self.rng.uniform(-0.2, 0.2, self.n), rotacao)
+
+		# Atualizar velocidade
+		velocidade = np.clip(self.velocidade + aceleracao, 0.1, 5)
+		self.velocidade = np.where(ativos, velocidade, self.velocidade)
+
+		# Calcular nova posição
+		novo_x = self.x + self.velocidade * np.cos(self.angulo)
+		novo_y = self.y + self.velocidade * np.sin(self.angulo)
+
+		# Verificar colisão
+		colisao = ativos & self.verificar_colisao(novo_x, novo_y)
+		livre = ativos & ~colisao
+		self.colisoes += colisao
+		self.velocidade = np.where(colisao, 0.1, self.velocidade)
+		self.angulo = np.where(colisao, self.angulo + self.rng.uniform(-np.pi / 4, np.pi / 4, self.n), self.angulo)
+		self.distancia_percorrida += np.where(livre, np.sqrt((novo_x - self.x)**2 + (novo_y - self.y)**2), 0.0)
+		self.x = np.where(livre, novo_x, self.x)
+		self.y = np.where(livre, novo_y, self.y)
+
+		# Atualizar última posição conhecida
+		self.ultima_x = self.x.copy()
+		self.ultima_y = self.y.copy()
+
+		# Verificar coleta de recursos (10 é o raio do recurso)
+		distancias = np.sqrt((self.x[:, None] - self.recursos_x)**2 + (self.y[:, None] - self.recursos_y)**2)
+		novos = ativos[:, None] & ~self.coletados & (distancias < self.raio + 10)
+		self.coletados |= novos
+		recursos_coletados = novos.sum(axis=1)
+		self.recursos_coletados += recursos_coletados
+
+		# Verificar se atingiu a meta e recuperar energia
+		meta = self.ambiente.meta
+		na_meta = ativos & ~self.meta_atingida & (
+			np.sqrt((self.x - meta['x'])**2 + (self.y - meta['y'])**2) < self.raio + meta['raio']
+		)
+		self.meta_atingida |= na_meta
+		self.energia = np.where(na_meta, np.minimum(100, self.energia + 50), self.energia)
+
+		# Consumir energia
+		energia = np.maximum(0, self.energia - (0.1 + 0.05 * self.velocidade + 0.1 * np.abs(rotacao)))
+		energia = np.where(recursos_coletados > 0, np.minimum(100, energia + 20 * recursos_coletados), energia)
+		self.energia = np.where(ativos, energia, self.energia)
+
+		return self.energia <= 0
+
+	def executar(self):
+		"""Executa os episódios de todos os robôs e retorna o vetor de fitness"""
+		self.reset()
+		max_tempo = self.ambiente.max_tempo
+		recursos_ambiente = len(self.ambiente.recursos)
+		corte = self.poda.corte() if self.poda is not None else None
+		# Robôs parados não mudam mais de estado: o fitness de quem termina já é final e
+		# entra na elite da geração, que passa a valer como corte para os demais
+		elite = self.poda is not None and self.poda.modo == 'elite'
+		registrados = np.zeros(self.n, dtype=bool)
+
+		while self.ativos.any():
+			aceleracao, rotacao = self.programa.avaliar(self.get_sensores())
+
+			# Limitar valores (NaN é limitado ao máximo, como em max(-1, min(1, nan)))
+			aceleracao = np.clip(np.where(np.isnan(aceleracao), 1, aceleracao), -1, 1)
+			rotacao = np.clip(np.where(np.isnan(rotacao), 0.5, rotacao), -0.5, 0.5)
+
+			ultima_x, ultima_y = self.x, self.y
+			sem_energia = self.mover(aceleracao, rotacao)
+
+			# Distância percorrida e tempo parado, como no laço de avaliar_populacao
+			distancia = np.sqrt((self.x - ultima_x)**2 + (self.y - ultima_y)**2)
+			self.distancia_total += np.where(self.ativos, distancia, 0.0)
+			self.tempo_parado = np.where(
+				self.ativos, np.where(distancia < 0.1, self.tempo_parado + 1, 0), self.tempo_parado
+			)
+
+			# Robôs sem energia terminam antes de avançar o tempo
+			avancou = self.ativos & ~sem_energia
+			self.tempo += avancou
+			self.ativos = avancou & (self.tempo < max_tempo)
+
+			# Robôs que não podem mais superar o corte saem do lote
+			if corte is not None:
+				limite = limite_superior_fitness(
+					recursos_ambiente, self.colisoes, self.distancia_total, self.tempo, max_tempo
+				)
+				podar = self.ativos & (limite <= corte)
+				if podar.any():
+					self.poda.podar((max_tempo - self.tempo[podar]).sum(), podar.sum())
+					self.podados |= podar
+					self.limite_podados = np.where(podar, limite, self.limite_podados)
+					self.ativos &= ~podar
+
+			if elite:
+				terminados = ~self.ativos & ~self.podados & ~registrados
+				if terminados.any():
+					for i in np.flatnonzero(terminados):
+						self.poda.registrar(self.fitness_robo(i, recursos_ambiente))
+					registrados |= terminados
+					corte = self.poda.corte()
+
+		fitness = np.array([self.fitness_robo(i, recursos_ambiente) for i in range(self.n)])
+		if self.poda is not None:
+			# Mesma estimativa de avaliar_individuo para os podados
+			fitness = np.where(self.podados, np.maximum(0, np.minimum(fitness, self.limite_podados)), fitness)
+			for valor in fitness[~self.podados & ~registrados]:
+				self.poda.registrar(float(valor))
+		return fitness
+
+	def fitness_robo(self, i, recursos_ambiente):
+		"""Fitness do robô 'i' no estado atual"""
+		return calcular_fitness(
+			int(self.recursos_coletados[i]), recursos_ambiente, bool(self.meta_atingida[i]),
+			int(self.colisoes[i]), float(self.energia[i]), float(self.velocidade[i]),
+			int(self.tempo_parado[i]), float(self.distancia_total[i]), int(self.tempo[i])
+		)
+
+def calcular_fitness(recursos_coletados, recursos_ambiente, meta_atingida, colisoes, energia,
+		velocidade, tempo_parado, distancia_total, tempo):
+	"""Fitness de um episódio a partir do estado final do robô e do ambiente"""
+	# Bônus base por recursos (progressivo)
+	bonus_recursos = recursos_coletados * 100 # Reduzido de 500 para 100
+	# Bônus extra por progresso na coleta
+	if recursos_coletados > 0:
+		bonus_recursos += recursos_coletados * 50 * (recursos_coletados / recursos_ambiente) # Reduzido de 300 para 50
+
+	# Penalidade por ir para a meta sem coletar todos os recursos
+	penalidade_meta_prematura = 0
+	if meta_atingida and recursos_coletados < recursos_ambiente:
+		penalidade_meta_prematura = 1000 # Reduzido de 5000 para 1000
+		# Penalidade adicional baseada na quantidade de recursos faltando
+		recursos_faltando = recursos_ambiente - recursos_coletados
+		penalidade_meta_prematura += recursos_faltando * 200 # Reduzido de 1000 para 200
+
+	# Penalidades básicas
+	penalidade_colisoes = colisoes * 100  # Reduzido de 500 para 100
+	penalidade_energia = (100 - energia) * 0.5  # Reduzido de 2 para 0.5
+
+	# Novas penalidades e recompensas
+	penalidade_tempo_parado = tempo_parado * 10  # Reduzido de 50 para 10
+	penalidade_movimento_irregular = abs(velocidade - 2.0) * 20  # Reduzido de 100 para 20
+	recompensa_distancia = distancia_total * 0.1  # Reduzido de 0.5 para 0.1
+
+	# Penalidade por ficar muito tempo sem coletar recursos
+	penalidade_tempo_sem_coleta = 0
+	if recursos_coletados == 0:
+		penalidade_tempo_sem_coleta = tempo * 0.5 # Reduzido de 2 para 0.5
+
+	# Cálculo base do fitness
+	fitness = (
+		bonus_recursos -
+		penalidade_colisoes -
+		penalidade_energia -
+		penalidade_tempo_parado -
+		penalidade_movimento_irregular +
+		recompensa_distancia -
+		penalidade_tempo_sem_coleta
+	)
+
+	# Bônus por completar o objetivo corretamente
+	if recursos_coletados == recursos_ambiente:
+		if meta_atingida:
+			fitness += 2000 # Reduzido de 20000 para 2000
+			# Bônus extra por completar rápido
+			fitness += max(0, 500 - tempo * 2) # Reduzido de 5000 para 500
+			# Bônus extra por eficiência energética
+			fitness += energia * 2 # Reduzido de 10 para 2
+
+	# Penalidade por tempo (ajustada para incentivar completar rápido)
+	fitness -= tempo * 0.2 # Reduzido de 1.0 para 0.2
+
+	if colisoes == 0:
+		fitness *= 2 # Reduzido de 1000 para 2
+
+	# Garantir que o fitness seja um número válido e não negativo
+	return max(0, fitness) if np.isfinite(fitness) else 0
+
+def limite_superior_fitness(recursos_ambiente, colisoes, distancia_total, tempo, max_tempo):
+	"""Teto para o fitness final de um episódio em andamento (antes do max(0, ...) de calcular_fitness).
+
+	Cada termo de calcular_fitness é limitado pelo melhor caso a partir do estado
+	atual: todos os recursos coletados, meta atingida com energia 100, nenhuma
+	colisão nova, velocidade máxima (5) em todos os passos restantes e nenhuma
+	penalidade que ainda possa ser evitada. Funciona com escalares e com arrays.
+	"""
+	vetorial = isinstance(tempo, np.ndarray)
+	bonus_rapidez = np.maximum(0, 500 - 2 * tempo) if vetorial else max(0, 500 - 2 * tempo)
+	limite = (
+		150 * recursos_ambiente - # Bônus máximo por recursos
+		100 * colisoes +
+		0.1 * (distancia_total + 5 * (max_tempo - tempo)) +
+		2000 + 200 + bonus_rapidez - # Bônus de conclusão e de energia
+		0.2 * tempo
+	)
+	# O dobro só vale para episódios ainda sem colisões
+	if vetorial:
+		return np.where(colisoes == 0, 2 * limite, limite)
+	return 2 * limite if colisoes == 0 else limite
+
+class PodaEpisodios:
+	"""Interrompe episódios que comprovadamente não podem mais melhorar o resultado.
+
+	O episódio para quando limite_superior_fitness não passa do corte. No modo
+	'piso' o corte é 0: o fitness seria 0 de qualquer forma, então o resultado
+	é exato. No modo 'elite' o corte é o menor fitness entre os 'tamanho_elite'
+	melhores já avaliados na geração; o indivíduo podado não entraria na elite
+	e recebe uma estimativa (o fitness do estado atual, limitado pelo teto).
+	Enquanto a elite da geração não está completa o corte é o do modo 'piso'.
+	Só o modo 'elite' produz estimativas (ver estimado). Os passos poupados são
+	contados até max_tempo.
+	"""
+	def __init__(self, modo='piso', tamanho_elite=1):
+		if modo not in ('piso', 'elite'):
+			raise ValueError(f"Modo de poda desconhecido: {modo}")
+		self.modo = modo
+		self.tamanho_elite = tamanho_elite
+		self.melhores = [] # Heap com os maiores fitness da geração
+		self.passos_poupados = 0
+		self.episodios_podados = 0
+
+	def iniciar_geracao(self):
+		self.melhores = []
+
+	def corte(self):
+		if self.modo == 'elite' and len(self.melhores) >= self.tamanho_elite:
+			return max(0, self.melhores[0])
+		return 0
+
+	def estimado(self, podado):
+		"""Se o fitness de um episódio podado é só uma estimativa (no modo 'piso' ele é exato: 0)"""
+		return podado and self.modo == 'elite'
+
+	def registrar(self, fitness):
+		if self.modo != 'elite':
+			return
+		if len(self.melhores) < self.tamanho_elite:
+			heapq.heappush(self.melhores, fitness)
+		else:
+			heapq.heappushpop(self.melhores, fitness)
+
+	def podar(self, passos_restantes, episodios=1):
+		self.passos_poupados += int(passos_restantes)
+		self.episodios_podados += int(episodios)
+
+	def combinar(self, outra):
+		"""Acumula a poda de um bloco avaliado com outra instância (pool de processos ou worker)"""
+		self.podar(outra.passos_poupados, outra.episodios_podados)
+		# A elite global está contida na união das elites dos blocos
+		for fitness in outra.melhores:
+			if len(self.melhores) < self.tamanho_elite:
+				heapq.heappush(self.melhores, fitness)
+			else:
+				heapq.heappushpop(self.melhores, fitness)
+
+	def para_dados(self):
+		"""Estado serializável em JSON (usado na avaliação distribuída)"""
+		return {
+			'modo': self.modo, 'tamanho_elite': self.tamanho_elite, 'melhores': [float(valor) for valor in self.melhores],
+			'passos_poupados': self.passos_poupados, 'episodios_podados': self.episodios_podados
+		}
+
+	@classmethod
+	def de_dados(cls, dados):
+		"""Instância a partir de para_dados; levanta ValueError/TypeError para dados malformados"""
+		poda = cls(dados['modo'], int(dados['tamanho_elite']))
+		poda.melhores = sorted(float(valor) for valor in dados['melhores'])[-poda.tamanho_elite:]
+		poda.passos_poupados = int(dados['passos_poupados'])
+		poda.episodios_podados = int(dados['episodios_podados'])
+		return poda
+
+def avaliar_individuo(individuo, ambiente, robo, gravador=None, poda=None):
+	"""Simula um episódio completo do indivíduo e retorna seu fitness (opcionalmente gravando a trajetória)"""
+	try:
+		controlar = individuo.compilar()
+		ambiente.reset()
+		robo.reset(ambiente.largura // 2, ambiente.altura // 2)
+		if gravador is not None:
+			gravador.iniciar(ambiente, robo)
+		ultima_posicao = (robo.x, robo.y)
+		tempo_parado = 0
+		distancia_total = 0
+		corte = poda.corte() if poda is not None else None
+		# Só os sensores lidos pelas árvores são calculados (todos, se a trajetória é gravada)
+		variaveis = individuo.variaveis_sensores() if gravador is None else None
+
+		while True:
+			# Obter sensores
+			sensores = robo.get_sensores(ambiente, variaveis)
+
+			# Avaliar árvores de decisão
+			aceleracao, rotacao = controlar(*ler_sensores(sensores))
+
+			# Limitar valores
+			aceleracao = max(-1, min(1, aceleracao))
+			rotacao = max(-0.5, min(0.5, rotacao))
+
+			# Mover robô
+			sem_energia = robo.mover(aceleracao, rotacao, ambiente)
+			if gravador is not None:
+				gravador.registrar(robo, ambiente, sensores, aceleracao, rotacao)
+
+			# Calcular distância percorrida
+			distancia = np.sqrt((robo.x - ultima_posicao[0])**2 + (robo.y - ultima_posicao[1])**2)
+			distancia_total += distancia
+			ultima_posicao = (robo.x, robo.y)
+
+			# Verificar se está parado
+			if distancia < 0.1:
+				tempo_parado += 1
+			else:
+				tempo_parado = 0
+
+			# Verificar fim da simulação
+			if sem_energia or ambiente.passo():
+				break
+
+			# Parar episódios que não podem mais superar o corte
+			if corte is not None:
+				limite = limite_superior_fitness(
+					len(ambiente.recursos), robo.colisoes, distancia_total, ambiente.tempo, ambiente.max_tempo
+				)
+				if limite <= corte:
+					poda.podar(ambiente.max_tempo - ambiente.tempo)
+					parcial = calcular_fitness(
+						robo.recursos_coletados, len(ambiente.recursos), robo.meta_atingida, robo.colisoes,
+						robo.energia, robo.velocidade, tempo_parado, distancia_total, ambiente.tempo
+					)
+					return max(0, min(parcial, limite))
+
+		fitness = calcular_fitness(
+			robo.recursos_coletados, len(ambiente.recursos), robo.meta_atingida, robo.colisoes,
+			robo.energia, robo.velocidade, tempo_parado, distancia_total, ambiente.tempo
+		)
+		if poda is not None:
+			poda.registrar(fitness)
+		return fitness
+
+	except Exception as e:
+		print(f"Erro na avaliação: {str(e)}")
+		return 0
+
+class CacheFitness:
+	"""Cache LRU de fitness indexado por (hash do genoma, identificador do ambiente)"""
+	def __init__(self, capacidade=10000):
+		self.capacidade = capacidade
+		self.dados = OrderedDict()
+		self.acertos = 0
+		self.faltas = 0
+
+	def obter(self, chave):
+		if chave not in self.dados:
+			self.faltas += 1
+			return None
+		self.acertos += 1
+		self.dados.move_to_end(chave)
+		return self.dados[chave]
+
+	def guardar(self, chave, fitness):
+		self.dados[chave] = fitness
+		self.dados.move_to_end(chave)
+		while len(self.dados) > self.capacidade:
+			self.dados.popitem(last=False)
+
+class MedidorFases:
+	"""Tempo de parede e número de chamadas por fase de uma geração"""
+	FASES = ('avaliacao', 'selecao', 'crossover', 'mutacao', 'copia')
+
+	def __init__(self):
+		self.tempos = dict.fromkeys(self.FASES, 0.0)
+		self.chamadas = dict.fromkeys(self.FASES, 0)
+
+	def registrar(self, fase, inicio):
+		self.tempos[fase] += time.perf_counter() - inicio
+		self.chamadas[fase] += 1
+
+class ModeloSubstituto:
+	"""Previsão de fitness por vizinhos mais próximos em um arquivo de indivíduos já simulados.
+
+	As características são baratas: tamanho das árvores, sensores lidos, saídas
+	(já limitadas como na simulação) em uma amostra fixa de vetores de sensores e
+	o fitness dos pais. Cada característica é padronizada pelo arquivo e a previsão
+	é a média do fitness dos 'vizinhos' mais próximos.
+	"""
+	def __init__(self, capacidade=2000, vizinhos=5, amostras=16, minimo=50, semente=0):
+		self.capacidade = capacidade
+		self.vizinhos = vizinhos
+		self.minimo = minimo # Tamanho do arquivo a partir do qual o modelo prevê
+		self.caracteristicas_arquivo = []
+		self.fitness_arquivo = []
+		# Vetores de sensores fixos, na ordem de VARIAVEIS_SENSORES
+		rng = np.random.default_rng(semente)
+		self.sensores = [
+			(float(rng.uniform(0, 800)), float(rng.uniform(0, 400)), float(rng.uniform(0, 900)),
+				float(rng.uniform(-np.pi, np.pi)), float(rng.uniform(-np.pi, np.pi)), float(rng.uniform(0, 100)),
+				float(rng.uniform(0.1, 5)), bool(rng.random() < 0.5))
+			for _ in range(amostras)
+		]
+
+	def caracteristicas(self, individuo):
+		controlar = individuo.compilar()
+		usadas = individuo.variaveis_sensores()
+		vetor = [
+			individuo.calcular_tamanho_arvore(individuo.arvore_aceleracao),
+			individuo.calcular_tamanho_arvore(individuo.arvore_rotacao)
+		]
+		vetor.extend(float(variavel in usadas) for variavel in VARIAVEIS_SENSORES)
+		for sensores in self.sensores:
+			aceleracao, rotacao = controlar(*sensores)
+			# Mesma limitação da simulação (NaN vai para o máximo)
+			vetor.append(float(max(-LIMITE_ACELERACAO, min(LIMITE_ACELERACAO, aceleracao))))
+			vetor.append(float(max(-LIMITE_ROTACAO, min(LIMITE_ROTACAO, rotacao))))
+		tem_pais = individuo.fitness_pais is not None
+		vetor.extend((float(tem_pais), float(individuo.fitness_pais) if tem_pais else 0.0))
+		return vetor
+
+	def pronto(self):
+		return len(self.fitness_arquivo) >= self.minimo
+
+	def adicionar(self, individuos):
+		"""Acrescenta ao arquivo indivíduos simulados (com o fitness do episódio completo)"""
+		for individuo in individuos:
+			self.caracteristicas_arquivo.append(self.caracteristicas(individuo))
+			self.fitness_arquivo.append(float(individuo.fitness))
+		excesso = len(self.fitness_arquivo) - self.capacidade
+		if excesso > 0:
+			del self.caracteristicas_arquivo[:excesso]
+			del self.fitness_arquivo[:excesso]
+
+	def prever(self, individuos):
+		"""Fitness previsto de cada indivíduo"""
+		arquivo = np.array(self.caracteristicas_arquivo)
+		media = arquivo.mean(axis=0)
+		escala = arquivo.std(axis=0)
+		escala[escala == 0] = 1.0
+		arquivo = (arquivo - media) / escala
+		consultas = (np.array([self.caracteristicas(individuo) for individuo in individuos]) - media) / escala
+		# |q - a|² = |q|² + |a|² - 2 q·a: um produto de matrizes, sem o tensor consultas x arquivo x características
+		distancias = (consultas**2).sum(axis=1)[:, None] + (arquivo**2).sum(axis=1)[None, :] - 2 * consultas @ arquivo.T
+		np.maximum(distancias, 0, out=distancias) # Arredondamento pode deixar valores levemente negativos
+		k = min(self.vizinhos, len(arquivo))
+		proximos = np.argpartition(distancias, k - 1, axis=1)[:, :k]
+		return np.array(self.fitness_arquivo)[proximos].mean(axis=1)
+
+def _avaliar_em_processo(tarefa):
+	"""Avalia um bloco de indivíduos dentro de um processo do pool"""
+	ambiente, individuos, semente, simulacao_lote, poda, compartilhar = tarefa
+	# Cada bloco tem sua própria semente, então o resultado não depende do escalonamento
+	random.seed(semente)
+	if simulacao_lote:
+		armazem = None
+		if compartilhar:
+			# O armazém do processo principal não é enviado; o bloco usa o seu
+			armazem = ArmazemExpressoes()
+			armazem.atualizar(individuos)
+		simulacao = SimulacaoLote(ambiente, individuos, poda=poda, armazem=armazem)
+		resultados = [float(fitness) for fitness in simulacao.executar()]
+		return resultados, simulacao.podados.tolist(), poda, int(simulacao.tempo.sum())
+	robo = Robo(ambiente.largura // 2, ambiente.altura // 2)
+	resultados = []
+	podados = []
+	passos = 0
+	for individuo in individuos:
+		podados_antes = poda.episodios_podados if poda is not None else 0
+		resultados.append(avaliar_individuo(individuo, ambiente, robo, poda=poda))
+		podados.append(poda is not None and poda.episodios_podados > podados_antes)
+		passos += ambiente.tempo
+	return resultados, podados, poda, passos
+
+def _postos(valores):
+	"""Postos (0 = menor) com empates no posto médio"""
+	valores = np.asarray(valores, dtype=float)
+	postos = np.empty(len(valores))
+	postos[np.argsort(valores, kind='stable')] = np.arange(len(valores))
+	_, inverso, contagens = np.unique(valores, return_inverse=True, return_counts=True)
+	return (np.bincount(inverso, weights=postos) / contagens)[inverso]
+
+def correlacao_ranking(a, b):
+	"""Correlação de Spearman entre duas listas de fitness (None se indefinida)"""
+	if len(a) < 2:
+		return None
+	postos_a, postos_b = _postos(a), _postos(b)
+	if postos_a.std() == 0 or postos_b.std() == 0:
+		return None
+	return float(np.corrcoef(postos_a, postos_b)[0, 1])
+
+# =====================================================================
+# AVALIAÇÃO DISTRIBUÍDA
+# Um coordenador no processo da evolução aceita conexões TCP de workers
+# (possivelmente em outras máquinas) e distribui os mesmos blocos que o
+# pool de processos avaliaria com _avaliar_em_processo.
+# =====================================================================
+
+# Maior mensagem aceita: um cabeçalho com tamanho absurdo não faz o receptor alocar memória sem limite
+MAX_MENSAGEM = 1 << 28
+
+# Classes de indivíduo aceitas nos blocos (o nome viaja na mensagem, nunca a classe)
+CLASSES_INDIVIDUO = {classe.__name__: classe for classe in (IndividuoPG, IndividuoPGCompacto)}
+
+def _enviar_mensagem(conexao, mensagem):
+	dados = json.dumps(mensagem).encode()
+	conexao.sendall(struct.pack('!Q', len(dados)) + dados)
+
+def _receber_bytes(conexao, n):
+	partes = []
+	while n:
+		parte = conexao.recv(min(n, 1 << 20))
+		if not parte:
+			return None
+		partes.append(parte)
+		n -= len(parte)
+	return b''.join(partes)
+
+def _receber_mensagem(conexao):
+	"""Próxima mensagem da conexão (None quando ela foi fechada); ValueError se estiver fora do protocolo"""
+	cabecalho = _receber_bytes(conexao, 8)
+	if cabecalho is None:
+		return None
+	tamanho = struct.unpack('!Q', cabecalho)[0]
+	if tamanho > MAX_MENSAGEM:
+		raise ValueError(f"Mensagem grande demais: {tamanho} bytes")
+	dados = _receber_bytes(conexao, tamanho)
+	if dados is None:
+		return None
+	mensagem = json.loads(dados)
+	if not isinstance(mensagem, list) or not mensagem or not isinstance(mensagem[0], str):
+		raise ValueError("Mensagem fora do protocolo")
+	return mensagem
+
+def _ambiente_para_dados(ambiente):
+	"""Layout e opções que afetam a simulação, serializáveis em JSON"""
+	return {
+		'layout': ambiente.layout(),
+		'resolucao_campos': ambiente.resolucao_campos,
+		# O índice não muda as respostas, só o custo: basta saber se deve ser construído
+		'indice_espacial': ambiente.indice is not None
+	}
+
+def _ambiente_de_dados(dados):
+	"""Ambiente a partir de _ambiente_para_dados"""
+	resolucao = dados['resolucao_campos']
+	if resolucao is not None and not isinstance(resolucao, (int, float)):
+		raise ValueError(f"Resolução de campos inválida: {resolucao!r}")
+	ambiente = Ambiente.de_layout(dados['layout'])
+	ambiente.resolucao_campos = resolucao
+	if dados['indice_espacial']:
+		ambiente.indice = IndiceEspacial(ambiente.obstaculos, ambiente.recursos)
+	return ambiente
+
+def _ler_resultado(mensagem, n):
+	"""(fitness, podados, poda, passos, duração) de uma mensagem 'resultado' para um bloco de n indivíduos"""
+	_, _, fitness, podados, poda, passos, duracao = mensagem
+	if not isinstance(fitness, list) or not isinstance(podados, list) or len(fitness) != n or len(podados) != n:
+		raise ValueError("Resultado com tamanho diferente do bloco")
+	fitness = [float(valor) for valor in fitness]
+	podados = [bool(podado) for podado in podados]
+	poda = PodaEpisodios.de_dados(poda) if poda is not None else None
+	return fitness, podados, poda, int(passos), float(duracao)
+
+class CoordenadorDistribuido:
+	"""Distribui blocos de avaliação para workers conectados por TCP (executar_worker).
+
+	Cada worker recebe a descrição de um ambiente uma única vez e depois blocos de
+	genomas (para_dados), respondendo com os fitness. Os workers enviam batimentos
+	periódicos; um worker que passa 'tempo_limite' segundos em silêncio, ou cuja
+	conexão cai, é descartado e seus blocos voltam para a fila. Cada bloco leva a
+	própria semente, então o resultado não depende de qual worker o avaliou.
+	As mensagens são JSON (genomas por para_dados, ambientes por layout) e são
+	validadas na chegada; nada recebido é executado. Não há autenticação: um
+	worker pode devolver fitness falsos, por isso o padrão é escutar só em 127.0.0.1.
+	"""
+	def __init__(self, host='127.0.0.1', porta=0, tempo_limite=10.0, blocos_por_worker=2):
+		self.servidor = socket.create_server((host, porta))
+		self.endereco = self.servidor.getsockname()[:2]
+		self.tempo_limite = tempo_limite
+		self.blocos_por_worker = blocos_por_worker # Blocos enviados antes da resposta do anterior
+		self.eventos = queue.Queue() # (tipo, worker, dados) vindos das threads de leitura
+		self.workers = {} # nome -> estado da conexão
+		self.estatisticas_workers = {} # nome -> lotes, individuos, passos, tempo
+		self.redespachados = 0
+		self.proximo_lote = 0
+		threading.Thread(target=self._aceitar, daemon=True).start()
+
+	def _aceitar(self):
+		while True:
+			try:
+				conexao, _ = self.servidor.accept()
+			except OSError:
+				return # Servidor fechado
+			threading.Thread(target=self._ler, args=(conexao,), daemon=True).start()
+
+	def _ler(self, conexao):
+		nome = None
+		try:
+			mensagem = _receber_mensagem(conexao)
+			if mensagem is None or mensagem[0] != 'ola' or len(mensagem) != 2 or not isinstance(mensagem[1], str):
+				conexao.close()
+				return
+			nome = mensagem[1]
+			self.eventos.put(('conectado', nome, conexao))
+			while True:
+				mensagem = _receber_mensagem(conexao)
+				if mensagem is None:
+					break
+				self.eventos.put(('mensagem', nome, mensagem))
+		except (OSError, ValueError):
+			pass
+		if nome is not None:
+			self.eventos.put(('desconectado', nome, conexao))
+
+	def _processar_evento(self, evento, tarefas, resultados, lotes):
+		tipo, nome, dados = evento
+		if tipo == 'conectado':
+			if nome in self.workers:
+				# Reconexão com o mesmo nome: a conexão antiga não responde mais
+				self._descartar(nome, lotes)
+			self.workers[nome] = {
+				'conexao': dados, 'ultimo_contato': time.monotonic(), 'ambientes': set(), 'em_andamento': {}
+			}
+			self.estatisticas_workers.setdefault(nome, {'lotes': 0, 'individuos': 0, 'passos': 0, 'tempo': 0.0})
+			return
+		worker = self.workers.get(nome)
+		if worker is None or (tipo == 'desconectado' and worker['conexao'] is not dados):
+			return # Evento de uma conexão já descartada
+		if tipo == 'desconectado':
+			self._descartar(nome, lotes)
+			return
+		worker['ultimo_contato'] = time.monotonic()
+		if dados[0] == 'resultado' and len(dados) == 7:
+			indice = worker['em_andamento'].pop(dados[1], None) if isinstance(dados[1], int) else None
+			if indice is not None and resultados[indice] is None:
+				try:
+					fitness, podados, poda, passos, duracao = _ler_resultado(dados, len(tarefas[indice][1]))
+				except (TypeError, ValueError, KeyError):
+					# Resposta malformada: o worker é descartado e o bloco volta para a fila
+					worker['em_andamento'][dados[1]] = indice
+					self._descartar(nome, lotes)
+					return
+				resultados[indice] = (fitness, podados, poda, passos)
+				estatisticas = self.estatisticas_workers[nome]
+				estatisticas['lotes'] += 1
+				estatisticas['individuos'] += len(fitness)
+				estatisticas['passos'] += passos
+				estatisticas['tempo'] += duracao
+
+	def _descartar(self, nome, lotes):
+		"""Fecha a conexão do worker e devolve seus blocos em andamento para a fila"""
+		worker = self.workers.pop(nome)
+		try:
+			worker['conexao'].close()
+		except OSError:
+			pass
+		for indice in worker['em_andamento'].values():
+			lotes.appendleft(indice)
+			self.redespachados += 1
+
+	def _despachar(self, tarefas, lotes, ambientes):
+		for nome in list(self.workers):
+			worker = self.workers[nome]
+			while lotes and len(worker['em_andamento']) < self.blocos_por_worker:
+				indice = lotes.popleft()
+				ambiente, individuos, semente, simulacao_lote, poda, compartilhar = tarefas[indice]
+				chave, dados_ambiente = ambientes[id(ambiente)]
+				id_lote = self.proximo_lote
+				self.proximo_lote += 1
+				worker['em_andamento'][id_lote] = indice
+				try:
+					if chave not in worker['ambientes']:
+						_enviar_mensagem(worker['conexao'], ['ambiente', chave, dados_ambiente])
+						worker['ambientes'].add(chave)
+					_enviar_mensagem(worker['conexao'], [
+						'lote', id_lote, chave, type(individuos[0]).__name__,
+						[individuo.para_dados() for individuo in individuos], semente, bool(simulacao_lote),
+						poda.para_dados() if poda is not None else None, bool(compartilhar)
+					])
+				except OSError:
+					self._descartar(nome, lotes)
+					break
+
+	def n_workers(self):
+		"""Número de workers conectados (processa as conexões pendentes)"""
+		while True:
+			try:
+				evento = self.eventos.get_nowait()
+			except queue.Empty:
+				return len(self.workers)
+			self._processar_evento(evento, [], [], deque())
+
+	def aguardar_workers(self, n, tempo_limite=30.0):
+		"""Espera até haver 'n' workers conectados; retorna quantos há"""
+		fim = time.monotonic() + tempo_limite
+		while self.n_workers() < n and time.monotonic() < fim:
+			time.sleep(0.05)
+		return len(self.workers)
+
+	def mapear(self, tarefas):
+		"""Avalia tarefas de _avaliar_em_processo nos workers; resultados na ordem das tarefas.
+
+		Levanta RuntimeError se ficar sem nenhum worker conectado por mais de 'tempo_limite' segundos.
+		"""
+		resultados = [None] * len(tarefas)
+		lotes = deque(range(len(tarefas)))
+		# Ambientes identificados e serializados uma vez por chamada (o mesmo objeto aparece em todas as tarefas)
+		ambientes = {}
+		for tarefa in tarefas:
+			if id(tarefa[0]) not in ambientes:
+				ambientes[id(tarefa[0])] = (tarefa[0].identificador(), _ambiente_para_dados(tarefa[0]))
+			classe = type(tarefa[1][0])
+			if CLASSES_INDIVIDUO.get(classe.__name__) is not classe:
+				raise ValueError(f"Classe de indivíduo sem suporte na avaliação distribuída: {classe.__name__}")
+
+		sem_workers_desde = None
+		while any(resultado is None for resultado in resultados):
+			# Sem nenhum worker vivo por 'tempo_limite' segundos os blocos restantes nunca terminariam
+			if self.workers:
+				sem_workers_desde = None
+			elif sem_workers_desde is None:
+				sem_workers_desde = time.monotonic()
+			elif time.monotonic() - sem_workers_desde > self.tempo_limite:
+				raise RuntimeError(
+					f"nenhum worker conectado há {self.tempo_limite:g}s; "
+					f"{sum(resultado is None for resultado in resultados)} blocos sem avaliação"
+				)
+			self._despachar(tarefas, lotes, ambientes)
+			try:
+				evento = self.eventos.get(timeout=min(1.0, self.tempo_limite / 4))
+				self._processar_evento(evento, tarefas, resultados, lotes)
+			except queue.Empty:
+				pass
+			# Workers em silêncio por tempo demais são considerados mortos
+			agora = time.monotonic()
+			for nome in [nome for nome, worker in self.workers.items() if agora - worker['ultimo_contato'] > self.tempo_limite]:
+				self._descartar(nome, lotes)
+		return resultados
+
+	def estatisticas(self):
+		"""Lotes, indivíduos, passos e passos por segundo de cada worker"""
+		return {
+			nome: dict(estatisticas, passos_por_s=estatisticas['passos'] / estatisticas['tempo'] if estatisticas['tempo'] else 0.0)
+			for nome, estatisticas in self.estatisticas_workers.items()
+		}
+
+	def encerrar(self):
+		"""Pede o fim aos workers conectados e fecha o servidor"""
+		self.n_workers()
+		for nome in list(self.workers):
+			try:
+				_enviar_mensagem(self.workers[nome]['conexao'], ['fim'])
+			except OSError:
+				pass
+			self.workers.pop(nome)['conexao'].close()
+		self.servidor.close()
+
+def executar_worker(host, porta, nome=None, intervalo_batimento=1.0, tempo_conexao=30.0):
+	"""Worker da avaliação distribuída: avalia os blocos do CoordenadorDistribuido até receber 'fim'"""
+	nome = nome or f"{socket.gethostname()}:{os.getpid()}"
+	fim = time.monotonic() + tempo_conexao
+	while True:
+		try:
+			conexao = socket.create_connection((host, porta))
+			break
+		except OSError:
+			# O coordenador pode ainda não estar aceitando conexões
+			if time.monotonic() > fim:
+				raise
+			time.sleep(0.2)
+
+	envio = threading.Lock()
+	def enviar(mensagem):
+		with envio:
+			_enviar_mensagem(conexao, mensagem)
+
+	parar = threading.Event()
+	def bater():
+		# Batimentos continuam durante a avaliação de um bloco
+		while not parar.wait(intervalo_batimento):
+			try:
+				enviar(['batimento'])
+			except OSError:
+				return
+
+	enviar(['ola', nome])
+	threading.Thread(target=bater, daemon=True).start()
+	ambientes = {}
+	try:
+		while True:
+			mensagem = _receber_mensagem(conexao)
+			if mensagem is None or mensagem[0] == 'fim':
+				break
+			if mensagem[0] == 'ambiente':
+				ambientes[mensagem[1]] = _ambiente_de_dados(mensagem[2])
+			elif mensagem[0] == 'lote':
+				_, id_lote, chave, nome_classe, genomas, semente, simulacao_lote, poda, compartilhar = mensagem
+				inicio = time.perf_counter()
+				# de_dados valida os genomas (só sensores conhecidos chegam ao código compilado)
+				individuos = [CLASSES_INDIVIDUO[nome_classe].de_dados(dados) for dados in genomas]
+				poda = PodaEpisodios.de_dados(poda) if poda is not None else None
+				fitness, podados, poda, passos = _avaliar_em_processo(
+					(ambientes[chave], individuos, int(semente), bool(simulacao_lote), poda, bool(compartilhar)))
+				enviar([
+					'resultado', id_lote, [float(valor) for valor in fitness], [bool(podado) for podado in podados],
+					poda.para_dados() if poda is not None else None, int(passos), time.perf_counter() - inicio
+				])
+	finally:
+		parar.set()
+		conexao.close()
 
 class ProgramacaoGenetica:
-	def __init__(self, tamanho_populacao=50, profundidade=3):
+	def __init__(self, tamanho_populacao=50, profundidade=3, simulacao_lote=False, workers=1,
+			tamanho_cache_fitness=0, classe_individuo=IndividuoPG, resolucao_campos=None, gravar_melhores=False,
+			poda=None, cenario=None, instrumentar=False, callback_tempos=None, simplificar=False,
+			armazem_expressoes=False, fidelidades=None, auditar_fidelidades=False, substituto=False,
+			fator_substituto=0.5, verificacao_substituto=0.1, coordenador=None, indice_espacial=None):
 		# PARÂMETROS PARA O ALUNO MODIFICAR
 		self.tamanho_populacao = tamanho_populacao
 		self.profundidade = profundidade
-		self.populacao = [IndividuoPG(profundidade) for _ in range(tamanho_populacao)]
+		self.classe_individuo = classe_individuo  # IndividuoPG ou IndividuoPGCompacto
+		self.populacao = [classe_individuo(profundidade) for _ in range(tamanho_populacao)]
 		self.melhor_individuo = None
 		self.melhor_fitness = float('-inf')
 		self.historico_fitness = []
@@ -954,123 +3623,375 @@ class ProgramacaoGenetica:
 		self.max_geracoes_sem_melhoria = 15  # Aumentado para dar mais tempo de evolução
 		self.ultimo_fitness = float('-inf')
 		self.melhorias_minimas = 0.005  # Reduzido para ser mais tolerante a pequenas melhorias
+		self.simulacao_lote = simulacao_lote  # Simular a população inteira em lote (SimulacaoLote)
+		self.workers = workers or os.cpu_count()  # Processos usados na avaliação (None = todos os núcleos)
+		self._pool = None
+		# CoordenadorDistribuido opcional: substitui o pool por workers conectados por TCP
+		self.coordenador = coordenador
+		# Cache LRU de fitness por (hash do genoma, ambiente); 0 desativa
+		self.cache_fitness = CacheFitness(tamanho_cache_fitness) if tamanho_cache_fitness else None
+		# Resolução dos rasters de sensores do ambiente de cada geração (None = sensores exatos)
+		self.resolucao_campos = resolucao_campos
+		# Índice espacial para colisões e coleta (None = o padrão do cenário; desligado no ambiente aleatório)
+		self.indice_espacial = indice_espacial
+		# Trajetória do melhor indivíduo de cada geração (GravadorTrajetoria)
+		self.gravar_melhores = gravar_melhores
+		self.trajetorias_melhores = []
+		# Poda de episódios sem chance: None, 'piso' (exata) ou 'elite' (corte na elite da geração)
+		n_elite = max(1, int(tamanho_populacao * 0.3))
+		self.poda = PodaEpisodios(poda, n_elite) if poda else None
+		# Cenário fixo de CENARIOS usado em todas as gerações (None = ambiente aleatório a cada geração)
+		self.cenario = cenario
+		self.ambiente_cenario = None
+		if cenario:
+			opcoes_cenario = {'resolucao_campos': resolucao_campos}
+			if indice_espacial is not None:
+				opcoes_cenario['indice_espacial'] = indice_espacial
+			self.ambiente_cenario = criar_cenario(cenario, **opcoes_cenario)
+		self.passos_simulados = 0
+		# Tempo por fase de cada geração (ver MedidorFases); desligado não custa nada além de um 'if'
+		self.instrumentar = instrumentar or callback_tempos is not None
+		self.callback_tempos = callback_tempos
+		self.historico_tempos = []
+		# Simplificar as árvores (simplificar_arvore) antes de cada avaliação
+		self.simplificar = simplificar
+		self.nos_simplificados = 0
+		# Subárvores da população com hash-consing (ArmazemExpressoes); a simulação em lote
+		# avalia cada subexpressão distinta uma vez por robô
+		self.armazem = ArmazemExpressoes() if armazem_expressoes else None
+		self.nos_lote_reaproveitados = 0
+		# Avaliação em várias fidelidades (successive halving): pares (passos, fração promovida)
+		# com episódios curtos; só os promovidos da última etapa jogam o episódio completo
+		self.fidelidades = tuple(fidelidades) if fidelidades else None
+		# Com auditoria, todos também são avaliados no episódio completo para medir a concordância
+		self.auditar_fidelidades = auditar_fidelidades
+		self.historico_fidelidades = []
+		# Modelo substituto (ModeloSubstituto): indivíduos com fitness previsto abaixo de
+		# fator_substituto vezes o corte da elite não são simulados e ficam com a previsão;
+		# uma fração verificacao_substituto deles é simulada mesmo assim para medir os erros
+		self.substituto = ModeloSubstituto() if substituto else None
+		self.fator_substituto = fator_substituto
+		self.verificacao_substituto = verificacao_substituto
+		self.corte_elite = None
+		self.historico_substituto = []
+		# Estado do laço de evoluir, guardado nos checkpoints
+		self.geracao_atual = 0
+		self.taxa_mutacao = 0.2  # Reduzida para ser mais suave
 
 	def avaliar_populacao(self):
-		ambiente = Ambiente()
-		robo = Robo(ambiente.largura // 2, ambiente.altura // 2)
-		recursos_ambiente = len(ambiente.recursos.copy())
-
-		for individuo in self.populacao:
-			try:
-				ambiente.reset()
-				robo.reset(ambiente.largura // 2, ambiente.altura // 2)
-				ultima_posicao = (robo.x, robo.y)
-				tempo_parado = 0
-				distancia_total = 0
-
-				while True:
-					# Obter sensores
-					sensores = robo.get_sensores(ambiente)
-
-					# Avaliar árvores de decisão
-					aceleracao = individuo.avaliar(sensores, 'aceleracao')
-					rotacao = individuo.avaliar(sensores, 'rotacao')
-
-					# Limitar valores
-					aceleracao = max(-1, min(1, aceleracao))
-					rotacao = max(-0.5, min(0.5, rotacao))
-
-					# Mover robô
-					sem_energia = robo.mover(aceleracao, rotacao, ambiente)
-
-					# Calcular distância percorrida
-					distancia = np.sqrt((robo.x - ultima_posicao[0])**2 + (robo.y - ultima_posicao[1])**2)
-					distancia_total += distancia
-					ultima_posicao = (robo.x, robo.y)
+		if self.ambiente_cenario is not None:
+			ambiente = self.ambiente_cenario
+		else:
+			ambiente = Ambiente(resolucao_campos=self.resolucao_campos, indice_espacial=bool(self.indice_espacial))
+		if self.poda is not None:
+			self.poda.iniciar_geracao()
+		if self.simplificar:
+			for individuo in self.populacao:
+				self.nos_simplificados += individuo.simplificar()
+		if self.armazem is not None:
+			self.armazem.atualizar(self.populacao)
+
+		pendentes = self.populacao
+		if self.cache_fitness is not None:
+			# Genomas já avaliados neste ambiente (ou repetidos na geração) não são simulados
+			id_ambiente = ambiente.identificador()
+			chaves = [(individuo.hash_genoma(), id_ambiente) for individuo in self.populacao]
+			representantes = {}
+			for individuo, chave in zip(self.populacao, chaves):
+				if chave in representantes:
+					self.cache_fitness.acertos += 1
+					continue
+				fitness = self.cache_fitness.obter(chave)
+				if fitness is None:
+					representantes[chave] = individuo
+				else:
+					individuo.fitness = fitness
+			pendentes = list(representantes.values())
 
-					# Verificar se está parado
-					if distancia < 0.1:
-						tempo_parado += 1
-					else:
-						tempo_parado = 0
+		triagem = None
+		if self.substituto is not None and self.substituto.pronto():
+			pendentes, triagem = self.triar_com_substituto(pendentes)
 
-					# Verificar fim da simulação
-					if sem_energia or ambiente.passo():
-						break
+		if self.fidelidades:
+			completos = self.avaliar_em_fidelidades(pendentes, ambiente)
+		else:
+			estimados = self.simular(pendentes, ambiente)
+			completos = {id(individuo) for individuo in pendentes} - estimados
+
+		if self.substituto is not None:
+			simulados = [individuo for individuo in pendentes if id(individuo) in completos]
+			if triagem is not None:
+				self.registrar_substituto(simulados, triagem)
+			self.substituto.adicionar(simulados)
+
+		if self.cache_fitness is not None:
+			for chave, individuo in representantes.items():
+				# Fitness de episódios curtos, podados pela elite ou previsto pelo substituto não vale como episódio completo
+				if id(individuo) in completos:
+					self.cache_fitness.guardar(chave, individuo.fitness)
+			for individuo, chave in zip(self.populacao, chaves):
+				if chave in representantes:
+					individuo.fitness = representantes[chave].fitness
 
-				# Bônus por recursos coletados (prioridade máxima)
-				recursos_coletados = robo.recursos_coletados
-
-				# Bônus base por recursos (progressivo)
-				bonus_recursos = recursos_coletados * 100 # Reduzido de 500 para 100
-				# Bônus extra por progresso na coleta
-				if recursos_coletados > 0:
-					bonus_recursos += recursos_coletados * 50 * (recursos_coletados / recursos_ambiente) # Reduzido de 300 para 50
-
-				# Penalidade por ir para a meta sem coletar todos os recursos
-				penalidade_meta_prematura = 0
-				if robo.meta_atingida and recursos_coletados < recursos_ambiente:
-					penalidade_meta_prematura = 1000 # Reduzido de 5000 para 1000
-					# Penalidade adicional baseada na quantidade de recursos faltando
-					recursos_faltando = recursos_ambiente - recursos_coletados
-					penalidade_meta_prematura += recursos_faltando * 200 # Reduzido de 1000 para 200
-
-				# Penalidades básicas
-				penalidade_colisoes = robo.colisoes * 100  # Reduzido de 500 para 100
-				penalidade_energia = (100 - robo.energia) * 0.5  # Reduzido de 2 para 0.5
-				
-				# Novas penalidades e recompensas
-				penalidade_tempo_parado = tempo_parado * 10  # Reduzido de 50 para 10
-				penalidade_movimento_irregular = abs(robo.velocidade - 2.0) * 20  # Reduzido de 100 para 20
-				recompensa_distancia = distancia_total * 0.1  # Reduzido de 0.5 para 0.1
-				
-				# Penalidade por ficar muito tempo sem coletar recursos
-				penalidade_tempo_sem_coleta = 0
-				if recursos_coletados == 0:
-					penalidade_tempo_sem_coleta = ambiente.tempo * 0.5 # Reduzido de 2 para 0.5
-
-				# Cálculo base do fitness
-				fitness = (
-					bonus_recursos -
-					penalidade_colisoes -
-					penalidade_energia -
-					penalidade_tempo_parado -
-					penalidade_movimento_irregular +
-					recompensa_distancia -
-					penalidade_tempo_sem_coleta
+		for individuo in self.populacao:
+			self.registrar_fitness(individuo)
+		if self.substituto is not None:
+			n_elite = max(1, int(self.tamanho_populacao * 0.3))
+			self.corte_elite = sorted((individuo.fitness for individuo in self.populacao), reverse=True)[
+				min(n_elite, len(self.populacao)) - 1]
+		return ambiente
+
+	def triar_com_substituto(self, pendentes):
+		"""Separa os indivíduos a simular dos descartados pela previsão do substituto.
+
+		Os descartados recebem o fitness previsto. Retorna (a simular, triagem), em que
+		triagem guarda as previsões e os verificados para registrar_substituto.
+		"""
+		previsoes = self.substituto.prever(pendentes)
+		previstos = {id(individuo): float(previsao) for individuo, previsao in zip(pendentes, previsoes)}
+		limiar = self.fator_substituto * self.corte_elite if self.corte_elite is not None else None
+		simular, descartados, verificados = [], 0, []
+		for individuo, previsao in zip(pendentes, previsoes):
+			if limiar is None or limiar <= 0 or previsao >= limiar:
+				simular.append(individuo)
+			elif random.random() < self.verificacao_substituto:
+				# Descartado pela previsão, mas simulado para estimar descartes errados
+				simular.append(individuo)
+				verificados.append(individuo)
+			else:
+				individuo.fitness = float(previsao)
+				descartados += 1
+		return simular, {'previstos': previstos, 'verificados': verificados, 'descartados': descartados}
+
+	def registrar_substituto(self, simulados, triagem):
+		"""Acrescenta a historico_substituto a precisão das previsões sobre os simulados"""
+		previstos = triagem['previstos']
+		reais = [individuo.fitness for individuo in simulados]
+		previsoes = [previstos[id(individuo)] for individuo in simulados]
+		# Verificados que alcançariam o corte da elite foram descartes errados
+		falsos = sum(1 for individuo in triagem['verificados'] if individuo.fitness >= self.corte_elite)
+		self.historico_substituto.append({
+			'previstos': len(previstos),
+			'descartados': triagem['descartados'],
+			'verificados': len(triagem['verificados']),
+			'falsos_descartes': falsos,
+			'correlacao': correlacao_ranking(previsoes, reais),
+			'erro_medio': float(np.mean(np.abs(np.array(previsoes) - np.array(reais)))) if reais else None
+		})
+
+	def avaliar_em_fidelidades(self, individuos, ambiente):
+		"""Successive halving: cada etapa avalia os candidatos com episódios de 'passos'
+		passos e promove a melhor fração; a última etapa usa o episódio completo.
+
+		Um eliminado fica com o fitness da sua etapa, limitado ao menor fitness da etapa
+		seguinte, para que a seleção nunca o prefira a um promovido. Registra em
+		historico_fidelidades a concordância (Spearman) de cada etapa com o episódio
+		completo e retorna os ids dos indivíduos com o fitness exato do episódio completo.
+		"""
+		if not individuos:
+			return set()
+		max_tempo = ambiente.max_tempo
+		candidatos = list(individuos)
+		etapas = []
+		for passos, fracao in self.fidelidades:
+			if self.poda is not None:
+				self.poda.iniciar_geracao()
+			ambiente.max_tempo = min(passos, max_tempo)
+			try:
+				self.simular(candidatos, ambiente)
+			finally:
+				ambiente.max_tempo = max_tempo
+			fitness = {id(individuo): individuo.fitness for individuo in candidatos}
+			ordenados = sorted(candidatos, key=lambda individuo: -individuo.fitness)
+			promovidos = ordenados[:max(1, math.ceil(len(candidatos) * fracao))]
+			etapas.append((passos, candidatos, fitness, promovidos))
+			candidatos = promovidos
+
+		if self.poda is not None:
+			self.poda.iniciar_geracao()
+		estimados = self.simular(candidatos, ambiente)
+		completo = {id(individuo): individuo.fitness for individuo in candidatos}
+
+		auditoria = None
+		if self.auditar_fidelidades:
+			# Episódio completo para todos, sem alterar o fitness usado na seleção
+			eliminados = [individuo for individuo in individuos if id(individuo) not in completo]
+			guardados = [individuo.fitness for individuo in eliminados]
+			if self.poda is not None:
+				self.poda.iniciar_geracao()
+			self.simular(eliminados, ambiente)
+			auditoria = dict(completo)
+			for individuo, fitness in zip(eliminados, guardados):
+				auditoria[id(individuo)] = individuo.fitness
+				individuo.fitness = fitness
+
+		# Da última etapa para a primeira: eliminados ficam abaixo do piso da etapa seguinte
+		piso = min(completo.values())
+		for passos, avaliados, fitness, promovidos in reversed(etapas):
+			ids_promovidos = {id(individuo) for individuo in promovidos}
+			for individuo in avaliados:
+				if id(individuo) not in ids_promovidos:
+					individuo.fitness = min(fitness[id(individuo)], piso)
+			piso = min(individuo.fitness for individuo in avaliados)
+
+		relatorio = {'passos': [], 'avaliados': [], 'correlacao': [], 'acerto_promocao': []}
+		referencia = auditoria if auditoria is not None else completo
+		for passos, avaliados, fitness, promovidos in etapas:
+			comuns = [id(individuo) for individuo in avaliados if id(individuo) in referencia]
+			relatorio['passos'].append(passos)
+			relatorio['avaliados'].append(len(avaliados))
+			relatorio['correlacao'].append(correlacao_ranking(
+				[fitness[chave] for chave in comuns], [referencia[chave] for chave in comuns]))
+			if auditoria is not None:
+				# Fração dos melhores no episódio completo que a etapa promoveu
+				melhores = sorted(comuns, key=lambda chave: -auditoria[chave])[:len(promovidos)]
+				relatorio['acerto_promocao'].append(
+					len(set(melhores) & {id(individuo) for individuo in promovidos}) / len(promovidos))
+		relatorio['passos'].append(max_tempo)
+		relatorio['avaliados'].append(len(candidatos))
+		self.historico_fidelidades.append(relatorio)
+		return set(completo) - estimados
+
+	def gravar_trajetoria(self, individuo, ambiente):
+		"""Simula o indivíduo gravando a trajetória, sem alterar o gerador aleatório global"""
+		estado = random.getstate()
+		gravador = GravadorTrajetoria(ambiente.max_tempo)
+		avaliar_individuo(individuo, ambiente, Robo(ambiente.largura // 2, ambiente.altura // 2), gravador)
+		random.setstate(estado)
+		return gravador
+
+	def simular(self, individuos, ambiente):
+		"""Calcula o fitness dos indivíduos no ambiente conforme o modo configurado.
+
+		Retorna os ids dos indivíduos cujo fitness é só uma estimativa da poda 'elite'
+		(não valem como episódio completo no cache nem no substituto).
+		"""
+		if not individuos:
+			return set()
+
+		if self.workers > 1 or self.coordenador is not None:
+			# Blocos avaliados em paralelo, na ordem da lista
+			resultados, podados = self.avaliar_em_paralelo(individuos, ambiente)
+		elif self.simulacao_lote:
+			# Todos os robôs avançam juntos, um passo vetorizado por vez
+			simulacao = SimulacaoLote(ambiente, individuos, poda=self.poda, armazem=self.armazem)
+			resultados = [float(fitness) for fitness in simulacao.executar()]
+			podados = simulacao.podados.tolist()
+			self.passos_simulados += int(simulacao.tempo.sum())
+			self.nos_lote_reaproveitados += simulacao.programa.nos_reaproveitados
+		else:
+			robo = Robo(ambiente.largura // 2, ambiente.altura // 2)
+			resultados = []
+			podados = []
+			for individuo in individuos:
+				podados_antes = self.poda.episodios_podados if self.poda is not None else 0
+				resultados.append(avaliar_individuo(individuo, ambiente, robo, poda=self.poda))
+				podados.append(self.poda is not None and self.poda.episodios_podados > podados_antes)
+				self.passos_simulados += ambiente.tempo
+
+		for individuo, fitness in zip(individuos, resultados):
+			individuo.fitness = fitness
+		if self.poda is None:
+			return set()
+		return {id(individuo) for individuo, podado in zip(individuos, podados) if self.poda.estimado(podado)}
+
+	def avaliar_em_paralelo(self, individuos, ambiente):
+		"""Distribui os indivíduos em blocos para o pool de processos (ou o coordenador), todos com o mesmo ambiente.
+
+		Retorna (fitness, podados) na ordem dos indivíduos.
+		"""
+		if self.coordenador is not None:
+			n_processos = self.coordenador.aguardar_workers(1, self.coordenador.tempo_limite)
+			if n_processos == 0:
+				raise RuntimeError(
+					f"nenhum worker conectado ao coordenador em {self.coordenador.endereco} "
+					f"após {self.coordenador.tempo_limite:g}s"
 				)
+			mapear = self.coordenador.mapear
+		else:
+			if self._pool is None:
+				self._pool = multiprocessing.Pool(self.workers)
+			n_processos = self.workers
+			mapear = lambda tarefas: self._pool.map(_avaliar_em_processo, tarefas)
+
+		# Alguns blocos por processo para equilibrar a carga
+		n_blocos = min(len(individuos), n_processos * 4)
+		tamanho_bloco = -(-len(individuos) // n_blocos)
+		# No modo 'elite' cada bloco usa o corte da sua própria elite, que nunca é maior que o global
+		tarefas = [
+			(
+				ambiente, individuos[i:i + tamanho_bloco], random.getrandbits(64), self.simulacao_lote,
+				PodaEpisodios(self.poda.modo, self.poda.tamanho_elite) if self.poda is not None else None,
+				self.armazem is not None
+			)
+			for i in range(0, len(individuos), tamanho_bloco)
+		]
+		# map preserva a ordem dos blocos
+		resultados = []
+		podados = []
+		for bloco, podados_bloco, poda, passos in mapear(tarefas):
+			resultados.extend(bloco)
+			podados.extend(podados_bloco)
+			self.passos_simulados += passos
+			if poda is not None:
+				self.poda.combinar(poda)
+		return resultados, podados
+
+	def __getstate__(self):
+		# O pool de processos, o coordenador e o callback pertencem à execução, não ao estado da evolução
+		estado = self.__dict__.copy()
+		estado['_pool'] = None
+		estado['coordenador'] = None
+		estado['callback_tempos'] = None
+		return estado
+
+	def salvar_checkpoint(self, arquivo):
+		"""Grava o estado completo (população, históricos, caches e gerador aleatório) de forma atômica"""
+		dados = pickle.dumps(
+			{'versao': 1, 'evolucao': self, 'random': random.getstate()}, protocol=pickle.HIGHEST_PROTOCOL
+		)
+		diretorio = os.path.dirname(os.path.abspath(arquivo))
+		descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix='.checkpoint-')
+		try:
+			with os.fdopen(descritor, 'wb') as f:
+				f.write(gzip.compress(dados, compresslevel=6))
+				f.flush()
+				os.fsync(f.fileno())
+			# Substituição atômica: o checkpoint anterior continua válido até aqui
+			os.replace(temporario, arquivo)
+		except BaseException:
+			os.remove(temporario)
+			raise
 
-				# Bônus por completar o objetivo corretamente
-				if recursos_coletados == recursos_ambiente:
-					if robo.meta_atingida:
-						fitness += 2000 # Reduzido de 20000 para 2000
-						# Bônus extra por completar rápido
-						fitness += max(0, 500 - ambiente.tempo * 2) # Reduzido de 5000 para 500
-						# Bônus extra por eficiência energética
-						fitness += robo.energia * 2 # Reduzido de 10 para 2
-
-				# Penalidade por tempo (ajustada para incentivar completar rápido)
-				fitness -= ambiente.tempo * 0.2 # Reduzido de 1.0 para 0.2
-    
-				if robo.colisoes == 0:
-					fitness *= 2 # Reduzido de 1000 para 2
-
-				# Garantir que o fitness seja um número válido e não negativo
-				individuo.fitness = max(0, fitness) if np.isfinite(fitness) else 0
-
-			except Exception as e:
-				print(f"Erro na avaliação: {str(e)}")
-				individuo.fitness = 0
-
-			# Atualizar melhor indivíduo
-			if individuo.fitness > self.melhor_fitness:
-				self.melhor_fitness = individuo.fitness
-				self.melhor_individuo = individuo.copy()
-				self.geracoes_sem_melhoria = 0
-			elif individuo.fitness > self.ultimo_fitness * (1 + self.melhorias_minimas):
-				self.geracoes_sem_melhoria = 0
-			else:
-				self.geracoes_sem_melhoria += 1
+	@classmethod
+	def carregar_checkpoint(cls, arquivo, callback_tempos=None):
+		"""Restaura a evolução e o gerador aleatório global; continue com evoluir(n_geracoes)"""
+		with open(arquivo, 'rb') as f:
+			dados = pickle.loads(gzip.decompress(f.read()))
+		if dados.get('versao') != 1:
+			raise ValueError(f"Versão de checkpoint não suportada: {dados.get('versao')}")
+		evolucao = dados['evolucao']
+		evolucao.callback_tempos = callback_tempos
+		random.setstate(dados['random'])
+		return evolucao
+
+	def encerrar_workers(self):
+		"""Finaliza o pool de processos, se existir"""
+		if self._pool is not None:
+			self._pool.close()
+			self._pool.join()
+			self._pool = None
+
+	def registrar_fitness(self, individuo):
+		# Atualizar melhor indivíduo
+		if individuo.fitness > self.melhor_fitness:
+			self.melhor_fitness = individuo.fitness
+			self.melhor_individuo = individuo.copy()
+			self.geracoes_sem_melhoria = 0
+		elif individuo.fitness > self.ultimo_fitness * (1 + self.melhorias_minimas):
+			self.geracoes_sem_melhoria = 0
+		else:
+			self.geracoes_sem_melhoria += 1
 
 	def selecionar(self):
 		# Seleção por torneio com pressão seletiva variável
@@ -1099,70 +4020,327 @@ class ProgramacaoGenetica:
 
 		return selecionados
 
-	def evoluir(self, n_geracoes=50):
-		# Parâmetros ajustados para melhor exploração
-		taxa_mutacao = 0.2  # Reduzida para ser mais suave
-		taxa_crossover = 0.9  # Aumentada para mais troca de material genético
-
-		for geracao in range(n_geracoes):
-			print(f"Geração {geracao + 1}/{n_geracoes}")
-
-			# Avaliar população
-			self.avaliar_populacao()
-
-			# Calcular média do fitness da população
-			media_fitness = sum(ind.fitness for ind in self.populacao) / len(self.populacao)
-			self.historico_media_fitness.append(media_fitness)
-
-			# Registrar melhor fitness
-			self.historico_fitness.append(self.melhor_fitness)
-			print(f"Melhor fitness: {self.melhor_fitness:.2f}")
-			print(f"Média do fitness: {media_fitness:.2f}")
-
-			# Verificar estagnação
-			if self.geracoes_sem_melhoria >= self.max_geracoes_sem_melhoria:
-				print("Detectada estagnação - aumentando diversidade...")
-				# Aumentar taxa de mutação temporariamente
-				taxa_mutacao = min(0.4, taxa_mutacao * 1.3)  # Aumento mais suave
-				# Adicionar mais indivíduos aleatórios
-				n_aleatorios = max(1, int(self.tamanho_populacao * 0.2))  # Reduzido para 20%
-				for _ in range(n_aleatorios):
-					novo = IndividuoPG(self.profundidade)
-					self.populacao.append(novo)
-				self.geracoes_sem_melhoria = 0
-				print(f"taxa de mutação: {taxa_mutacao}")
-			else:
-				taxa_mutacao = 0.2  # Resetar taxa de mutação
-
-			# Selecionar indivíduos
-			selecionados = self.selecionar()
+	def evoluir(self, n_geracoes=50, arquivo_checkpoint=None, intervalo_checkpoint=1):
+		"""Evolui até completar n_geracoes no total (uma execução retomada continua de geracao_atual).
 
-			# Criar nova população
-			nova_populacao = []
+		Com arquivo_checkpoint, o estado é salvo a cada intervalo_checkpoint gerações
+		e ao final; carregar_checkpoint + evoluir reproduz a execução sem interrupção.
+		"""
+		for _ in self.evoluir_iter(n_geracoes, arquivo_checkpoint, intervalo_checkpoint):
+			pass
+		return self.melhor_individuo, self.historico_fitness
 
-			# Elitismo - manter os melhores indivíduos
-			n_elite = max(1, int(self.tamanho_populacao * 0.3))  # Aumentado para 30%
-			nova_populacao.extend(selecionados[:n_elite])
+	def evoluir_iter(self, n_geracoes=50, arquivo_checkpoint=None, intervalo_checkpoint=1):
+		"""Versão geradora de evoluir: produz um registro ao fim de cada geração.
 
-			# Preencher o resto da população
-			while len(nova_populacao) < self.tamanho_populacao:
-				# Seleção de pais
-				pai1, pai2 = random.sample(selecionados, 2)
+		O registro traz geracao, melhor_fitness, media_fitness, melhor_individuo
+		(referência, não cópia), tempo da geração, tempos por fase (se instrumentado)
+		e passos_simulados. Interromper a iteração encerra a evolução no fim da
+		última geração produzida, com o estado consistente para checkpoint.
+		"""
+		# Parâmetros ajustados para melhor exploração
+		taxa_crossover = 0.9  # Aumentada para mais troca de material genético
 
-				# Crossover
-				if random.random() < taxa_crossover:
-					filho = pai1.crossover(pai2)
+		try:
+			for geracao in range(self.geracao_atual, n_geracoes):
+				print(f"Geração {geracao + 1}/{n_geracoes}")
+				inicio_geracao = time.perf_counter()
+				medidor = MedidorFases() if self.instrumentar else None
+				if medidor:
+					inicio = inicio_geracao
+					passos_antes = self.passos_simulados
+
+				# Avaliar população
+				ambiente = self.avaliar_populacao()
+				if self.gravar_melhores:
+					melhor_da_geracao = max(self.populacao, key=lambda individuo: individuo.fitness)
+					self.trajetorias_melhores.append(self.gravar_trajetoria(melhor_da_geracao, ambiente))
+				if medidor:
+					medidor.registrar('avaliacao', inicio)
+					tamanho_medio = sum(
+						individuo.calcular_tamanho_arvore(individuo.arvore_aceleracao) +
+						individuo.calcular_tamanho_arvore(individuo.arvore_rotacao)
+						for individuo in self.populacao
+					) / len(self.populacao)
+
+				# Calcular média do fitness da população
+				media_fitness = sum(ind.fitness for ind in self.populacao) / len(self.populacao)
+				self.historico_media_fitness.append(media_fitness)
+
+				# Registrar melhor fitness
+				self.historico_fitness.append(self.melhor_fitness)
+				print(f"Melhor fitness: {self.melhor_fitness:.2f}")
+				print(f"Média do fitness: {media_fitness:.2f}")
+				if self.cache_fitness is not None:
+					print(f"Cache de fitness: {self.cache_fitness.acertos} acertos, {self.cache_fitness.faltas} faltas")
+				if self.poda is not None:
+					print(f"Poda: {self.poda.episodios_podados} episódios interrompidos, {self.poda.passos_poupados} passos poupados")
+				if self.simplificar:
+					print(f"Simplificação: {self.nos_simplificados} nós removidos")
+				if self.fidelidades and self.historico_fidelidades:
+					relatorio = self.historico_fidelidades[-1]
+					concordancia = ", ".join(
+						f"{passos} passos: " + (f"{correlacao:.2f}" if correlacao is not None else "-")
+						for passos, correlacao in zip(relatorio['passos'], relatorio['correlacao'])
+					)
+					print(f"Fidelidades: {' -> '.join(map(str, relatorio['avaliados']))} episódios, "
+						f"concordância com o episódio completo ({concordancia})")
+				if self.substituto is not None and self.historico_substituto:
+					relatorio = self.historico_substituto[-1]
+					correlacao = f"{relatorio['correlacao']:.2f}" if relatorio['correlacao'] is not None else "-"
+					erro = f"{relatorio['erro_medio']:.1f}" if relatorio['erro_medio'] is not None else "-"
+					print(f"Substituto: {relatorio['descartados']}/{relatorio['previstos']} episódios evitados, "
+						f"{relatorio['falsos_descartes']}/{relatorio['verificados']} verificados eram da elite, "
+						f"correlação {correlacao}, erro médio {erro}")
+				if self.coordenador is not None:
+					print("Workers remotos: " + ", ".join(
+						f"{nome} {estatisticas['passos_por_s']:.0f} passos/s ({estatisticas['lotes']} lotes)"
+						for nome, estatisticas in self.coordenador.estatisticas().items()
+					) + f"; {self.coordenador.redespachados} lotes redespachados")
+				if self.armazem is not None:
+					estatisticas = self.armazem.estatisticas()
+					print(f"Expressões: {estatisticas['nos_unicos']} subárvores distintas em "
+						f"{estatisticas['nos_referenciados']} nós ({estatisticas['compartilhamento']:.0%} compartilhados), "
+						f"{self.nos_lote_reaproveitados} nós reaproveitados na simulação em lote")
+
+				# Verificar estagnação
+				if self.geracoes_sem_melhoria >= self.max_geracoes_sem_melhoria:
+					print("Detectada estagnação - aumentando diversidade...")
+					# Aumentar taxa de mutação temporariamente
+					self.taxa_mutacao = min(0.4, self.taxa_mutacao * 1.3)  # Aumento mais suave
+					# Adicionar mais indivíduos aleatórios
+					n_aleatorios = max(1, int(self.tamanho_populacao * 0.2))  # Reduzido para 20%
+					for _ in range(n_aleatorios):
+						novo = self.classe_individuo(self.profundidade)
+						self.populacao.append(novo)
+					self.geracoes_sem_melhoria = 0
+					print(f"taxa de mutação: {self.taxa_mutacao}")
 				else:
-					filho = pai1.copy()
+					self.taxa_mutacao = 0.2  # Resetar taxa de mutação
+
+				# Selecionar indivíduos
+				if medidor:
+					inicio = time.perf_counter()
+				selecionados = self.selecionar()
+				if medidor:
+					medidor.registrar('selecao', inicio)
+
+				# Criar nova população
+				nova_populacao = []
+
+				# Elitismo - manter os melhores indivíduos
+				n_elite = max(1, int(self.tamanho_populacao * 0.3))  # Aumentado para 30%
+				nova_populacao.extend(selecionados[:n_elite])
+				for individuo in selecionados[:n_elite]:
+					individuo.fitness_pais = individuo.fitness
+
+				# Preencher o resto da população
+				while len(nova_populacao) < self.tamanho_populacao:
+					# Seleção de pais
+					pai1, pai2 = random.sample(selecionados, 2)
+
+					# Crossover
+					if medidor:
+						inicio = time.perf_counter()
+					if random.random() < taxa_crossover:
+						filho = pai1.crossover(pai2)
+						filho.fitness_pais = (pai1.fitness + pai2.fitness) / 2
+						if medidor:
+							medidor.registrar('crossover', inicio)
+					else:
+						filho = pai1.copy()
+						filho.fitness_pais = pai1.fitness
+						if medidor:
+							medidor.registrar('copia', inicio)
+
+					# Mutação mais suave
+					if random.random() < self.taxa_mutacao:
+						if medidor:
+							inicio = time.perf_counter()
+						filho.mutacao(probabilidade=0.3)  # Reduzida probabilidade de mutação por nó
+						if medidor:
+							medidor.registrar('mutacao', inicio)
+
+					nova_populacao.append(filho)
+
+				self.populacao = nova_populacao
+				self.ultimo_fitness = self.melhor_fitness
+
+				if medidor:
+					passos = self.passos_simulados - passos_antes
+					registro = {
+						'geracao': geracao + 1,
+						'tempo_total': time.perf_counter() - inicio_geracao,
+						'tempos': medidor.tempos,
+						'chamadas': medidor.chamadas,
+						'passos': passos,
+						'passos_por_s': passos / medidor.tempos['avaliacao'] if medidor.tempos['avaliacao'] > 0 else 0.0,
+						'tamanho_medio_arvore': tamanho_medio
+					}
+					self.historico_tempos.append(registro)
+					print("Tempos: " + ", ".join(f"{fase} {tempo:.3f}s" for fase, tempo in medidor.tempos.items()) +
+						f" ({registro['passos_por_s']:.0f} passos/s)")
+					if self.callback_tempos is not None:
+						self.callback_tempos(registro)
+
+				self.geracao_atual = geracao + 1
+				if arquivo_checkpoint is not None and (
+					self.geracao_atual % intervalo_checkpoint == 0 or self.geracao_atual == n_geracoes
+				):
+					self.salvar_checkpoint(arquivo_checkpoint)
+
+				yield {
+					'geracao': self.geracao_atual,
+					'melhor_fitness': self.melhor_fitness,
+					'media_fitness': media_fitness,
+					'melhor_individuo': self.melhor_individuo,
+					'tempo': time.perf_counter() - inicio_geracao,
+					'tempos': medidor.tempos if medidor else None,
+					'passos_simulados': self.passos_simulados
+				}
+		finally:
+			# Também ao interromper a iteração
+			self.encerrar_workers()
+
+def _executar_ilha(conexao, semente, opcoes, n_migrantes, injecao_aleatoria):
+	"""Laço de um processo de ilha: executa os comandos recebidos pela conexão"""
+	random.seed(semente)
+	try:
+		# A saída das ilhas se misturaria no terminal; o resumo é impresso pelo ModeloIlhas
+		with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+			pg = ProgramacaoGenetica(**opcoes)
+			if not injecao_aleatoria:
+				# A diversidade vem da migração, não de indivíduos aleatórios
+				pg.max_geracoes_sem_melhoria = float('inf')
+			conexao.send({'pronto': True})
+			while True:
+				comando, argumento = conexao.recv()
+				if comando == 'evoluir':
+					inicio = len(pg.historico_fitness)
+					pg.evoluir(argumento)
+					# O melhor da ilha é uma cópia feita na avaliação, com o fitness de quando foi o melhor
+					# (a elite volta a ser avaliada no ambiente de cada geração); a elite, mantida sem
+					# alterações no início da população, completa os migrantes
+					migrantes = [pg.melhor_individuo] + pg.populacao[:n_migrantes - 1]
+					conexao.send({
+						'historico_fitness': pg.historico_fitness[inicio:],
+						'migrantes': [json.dumps(individuo.para_dados()) for individuo in migrantes[:n_migrantes]],
+						'passos_simulados': pg.passos_simulados
+					})
+				elif comando == 'imigrar':
+					# Imigrantes substituem os últimos filhos, preservando a elite
+					if argumento:
+						pg.populacao[-len(argumento):] = [
+							pg.classe_individuo.de_dados(json.loads(dados), pg.profundidade) for dados in argumento
+						]
+				elif comando == 'finalizar':
+					conexao.send({
+						'melhor': json.dumps(pg.melhor_individuo.para_dados()),
+						'melhor_fitness': pg.melhor_fitness
+					})
+					return
+	except Exception:
+		conexao.send({'erro': traceback.format_exc()})
+	finally:
+		conexao.close()
+
+class ModeloIlhas:
+	"""Várias subpopulações (ilhas) evoluindo em processos separados, com migração periódica.
+
+	Cada ilha é uma ProgramacaoGenetica completa que vive no seu processo durante
+	toda a execução e roda o laço normal de evoluir. A cada intervalo_migracao
+	gerações os n_migrantes melhores de cada ilha seguem, como árvores em JSON,
+	para a próxima ilha do anel ('anel') ou para outra ilha sorteada
+	('aleatoria'), substituindo os últimos filhos da população de destino.
+	Só trafegam essas mensagens pequenas e o histórico de fitness.
+	"""
+	def __init__(self, n_ilhas=4, tamanho_populacao=50, profundidade=3, intervalo_migracao=5, n_migrantes=2,
+			topologia='anel', injecao_aleatoria=False, semente=None, **opcoes):
+		if topologia not in ('anel', 'aleatoria'):
+			raise ValueError(f"Topologia desconhecida: {topologia}")
+		self.n_ilhas = n_ilhas
+		self.intervalo_migracao = intervalo_migracao
+		self.n_migrantes = n_migrantes
+		self.topologia = topologia
+		self.injecao_aleatoria = injecao_aleatoria
+		# Opções repassadas para a ProgramacaoGenetica de cada ilha
+		self.opcoes = dict(opcoes, tamanho_populacao=tamanho_populacao, profundidade=profundidade)
+		self.classe_individuo = opcoes.get('classe_individuo', IndividuoPG)
+		# Gerador próprio: sementes das ilhas e sorteio dos destinos
+		self.rng = random.Random(semente if semente is not None else random.getrandbits(64))
+		self.sementes = [self.rng.getrandbits(64) for _ in range(n_ilhas)]
+		self.melhor_individuo = None
+		self.melhor_fitness = float('-inf')
+		self.historico_fitness = []
+		self.passos_simulados = 0
 
-				# Mutação mais suave
-				if random.random() < taxa_mutacao:
-					filho.mutacao(probabilidade=0.3)  # Reduzida probabilidade de mutação por nó
+	def destinos(self):
+		"""Ilha de destino dos migrantes de cada ilha"""
+		if self.topologia == 'anel':
+			return [(ilha + 1) % self.n_ilhas for ilha in range(self.n_ilhas)]
+		return [self.rng.choice([outra for outra in range(self.n_ilhas) if outra != ilha]) for ilha in range(self.n_ilhas)]
 
-				nova_populacao.append(filho)
+	def receber(self, conexoes):
+		respostas = [conexao.recv() for conexao in conexoes]
+		for ilha, resposta in enumerate(respostas):
+			if 'erro' in resposta:
+				raise RuntimeError(f"Falha na ilha {ilha}:\n{resposta['erro']}")
+		return respostas
 
-			self.populacao = nova_populacao
-			self.ultimo_fitness = self.melhor_fitness
+	def evoluir(self, n_geracoes=50):
+		conexoes = []
+		processos = []
+		for semente in self.sementes:
+			local, remota = multiprocessing.Pipe()
+			processo = multiprocessing.Process(
+				target=_executar_ilha,
+				args=(remota, semente, self.opcoes, self.n_migrantes, self.injecao_aleatoria),
+				daemon=True
+			)
+			processo.start()
+			remota.close()
+			conexoes.append(local)
+			processos.append(processo)
+
+		try:
+			# Confirma que todas as ilhas foram criadas (ou traz o erro) antes de começar
+			self.receber(conexoes)
+			geracao = 0
+			while geracao < n_geracoes:
+				geracao = min(n_geracoes, geracao + self.intervalo_migracao)
+				for conexao in conexoes:
+					conexao.send(('evoluir', geracao))
+				respostas = self.receber(conexoes)
+
+				# O melhor global de cada geração é o maior entre os melhores das ilhas
+				self.historico_fitness.extend(max(valores) for valores in zip(*(r['historico_fitness'] for r in respostas)))
+				self.passos_simulados = sum(r['passos_simulados'] for r in respostas)
+				print(f"Geração {geracao}/{n_geracoes} - melhor fitness por ilha: " +
+					", ".join(f"{r['historico_fitness'][-1]:.2f}" for r in respostas))
+
+				if geracao < n_geracoes and self.n_ilhas > 1:
+					chegadas = [[] for _ in range(self.n_ilhas)]
+					for origem, destino in enumerate(self.destinos()):
+						chegadas[destino].extend(respostas[origem]['migrantes'])
+					for conexao, migrantes in zip(conexoes, chegadas):
+						conexao.send(('imigrar', migrantes))
+
+			for conexao in conexoes:
+				conexao.send(('finalizar', None))
+			for resposta in self.receber(conexoes):
+				if resposta['melhor_fitness'] > self.melhor_fitness:
+					self.melhor_fitness = resposta['melhor_fitness']
+					self.melhor_individuo = self.classe_individuo.de_dados(
+						json.loads(resposta['melhor']), self.opcoes['profundidade']
+					)
+					self.melhor_individuo.fitness = self.melhor_fitness
+		finally:
+			for conexao in conexoes:
+				conexao.close()
+			for processo in processos:
+				processo.join(timeout=5)
+				if processo.is_alive():
+					processo.terminate()
 
 		return self.melhor_individuo, self.historico_fitness
 
@@ -1173,6 +4351,12 @@ class ProgramacaoGenetica:
 
 # Executando o algoritmo
 if __name__ == "__main__":
+	if len(sys.argv) == 3 and sys.argv[1] == '--worker':
+		# Worker da avaliação distribuída: python robo_exercicio.py --worker host:porta
+		host, porta = sys.argv[2].rsplit(':', 1)
+		executar_worker(host, int(porta))
+		sys.exit(0)
+
 	print("Iniciando simulação de robô com programação genética...")
 
 	# Criar e treinar o algoritmo genético
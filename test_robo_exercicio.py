@@ -0,0 +1,328 @@
+import gzip
+import json
+import multiprocessing
+import pickle
+import random
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+from robo_exercicio import (
+	LIMITE_ACELERACAO, LIMITE_ROTACAO, VARIAVEIS_SENSORES, Ambiente, ArvoreCompacta, CoordenadorDistribuido,
+	GravadorTrajetoria, IndividuoPG, IndividuoPGCompacto, PodaEpisodios, ProgramacaoGenetica, Robo, SimulacaoLote,
+	_avaliar_em_processo, _enviar_mensagem, _receber_mensagem, avaliar_individuo, como_dict, compilar_arvores,
+	criar_cenario, executar_worker, simplificar_arvore
+)
+
+def _individuo_angulo_recurso():
+	folha = {'tipo': 'folha', 'variavel': 'angulo_recurso'}
+	arvore = {'tipo': 'operador', 'operador': '+', 'esquerda': folha, 'direita': {'tipo': 'folha', 'valor': 0.5}}
+	return IndividuoPG(arvores=(arvore, folha))
+
+def test_lote_e_escalar_sem_recursos():
+	random.seed(0)
+	ambiente = Ambiente(num_recursos=0)
+	individuos = [_individuo_angulo_recurso() for _ in range(3)]
+
+	simulacao = SimulacaoLote(ambiente, individuos)
+	robo = Robo(ambiente.largura // 2, ambiente.altura // 2)
+	ambiente.reset()
+	escalar = robo.get_sensores(ambiente, individuos[0].variaveis_sensores())
+	lote = simulacao.get_sensores()
+	for linha, variavel in enumerate(VARIAVEIS_SENSORES):
+		assert np.all(lote[linha] == float(escalar[variavel]))
+	assert escalar['angulo_recurso'] == 0
+
+	fitness_lote = simulacao.executar()
+	fitness_escalar = [avaliar_individuo(individuo, ambiente, robo) for individuo in individuos]
+	assert np.all(np.isfinite(fitness_lote))
+	assert all(np.isfinite(fitness_escalar))
+
+def _dados_com_variavel(variavel):
+	folha = {'tipo': 'folha', 'variavel': variavel}
+	return {'arvore_aceleracao': {'tipo': 'operador', 'operador': '+', 'esquerda': folha, 'direita': folha},
+		'arvore_rotacao': {'tipo': 'folha', 'valor': 0.1}}
+
+def test_variavel_desconhecida_e_rejeitada(tmp_path):
+	variavel = "(__import__('os').system('echo invadido') or 0)"
+	with pytest.raises(ValueError):
+		compilar_arvores({'tipo': 'folha', 'variavel': variavel})
+	with pytest.raises(ValueError):
+		IndividuoPG.de_dados(_dados_com_variavel(variavel))
+	with pytest.raises(ValueError):
+		IndividuoPGCompacto.de_dados(_dados_com_variavel(variavel))
+	arquivo = tmp_path / 'individuo.json'
+	arquivo.write_text(json.dumps(_dados_com_variavel(variavel)))
+	with pytest.raises(ValueError):
+		IndividuoPG.carregar(str(arquivo))
+	# Sensores conhecidos continuam aceitos
+	IndividuoPG.de_dados(_dados_com_variavel('dist_meta')).compilar()
+
+class _PodaEliteCompleta(PodaEpisodios):
+	# Elite já completa com um corte inalcançável: todo episódio é podado com uma estimativa
+	def iniciar_geracao(self):
+		self.melhores = [1e9] * self.tamanho_elite
+
+@pytest.mark.parametrize('simulacao_lote', [False, True])
+def test_estimativas_da_poda_elite_nao_entram_no_cache(simulacao_lote):
+	random.seed(2)
+	pg = ProgramacaoGenetica(
+		tamanho_populacao=6, profundidade=2, simulacao_lote=simulacao_lote, tamanho_cache_fitness=100, cenario='padrao'
+	)
+	pg.poda = _PodaEliteCompleta('elite', 1)
+	pg.avaliar_populacao()
+	assert pg.poda.episodios_podados == 6
+	assert len(pg.cache_fitness.dados) == 0
+
+	# Na poda 'piso' o fitness do podado é exato e pode ir para o cache
+	pg.poda = PodaEpisodios('piso')
+	pg.avaliar_populacao()
+	assert len(pg.cache_fitness.dados) == len({individuo.hash_genoma() for individuo in pg.populacao})
+
+def _worker_malformado(endereco):
+	# Responde ao primeiro bloco com um resultado de tamanho errado
+	conexao = socket.create_connection(endereco)
+	_enviar_mensagem(conexao, ['ola', 'malformado'])
+	while True:
+		mensagem = _receber_mensagem(conexao)
+		if mensagem is None or mensagem[0] == 'fim':
+			break
+		if mensagem[0] == 'lote':
+			_enviar_mensagem(conexao, ['resultado', mensagem[1], [1e9], [False], None, 0, 0.0])
+	conexao.close()
+
+def test_distribuido_descarta_resultado_malformado():
+	random.seed(5)
+	ambiente = criar_cenario('denso')
+	blocos = [([IndividuoPG(3) for _ in range(4)], random.getrandbits(64), lote) for lote in (False, True, False, True)]
+	# Cada avaliação recebe instâncias novas de PodaEpisodios, como em avaliar_em_paralelo
+	def criar_tarefas():
+		return [(ambiente, individuos, semente, lote, PodaEpisodios('elite', 2), False) for individuos, semente, lote in blocos]
+	esperado = [_avaliar_em_processo(tarefa) for tarefa in criar_tarefas()]
+	tarefas = criar_tarefas()
+
+	coordenador = CoordenadorDistribuido(tempo_limite=5.0)
+	try:
+		threading.Thread(target=_worker_malformado, args=(coordenador.endereco,), daemon=True).start()
+		assert coordenador.aguardar_workers(1, 10) == 1
+		threading.Thread(target=executar_worker, args=(*coordenador.endereco, 'bom'), daemon=True).start()
+		resultados = coordenador.mapear(tarefas)
+	finally:
+		coordenador.encerrar()
+	assert 'malformado' not in coordenador.workers
+	assert coordenador.redespachados >= 1
+	for (fitness, podados, poda, passos), (fitness_local, podados_local, poda_local, passos_local) in zip(resultados, esperado):
+		assert fitness == fitness_local and podados == podados_local and passos == passos_local
+		assert poda.para_dados() == poda_local.para_dados()
+
+class _RngSemRuido:
+	# Substitui o gerador do lote: cada perturbação vale o centro do intervalo
+	def uniform(self, baixo, alto, n):
+		return np.full(n, (baixo + alto) / 2)
+
+_init_lote_original = SimulacaoLote.__init__
+
+def _init_lote_sem_ruido(self, *args, **kwargs):
+	kwargs['rng'] = _RngSemRuido()
+	_init_lote_original(self, *args, **kwargs)
+
+@pytest.mark.parametrize('cenario', ['padrao', 'denso'])
+def test_lote_e_escalar_sem_ruido_dao_o_mesmo_fitness(monkeypatch, cenario):
+	monkeypatch.setattr(random, 'uniform', lambda baixo, alto: (baixo + alto) / 2)
+	random.seed(7)
+	individuos = [IndividuoPG(3) for _ in range(12)]
+	ambiente = criar_cenario(cenario)
+	robo = Robo(ambiente.largura // 2, ambiente.altura // 2)
+	escalar, estados = [], []
+	for individuo in individuos:
+		escalar.append(avaliar_individuo(individuo, ambiente, robo))
+		estados.append((robo.x, robo.y, robo.energia, robo.colisoes, robo.recursos_coletados, ambiente.tempo))
+	simulacao = SimulacaoLote(ambiente, individuos, rng=_RngSemRuido())
+	lote = simulacao.executar()
+	assert np.allclose(lote, escalar)
+	# O fitness é limitado a 0; o estado final de cada episódio também tem de coincidir
+	estados_lote = zip(simulacao.x, simulacao.y, simulacao.energia, simulacao.colisoes, simulacao.recursos_coletados, simulacao.tempo)
+	assert np.allclose(np.array(estados, dtype=float), np.array(list(estados_lote), dtype=float))
+	assert len({estado[-1] for estado in estados}) > 1
+
+@pytest.mark.parametrize('n', [5, 25, 100, 200])
+@pytest.mark.parametrize('raio', [15, 40])
+def test_indice_espacial_igual_a_varredura(n, raio):
+	# Mesmo layout com e sem índice; raio 40 passa da margem do índice e usa a união das células
+	random.seed(n)
+	com_indice = Ambiente(num_obstaculos=n, num_recursos=n, indice_espacial=True)
+	random.seed(n)
+	varredura = Ambiente(num_obstaculos=n, num_recursos=n)
+	assert com_indice.layout() == varredura.layout()
+	rng = random.Random(n)
+	for _ in range(2000):
+		x, y = rng.uniform(0, varredura.largura), rng.uniform(0, varredura.altura)
+		assert com_indice.verificar_colisao(x, y, raio) == varredura.verificar_colisao(x, y, raio)
+		assert com_indice.verificar_coleta_recursos(x, y, raio) == varredura.verificar_coleta_recursos(x, y, raio)
+		if rng.random() < 0.05:
+			# Devolve os recursos de tempos em tempos para que a coleta continue sendo exercitada
+			com_indice.reset()
+			varredura.reset()
+	assert [recurso['coletado'] for recurso in com_indice.recursos] == [recurso['coletado'] for recurso in varredura.recursos]
+
+def _evolucao_para_checkpoint():
+	return ProgramacaoGenetica(tamanho_populacao=12, profundidade=3, tamanho_cache_fitness=100)
+
+def _resumo(pg):
+	return (pg.historico_fitness, pg.historico_media_fitness, pg.passos_simulados, pg.geracao_atual,
+		[individuo.hash_genoma() for individuo in pg.populacao])
+
+def test_checkpoint_retomado_reproduz_execucao_continua(tmp_path):
+	random.seed(21)
+	continua = _evolucao_para_checkpoint()
+	continua.evoluir(4)
+
+	arquivo = str(tmp_path / 'evolucao.ckpt')
+	random.seed(21)
+	interrompida = _evolucao_para_checkpoint()
+	interrompida.evoluir(2, arquivo_checkpoint=arquivo)
+	# O gerador global é restaurado pelo checkpoint
+	random.seed(999)
+	retomada = ProgramacaoGenetica.carregar_checkpoint(arquivo)
+	assert retomada.geracao_atual == 2
+	retomada.evoluir(4)
+	assert _resumo(retomada) == _resumo(continua)
+
+def test_checkpoint_com_versao_desconhecida(tmp_path):
+	arquivo = tmp_path / 'evolucao.ckpt'
+	arquivo.write_bytes(gzip.compress(pickle.dumps({'versao': 99, 'evolucao': None, 'random': random.getstate()})))
+	with pytest.raises(ValueError):
+		ProgramacaoGenetica.carregar_checkpoint(str(arquivo))
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason="o random.uniform substituído precisa chegar aos processos")
+@pytest.mark.parametrize('simulacao_lote', [False, True])
+def test_pool_igual_ao_serial(monkeypatch, simulacao_lote):
+	# Sem ruído o resultado não depende de como os blocos dividem o gerador aleatório
+	monkeypatch.setattr(random, 'uniform', lambda baixo, alto: (baixo + alto) / 2)
+	monkeypatch.setattr(SimulacaoLote, '__init__', _init_lote_sem_ruido)
+	resultados = []
+	for workers in (1, 2):
+		random.seed(9)
+		pg = ProgramacaoGenetica(tamanho_populacao=16, profundidade=3, workers=workers, simulacao_lote=simulacao_lote, cenario='padrao')
+		try:
+			pg.avaliar_populacao()
+		finally:
+			pg.encerrar_workers()
+		resultados.append(([individuo.fitness for individuo in pg.populacao], pg.passos_simulados))
+	assert resultados[0] == resultados[1]
+	assert resultados[0][1] > 0
+
+def test_genoma_repetido_e_acerto_do_cache(monkeypatch):
+	random.seed(4)
+	pg = ProgramacaoGenetica(tamanho_populacao=6, profundidade=3, tamanho_cache_fitness=100, cenario='padrao')
+	# Uma cópia e uma reconstrução estruturalmente igual do primeiro indivíduo
+	pg.populacao[1] = pg.populacao[0].copy()
+	pg.populacao[2] = IndividuoPG.de_dados(json.loads(json.dumps(pg.populacao[0].para_dados())))
+	simulados = []
+	simular = pg.simular
+	monkeypatch.setattr(pg, 'simular', lambda individuos, ambiente: simulados.extend(individuos) or simular(individuos, ambiente))
+
+	pg.avaliar_populacao()
+	assert len(simulados) == 4
+	assert pg.cache_fitness.acertos == 2
+	assert pg.populacao[1].fitness == pg.populacao[2].fitness == pg.populacao[0].fitness
+
+	# No mesmo cenário a geração seguinte não simula nenhum genoma já visto
+	pg.avaliar_populacao()
+	assert len(simulados) == 4
+	assert pg.cache_fitness.acertos == 2 + 6
+
+def _sensores_aleatorios(rng):
+	# Valores dentro das faixas que Robo.get_sensores produz
+	return {
+		'dist_recurso': rng.uniform(0, 900), 'dist_obstaculo': rng.uniform(0, 900), 'dist_meta': rng.uniform(0, 1000),
+		'angulo_recurso': rng.uniform(-np.pi, np.pi), 'angulo_meta': rng.uniform(-np.pi, np.pi),
+		'energia': rng.uniform(0, 100), 'velocidade': rng.uniform(0, 5), 'meta_atingida': rng.random() < 0.5
+	}
+
+def _mesmo_valor(a, b):
+	return a == b or (a != a and b != b)
+
+@pytest.mark.parametrize('semente', range(5))
+def test_arvore_compacta_ida_e_volta(semente):
+	random.seed(semente)
+	rng = random.Random(semente)
+	individuo = IndividuoPG(5)
+	compacto = IndividuoPGCompacto(5, arvores=(individuo.arvore_aceleracao, individuo.arvore_rotacao))
+	for arvore, compacta in ((individuo.arvore_aceleracao, compacto.arvore_aceleracao), (individuo.arvore_rotacao, compacto.arvore_rotacao)):
+		assert compacta.para_dict() == como_dict(arvore)
+		assert ArvoreCompacta.de_json(json.loads(json.dumps(compacta.para_json()))).para_dict() == como_dict(arvore)
+	for _ in range(50):
+		sensores = _sensores_aleatorios(rng)
+		for tipo in ('aceleracao', 'rotacao'):
+			arvore = getattr(individuo, f'arvore_{tipo}')
+			# Avaliador da representação compacta x interpretador de referência x função compilada
+			valor = getattr(compacto, f'arvore_{tipo}').avaliar(sensores)
+			assert _mesmo_valor(valor, individuo.avaliar_no(arvore, sensores))
+			assert _mesmo_valor(valor, individuo.avaliar(sensores, tipo))
+
+def test_simplificacao_preserva_as_saidas():
+	rng = random.Random(17)
+	removidos = 0
+	for semente in range(20):
+		random.seed(semente)
+		individuo = IndividuoPG(5)
+		for arvore, limite in ((individuo.arvore_aceleracao, LIMITE_ACELERACAO), (individuo.arvore_rotacao, LIMITE_ROTACAO)):
+			original = compilar_arvores(arvore)
+			simplificada = simplificar_arvore(como_dict(arvore))
+			limitada = simplificar_arvore(como_dict(arvore), limite)
+			removidos += individuo.calcular_tamanho_arvore(arvore) - individuo.calcular_tamanho_arvore(limitada)
+			sem_limite, com_limite = compilar_arvores(simplificada), compilar_arvores(limitada)
+			for _ in range(30):
+				entrada = [_sensores_aleatorios(rng)[variavel] for variavel in VARIAVEIS_SENSORES]
+				esperado, = original(*entrada)
+				assert _mesmo_valor(sem_limite(*entrada)[0], esperado)
+				# Com limite a equivalência vale depois da limitação feita na simulação
+				assert max(-limite, min(limite, com_limite(*entrada)[0])) == max(-limite, min(limite, esperado))
+	assert removidos > 0
+
+def test_compilacao_com_e_sem_compartilhamento():
+	rng = random.Random(21)
+	compartilhadas = 0
+	for semente in range(20):
+		random.seed(semente)
+		individuo = IndividuoPG(5)
+		# Subexpressão repetida dentro de uma árvore e entre as duas
+		repetida = como_dict(individuo.arvore_aceleracao)
+		aceleracao = {'tipo': 'operador', 'operador': '+', 'esquerda': repetida, 'direita': {
+			'tipo': 'operador', 'operador': 'if_positivo', 'esquerda': {'tipo': 'folha', 'variavel': 'angulo_meta'},
+			'direita': repetida}}
+		rotacao = {'tipo': 'operador', 'operador': '*', 'esquerda': como_dict(individuo.arvore_rotacao), 'direita': repetida}
+		for arvores in ((individuo.arvore_aceleracao, individuo.arvore_rotacao), (aceleracao, rotacao)):
+			com = compilar_arvores(*arvores, compartilhar=True)
+			sem = compilar_arvores(*arvores, compartilhar=False)
+			compartilhadas += com.compartilhadas
+			for _ in range(30):
+				entrada = [_sensores_aleatorios(rng)[variavel] for variavel in VARIAVEIS_SENSORES]
+				assert all(_mesmo_valor(a, b) for a, b in zip(com(*entrada), sem(*entrada)))
+	assert compartilhadas > 0
+
+def test_replay_da_trajetoria_igual_a_varredura_dos_eventos(tmp_path):
+	random.seed(3)
+	ambiente = criar_cenario('denso')
+	robo = Robo(ambiente.largura // 2, ambiente.altura // 2)
+	folha = {'tipo': 'folha', 'variavel': 'angulo_recurso'}
+	individuo = IndividuoPG(arvores=({'tipo': 'folha', 'valor': 1.0}, folha))
+	gravador = GravadorTrajetoria(ambiente.max_tempo)
+	avaliar_individuo(individuo, ambiente, robo, gravador)
+	arquivo = str(tmp_path / 'trajetoria.npz')
+	gravador.salvar(arquivo)
+	for trajetoria in (gravador, GravadorTrajetoria.carregar(arquivo)):
+		ambiente_replay = trajetoria.ambiente()
+		robo_replay = Robo(0, 0)
+		# Ordem qualquer: o estado de um passo não depende dos passos aplicados antes
+		passos = list(range(trajetoria.n + 1))
+		for i in passos + passos[::-7]:
+			trajetoria.aplicar(i, robo_replay, ambiente_replay)
+			assert robo_replay.colisoes == np.count_nonzero(trajetoria.eventos[1:i + 1] & GravadorTrajetoria.COLISAO)
+			assert robo_replay.meta_atingida == bool((trajetoria.eventos[1:i + 1] & GravadorTrajetoria.META).any())
+			assert ambiente_replay.tempo == i
+		trajetoria.aplicar(trajetoria.n, robo_replay, ambiente_replay)
+		assert robo_replay.colisoes == robo.colisoes > 0